@@ -3,12 +3,21 @@ import numpy as np
 import streamlit as st
 import requests
 import json
+import html
+import re
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
+import math
 import time
 import random
+import os
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
 
 # Page configuration
 st.set_page_config(
@@ -129,37 +138,189 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+LABEL_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend', 'label_schema.json')
+
+@st.cache_data(ttl=300)
+def load_label_schema(api_url):
+    """Load the shared label schema from the API, or the copy in backend/"""
+    try:
+        response = requests.get(f"{api_url}/labels", timeout=2)
+        if response.status_code == 200:
+            return response.json()
+    except requests.RequestException:
+        pass
+    with open(LABEL_SCHEMA_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# The backend refuses larger batches, so bigger uploads go in several requests
+BATCH_REQUEST_TEXTS = 10000
+# Rate-limited chunks are resent after the server's Retry-After this many times
+MAX_BATCH_RETRIES = 5
+
+TREND_WINDOWS = {'15 minutes': '15min', 'Hour': '1h', 'Day': '1D', 'Week': '7D'}
+MAX_TREND_POINTS = 1500
+
+def parse_timestamps(values):
+    """UTC datetimes from Unix seconds or date strings; values that don't parse become NaT"""
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return pd.to_datetime(values, unit='s', utc=True, errors='coerce')
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.to_datetime(values, utc=True)
+    # ISO 8601 parses in one fast pass; only the rest go through the slow per-value parser
+    parsed = pd.to_datetime(values, utc=True, errors='coerce', format='ISO8601').astype('datetime64[ns, UTC]')
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(
+            values[retry].astype(str), utc=True, errors='coerce', format='mixed'
+        ).astype('datetime64[ns, UTC]')
+    return parsed
+
+def emotion_time_series(timestamps, emotions, confidences, window='1D', rolling=7, z_threshold=4.0,
+                        min_count=20, max_points=MAX_TREND_POINTS):
+    """Per-emotion aggregates over tumbling windows, in one vectorized pass over the results
+    
+    Returns None without timestamps, else a dict of DataFrames indexed by
+    window start with one column per emotion: `counts`, `mean_confidence`,
+    `share`, `rolling_share` (over the last `rolling` windows) and
+    `change_points`, plus the `window` actually used. A change point is a
+    window where an emotion's share is `z_threshold` standard errors away
+    from its share over the previous `rolling` windows. When the time span
+    holds more than `max_points` windows, the window is widened by a whole
+    factor first, so no chart gets more points than that.
+    """
+    frame = pd.DataFrame({
+        'time': parse_timestamps(timestamps).array,
+        'emotion': np.asarray(emotions),
+        'confidence': np.asarray(confidences, dtype=float)
+    }).dropna(subset=['time'])
+    if frame.empty:
+        return None
+    
+    window = pd.Timedelta(window)
+    span = frame['time'].max() - frame['time'].min()
+    window *= max(1, math.ceil((span // window + 1) / max_points))
+    frame['window'] = frame['time'].dt.floor(window)
+    
+    windows = pd.date_range(frame['window'].min(), frame['window'].max(), freq=window)
+    grouped = frame.groupby(['window', 'emotion'])['confidence']
+    counts = grouped.size().unstack(fill_value=0).reindex(windows, fill_value=0)
+    mean_confidence = grouped.mean().unstack().reindex(windows)
+    totals = counts.sum(axis=1)
+    share = counts.div(totals.where(totals > 0), axis=0)
+    
+    rolling_counts = counts.rolling(rolling, min_periods=1).sum()
+    rolling_share = rolling_counts.div(rolling_counts.sum(axis=1), axis=0)
+    
+    # Baseline from the previous `rolling` windows, smoothed so an unseen emotion isn't a zero variance
+    baseline_counts = rolling_counts.shift(1).fillna(0)
+    baseline_totals = baseline_counts.sum(axis=1)
+    baseline = (baseline_counts + 0.5).div(baseline_totals + 1, axis=0)
+    standard_error = np.sqrt(baseline * (1 - baseline)).div(np.sqrt(totals.where(totals > 0)), axis=0)
+    z = (share - baseline) / standard_error
+    enough = ((totals >= min_count) & (baseline_totals >= min_count)).to_numpy()[:, None]
+    
+    return {
+        'window': window,
+        'counts': counts,
+        'mean_confidence': mean_confidence,
+        'share': share,
+        'rolling_share': rolling_share,
+        'change_points': (z.abs() >= z_threshold) & enough
+    }
+
+
+def highlight_tokens(text, tokens, color):
+    """HTML of `text` with every explained word shaded by its score
+    
+    `tokens` are the backend's cleaned words in order, so the words it drops
+    (stopwords, punctuation, unknown words) stay plain. Words for the
+    emotion are shaded in `color`, words against it in grey.
+    """
+    scores = {}
+    for token in tokens:
+        scores.setdefault(token['token'], []).append(token['score'])
+    scale = max((abs(token['score']) for token in tokens), default=0) or 1
+    
+    pieces = []
+    # The backend keeps only ASCII letters, so the same split finds its words
+    for piece in re.split(r'([A-Za-z]+)', text):
+        word_scores = scores.get(piece.lower())
+        if not word_scores:
+            pieces.append(html.escape(piece))
+            continue
+        score = word_scores.pop(0)
+        shade = color if score > 0 else '#7f8c8d'
+        pieces.append(
+            f'<span title="{score:+.3f}" style="background: {shade}{int(abs(score) / scale * 200):02x}; '
+            f'border-radius: 4px; padding: 0 2px;">{html.escape(piece)}</span>'
+        )
+    return ''.join(pieces)
+
+
+class EmotionStreamClient:
+    """Live analysis over the backend's Server-Sent Events channel
+    
+    Keeps one event stream and one keep-alive connection for updates open
+    across Streamlit reruns, instead of a new /analyze POST per change.
+    """
+    
+    def __init__(self, api_url, mode='model', timeout=30):
+        self.api_url = api_url
+        self.http = requests.Session()
+        response = self.http.post(f"{api_url}/stream/sessions", json={"mode": mode}, timeout=5)
+        self.session_id = response.json()['session_id']
+        # Read timeout above the server's 15s keepalive interval
+        self.stream = requests.get(
+            f"{api_url}/stream/{self.session_id}/events", stream=True, timeout=(5, timeout)
+        )
+        self.lines = self.stream.iter_lines(decode_unicode=True)
+    
+    def analyze(self, text):
+        """Push the latest text and wait for the result for it (or a newer one)"""
+        response = self.http.post(f"{self.api_url}/stream/{self.session_id}/update", json={"text": text}, timeout=5)
+        version = response.json()['version']
+        
+        for event, data in self._events():
+            if event == 'error' and data['version'] >= version:
+                return {"error": data['error'], "success": False}
+            if event == 'emotion' and data['version'] >= version:
+                if data['result'] is None:
+                    return {"error": "Empty text provided", "success": False}
+                return {"text": text, "result": data['result'], "success": True}
+        raise requests.ConnectionError("Event stream closed")
+    
+    def _events(self):
+        event, data = None, []
+        for line in self.lines:
+            if line is None or line.startswith(':'):
+                continue
+            if line == '':
+                if event and data:
+                    yield event, json.loads('\n'.join(data))
+                event, data = None, []
+            elif line.startswith('event:'):
+                event = line[len('event:'):].strip()
+            elif line.startswith('data:'):
+                data.append(line[len('data:'):].strip())
+    
+    def close(self):
+        self.stream.close()
+        self.http.close()
+
 class EmotionAnalysisApp:
     def __init__(self):
         self.api_url = "http://localhost:5000"
-        self.emotion_colors = {
-            'love': '#e74c3c',
-            'sad': '#3498db',
-            'angry': '#e67e22',
-            'neutral': '#95a5a6',
-            'joyful': '#f1c40f'
-        }
-        self.emotion_emojis = {
-            'love': '❤️',
-            'sad': '😢',
-            'angry': '😠',
-            'neutral': '😐',
-            'joyful': '😊'
-        }
-        self.emotion_descriptions = {
-            'love': 'Feelings of affection, care, and deep attachment',
-            'sad': 'Feelings of unhappiness, sorrow, or disappointment',
-            'angry': 'Feelings of frustration, irritation, or rage',
-            'neutral': 'Neutral or balanced emotional state',
-            'joyful': 'Feelings of happiness, excitement, and delight'
-        }
-        self.emotion_images = {
-            'love': '💕',
-            'sad': '🌧️',
-            'angry': '🔥',
-            'neutral': '⚖️',
-            'joyful': '🌈'
-        }
+        
+        # Labels, colors and emojis all come from the schema written at training time
+        schema = load_label_schema(self.api_url)
+        emotions = schema['emotions']
+        self.emotion_labels = schema['display_labels']
+        self.emotion_colors = {emotion: info['color'] for emotion, info in emotions.items()}
+        self.emotion_dark_colors = {info['color']: info['dark_color'] for info in emotions.values()}
+        self.emotion_emojis = {emotion: info['emoji'] for emotion, info in emotions.items()}
+        self.emotion_descriptions = {emotion: info['description'] for emotion, info in emotions.items()}
+        self.emotion_images = {emotion: info['image'] for emotion, info in emotions.items()}
     
     def check_api_health(self):
         """Check if the API is running"""
@@ -169,23 +330,131 @@ class EmotionAnalysisApp:
         except:
             return False
     
-    def analyze_emotion(self, text):
+    def analyze_emotion(self, text, document=False, explain=False):
         """Send text to API for emotion analysis"""
         try:
             response = requests.post(
                 f"{self.api_url}/analyze",
-                json={"text": text}
+                json={"text": text, "document": document, "explain": explain}
             )
             return response.json()
         except Exception as e:
             return {"error": str(e), "success": False}
     
-    def batch_analyze(self, texts):
-        """Send multiple texts to API for batch analysis"""
+    def analyze_live(self, text):
+        """Analyze through the persistent stream, falling back to a plain POST"""
+        client = st.session_state.get('stream_client')
+        try:
+            if client is None:
+                client = EmotionStreamClient(self.api_url)
+                st.session_state.stream_client = client
+            return client.analyze(text)
+        except (requests.RequestException, KeyError, ValueError):
+            if client is not None:
+                client.close()
+            st.session_state.pop('stream_client', None)
+            return self.analyze_emotion(text)
+    
+    def batch_analyze(self, texts, dedup_threshold=None, timestamps=None):
+        """Send multiple texts to API for batch analysis
+        
+        Results come back in a compact columnar format without the texts
+        echoed and are decoded straight into a DataFrame. Uploads larger
+        than one request are sent in several; `timestamps` (one per text,
+        None where unknown) are passed on and kept as a `timestamp` column.
+        If a later request fails, the texts already scored are still
+        returned, with a `warning` naming how many were left out.
+        """
+        kept = [i for i, text in enumerate(texts) if text.strip()]
+        texts = [texts[i] for i in kept]
+        times = parse_timestamps([timestamps[i] for i in kept]) if timestamps is not None else None
+        response_format = 'arrow' if pa is not None else 'columnar'
+        try:
+            frames, reports, warning = [], [], None
+            for start in range(0, len(texts), BATCH_REQUEST_TEXTS):
+                body = {
+                    "texts": texts[start:start + BATCH_REQUEST_TEXTS],
+                    "format": response_format,
+                    "include_text": False,
+                    "dedup_threshold": dedup_threshold
+                }
+                if times is not None:
+                    chunk_times = times.iloc[start:start + BATCH_REQUEST_TEXTS]
+                    # Unix seconds; the backend files unknown times under the time of analysis
+                    body["timestamps"] = [
+                        None if pd.isna(value) else value.timestamp() for value in chunk_times
+                    ]
+                try:
+                    response = self._post_batch_chunk(body)
+                    if response.headers.get('Content-Type', '').startswith('application/json'):
+                        payload = response.json()
+                        if not payload.get('success'):
+                            raise RuntimeError(payload.get('error', 'Unknown error'))
+                        results_df, dedup_report = self._decode_columnar(payload), payload.get('dedup')
+                    else:
+                        results_df, dedup_report = self._decode_arrow(response.content)
+                except Exception as e:
+                    if not frames:
+                        raise
+                    # Keep what was scored; the rest of the upload can be sent again
+                    warning = f"{len(texts) - start} of {len(texts)} texts were not analyzed: {e}"
+                    break
+                results_df['index'] += start
+                frames.append(results_df)
+                reports.append(dedup_report)
+            
+            results_df = pd.concat(frames, ignore_index=True)
+            # Rows come back with their request index; rejected items are listed separately
+            results_df.insert(0, 'text', [texts[i] for i in results_df['index']])
+            if times is not None:
+                results_df['timestamp'] = times.iloc[results_df['index']].array
+            return {"results": results_df, "dedup": self._merge_dedup_reports(reports), "warning": warning, "success": True}
+        except Exception as e:
+            return {"error": str(e), "success": False}
+    
+    def _post_batch_chunk(self, body):
+        """POST one chunk, waiting out the server's Retry-After when it is rate limited"""
+        for _ in range(MAX_BATCH_RETRIES):
+            response = requests.post(f"{self.api_url}/batch_analyze", json=body)
+            if response.status_code != 429:
+                return response
+            time.sleep(float(response.headers.get('Retry-After', 1)))
+        return requests.post(f"{self.api_url}/batch_analyze", json=body)
+    
+    def _merge_dedup_reports(self, reports):
+        """One dedup report for a batch sent in several requests"""
+        reports = [report for report in reports if report]
+        if not reports:
+            return None
+        merged = {name: sum(report[name] for report in reports) for name in ('texts', 'unique_texts', 'scored', 'saved')}
+        merged['saved_ratio'] = merged['saved'] / merged['texts'] if merged['texts'] else 0.0
+        merged['threshold'] = reports[0]['threshold']
+        return merged
+    
+    def _decode_arrow(self, content):
+        """Arrow IPC stream to a DataFrame with one `prob_<label>` column per label, plus the dedup report"""
+        table = pa.ipc.open_stream(content).read_all()
+        dedup_report = json.loads(table.schema.metadata.get(b'dedup', b'null'))
+        return table.to_pandas(), dedup_report
+    
+    def _decode_columnar(self, payload):
+        results_df = pd.DataFrame({
+            'index': payload['index'],
+            'emotion': payload['emotion'],
+            'confidence': payload['confidence'],
+            'tier': payload['tier']
+        })
+        probabilities = np.asarray(payload['probabilities'], dtype=np.float32).reshape(-1, len(payload['class_names']))
+        for i, label in enumerate(payload['class_names']):
+            results_df[f'prob_{label}'] = probabilities[:, i]
+        return results_df
+    
+    def find_similar(self, text, k=10, emotion=None):
+        """Previously analyzed texts closest to `text`"""
         try:
             response = requests.post(
-                f"{self.api_url}/batch_analyze",
-                json={"texts": texts}
+                f"{self.api_url}/similar",
+                json={"text": text, "k": k, "emotion": emotion}
             )
             return response.json()
         except Exception as e:
@@ -199,6 +468,14 @@ class EmotionAnalysisApp:
         except:
             return None
     
+    def get_dataset_stats(self):
+        """Get per-emotion dataset statistics from API"""
+        try:
+            response = requests.get(f"{self.api_url}/dataset_stats")
+            return response.json().get('stats')
+        except:
+            return None
+    
     def display_emotion_result(self, result):
         """Display emotion analysis result"""
         if not result.get('success'):
@@ -209,6 +486,11 @@ class EmotionAnalysisApp:
         emotion = emotion_data['emotion']
         confidence = emotion_data['confidence']
         
+        if emotion == 'unsupported':
+            script = emotion_data.get('script') or 'unknown'
+            st.warning(f"🌐 This text does not look like English (script: {script}), so it was not analyzed. The model only supports English.")
+            return
+        
         # Display emotion with appropriate styling
         emotion_class = f"emotion-{emotion}"
         emoji = self.emotion_emojis.get(emotion, '😐')
@@ -247,6 +529,63 @@ class EmotionAnalysisApp:
         # Emotion scores breakdown
         if 'emotion_scores' in emotion_data:
             self.display_emotion_scores(emotion_data['emotion_scores'])
+        
+        # Word contributions, when the BiLSTM made the prediction
+        if emotion_data.get('explanation'):
+            self.display_explanation(result.get('text', ''), emotion_data['explanation'])
+        
+        # Per-segment breakdown for long documents
+        if 'segments' in emotion_data:
+            self.display_document_segments(result.get('text', ''), emotion_data)
+    
+    def display_explanation(self, text, explanation):
+        """Highlight the words that pushed the model toward its prediction"""
+        emotion = explanation['emotion']
+        st.subheader("🧩 Why This Emotion")
+        if not explanation['tokens']:
+            st.info("🤷 None of these words are known to the model")
+            return
+        
+        color = self.emotion_colors.get(emotion, '#95a5a6')
+        st.markdown(
+            f'<div style="font-size: 1.2em; line-height: 2;">{highlight_tokens(text, explanation["tokens"], color)}</div>',
+            unsafe_allow_html=True
+        )
+        top = sorted(explanation['tokens'], key=lambda token: token['score'], reverse=True)[:5]
+        st.caption(
+            f"Shaded words raise the probability of {emotion} ({self.emotion_emojis.get(emotion, '')}), grey ones lower it. "
+            "Strongest: " + ', '.join(f"{token['token']} ({token['score']:+.1%})" for token in top if token['score'] > 0)
+        )
+    
+    def display_document_segments(self, text, emotion_data):
+        """Show how the emotion changes across the chunks of a long document"""
+        st.subheader("📄 Document Segments")
+        st.caption(
+            f"Scored {emotion_data['chunks_scored']} of {emotion_data['chunks_total']} chunks"
+        )
+        
+        segments_df = pd.DataFrame([
+            {
+                'Segment': i + 1,
+                'Emotion': segment['emotion'],
+                'Confidence': segment['confidence'],
+                'Tokens': segment['tokens'],
+                'Text': text[segment['start']:segment['end']][:120]
+            }
+            for i, segment in enumerate(emotion_data['segments'])
+        ])
+        
+        fig = px.bar(
+            segments_df,
+            x='Segment',
+            y='Confidence',
+            color='Emotion',
+            color_discrete_map=self.emotion_colors,
+            hover_data=['Text'],
+            title="Emotion by Segment"
+        )
+        st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(segments_df, use_container_width=True)
     
     def plot_emotion_distribution(self, emotion_data):
         """Plot emotion probability distribution using Plotly"""
@@ -300,7 +639,7 @@ class EmotionAnalysisApp:
         """Display detailed emotion scores"""
         st.subheader("🎯 Emotion Score Breakdown")
         
-        cols = st.columns(5)
+        cols = st.columns(len(emotion_scores))
         for i, (emotion, score) in enumerate(emotion_scores.items()):
             with cols[i]:
                 emoji = self.emotion_emojis.get(emotion, '')
@@ -318,39 +657,36 @@ class EmotionAnalysisApp:
     
     def _darken_color(self, color, factor=0.7):
         """Darken a color for gradient effects"""
-        # Simple darkening for demo - in production use proper color manipulation
-        darker_colors = {
-            '#e74c3c': '#c0392b',
-            '#3498db': '#2980b9',
-            '#e67e22': '#d35400',
-            '#95a5a6': '#7f8c8d',
-            '#f1c40f': '#f39c12'
-        }
-        return darker_colors.get(color, color)
+        return self.emotion_dark_colors.get(color, color)
     
     def display_batch_results(self, batch_result):
         """Display results from batch analysis"""
         if not batch_result.get('success'):
             st.error(f"❌ Error: {batch_result.get('error', 'Unknown error')}")
             return
+        if batch_result.get('warning'):
+            st.warning(f"⚠️ {batch_result['warning']}")
         
         results = batch_result['results']
         
         # Create DataFrame for results
-        data = []
-        for item in results:
-            data.append({
-                'Text': item['text'][:100] + '...' if len(item['text']) > 100 else item['text'],
-                'Emotion': item['result']['emotion'],
-                'Confidence': item['result']['confidence'],
-                'Emoji': self.emotion_emojis.get(item['result']['emotion'], '😐')
-            })
-        
-        df = pd.DataFrame(data)
+        df = pd.DataFrame({
+            'Text': results['text'].where(results['text'].str.len() <= 100, results['text'].str[:100] + '...'),
+            'Emotion': results['emotion'].astype(str),
+            'Confidence': results['confidence'].astype(float),
+            'Emoji': results['emotion'].astype(str).map(lambda emotion: self.emotion_emojis.get(emotion, '😐'))
+        })
         
         # Display summary statistics with enhanced metrics
         st.subheader("📈 Analysis Summary")
         
+        dedup_report = batch_result.get('dedup')
+        if dedup_report and dedup_report['saved']:
+            st.caption(
+                f"♻️ {dedup_report['saved']} duplicate texts shared a result "
+                f"({dedup_report['saved_ratio']:.0%} less inference, {dedup_report['scored']} texts scored)"
+            )
+        
         col1, col2, col3, col4, col5 = st.columns(5)
         
         emotion_counts = df['Emotion'].value_counts()
@@ -419,9 +755,18 @@ class EmotionAnalysisApp:
             color = self.emotion_colors.get(emotion, '#95a5a6')
             return [f'background-color: {color}20; border-left: 4px solid {color}'] * len(row)
         
-        styled_df = df.style.apply(style_emotion_row, axis=1)
+        # Styling every row of a large upload would not fit in the browser
+        if len(df) > 1000:
+            st.caption(f"Showing the first 1,000 of {len(df):,} results")
+        styled_df = df.head(1000).style.apply(style_emotion_row, axis=1)
         st.dataframe(styled_df, use_container_width=True)
         
+        if 'timestamp' in results and results['timestamp'].notna().any():
+            self.display_time_series(results)
+        
+        self.display_similar_texts(results['text'])
+        self.display_batch_explanation(results['text'])
+        
         # Enhanced emotion distribution visualization
         st.subheader("🎭 Emotion Distribution")
         col1, col2 = st.columns([2, 1])
@@ -602,25 +947,14 @@ class EmotionAnalysisApp:
             </div>
             """, unsafe_allow_html=True)
         
-        # Sample data visualization
+        # Trends of the last timestamped upload from Batch Analysis
         st.subheader("📈 Emotion Trends")
         
-        # Sample trend data
-        dates = pd.date_range('2024-01-01', periods=30, freq='D')
-        trend_data = pd.DataFrame({
-            'Date': dates,
-            'Love': np.random.randint(20, 50, 30),
-            'Joyful': np.random.randint(25, 60, 30),
-            'Sad': np.random.randint(10, 30, 30),
-            'Angry': np.random.randint(5, 25, 30),
-            'Neutral': np.random.randint(15, 40, 30)
-        })
-        
-        fig = px.line(trend_data, x='Date', y=['Love', 'Joyful', 'Sad', 'Angry', 'Neutral'],
-                     title='📊 Emotion Trends Over Time',
-                     color_discrete_map=self.emotion_colors)
-        
-        st.plotly_chart(fig, use_container_width=True)
+        trend_series = st.session_state.get('trend_series')
+        if trend_series is None:
+            st.info("📁 Upload a CSV with a timestamp column in Batch Analysis to see emotion trends here")
+        else:
+            self.plot_emotion_trends(trend_series)
         
         # Quick actions
         st.subheader("🚀 Quick Actions")
@@ -671,6 +1005,11 @@ class EmotionAnalysisApp:
             text = example_options[selected_example]
             st.text_area("📄 Example text:", value=text, height=150, disabled=True)
         
+        document_mode = st.checkbox(
+            "📄 Long document mode",
+            help="💡 Split long texts into chunks, score every chunk and combine them"
+        )
+        
         if st.button("🎯 Analyze Emotion", type="primary", use_container_width=True) and text.strip():
             with st.spinner("🔍 Analyzing emotion... 🌈"):
                 # Add a cute loading animation
@@ -683,7 +1022,7 @@ class EmotionAnalysisApp:
                 time.sleep(0.5)
                 my_bar.empty()
                 
-                result = self.analyze_emotion(text)
+                result = self.analyze_emotion(text, document=document_mode, explain=not document_mode)
                 self.display_emotion_result(result)
                 
                 # Celebration for positive emotions
@@ -691,6 +1030,108 @@ class EmotionAnalysisApp:
                     st.balloons()
                     st.success("🎉 Yay! Positive emotions detected! Spread the joy! 🌈")
     
+    def display_time_series(self, results):
+        """Emotion trends of a timestamped batch, with change points"""
+        st.subheader("⏱️ Emotions Over Time")
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            window_name = st.selectbox("🪟 Window", list(TREND_WINDOWS), index=2, key='trend_window')
+        with col2:
+            rolling = st.number_input("🔁 Rolling windows", min_value=1, max_value=90, value=7, key='trend_rolling')
+        with col3:
+            metric = st.selectbox("📏 Show", ['Share', 'Rolling share', 'Count', 'Mean confidence'], key='trend_metric')
+        
+        series = emotion_time_series(
+            results['timestamp'], results['emotion'].astype(str), results['confidence'],
+            TREND_WINDOWS[window_name], int(rolling)
+        )
+        # The overview's trend chart shows the last analyzed upload
+        st.session_state.trend_series = series
+        self.plot_emotion_trends(series, metric)
+        
+        flags = series['change_points'].stack()
+        flags = flags[flags]
+        if len(flags):
+            st.write(f"**⚠️ {len(flags)} change points** (share far from the previous {int(rolling)} windows):")
+            st.dataframe(pd.DataFrame({
+                'Window': flags.index.get_level_values(0).strftime('%Y-%m-%d %H:%M'),
+                'Emotion': flags.index.get_level_values(1),
+                'Share': [series['share'].at[window, emotion] for window, emotion in flags.index],
+                'Previous share': [series['rolling_share'].shift(1).at[window, emotion] for window, emotion in flags.index],
+                'Texts': [series['counts'].loc[window].sum() for window, _ in flags.index]
+            }).round(3), use_container_width=True)
+    
+    def plot_emotion_trends(self, series, metric='Share'):
+        """Line per emotion over the windows of `emotion_time_series`, change points marked"""
+        values = {
+            'Share': series['share'],
+            'Rolling share': series['rolling_share'],
+            'Count': series['counts'],
+            'Mean confidence': series['mean_confidence']
+        }[metric]
+        
+        fig = go.Figure()
+        for emotion in values.columns:
+            color = self.emotion_colors.get(emotion, '#95a5a6')
+            fig.add_trace(go.Scatter(
+                x=values.index, y=values[emotion], mode='lines',
+                name=f"{self.emotion_emojis.get(emotion, '')} {emotion.title()}", line={'color': color}
+            ))
+            flagged = series['change_points'][emotion]
+            if flagged.any():
+                fig.add_trace(go.Scatter(
+                    x=values.index[flagged], y=values[emotion][flagged], mode='markers', showlegend=False,
+                    marker={'color': color, 'size': 11, 'symbol': 'diamond', 'line': {'width': 1, 'color': '#2d3436'}},
+                    hovertext=f'Change point: {emotion}'
+                ))
+        fig.update_layout(
+            title=f"📊 Emotion Trends Over Time (per {series['window']})",
+            xaxis_title='Window start (UTC)', yaxis_title=metric
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    
+    def display_batch_explanation(self, texts):
+        """Explain the prediction for one text of the batch"""
+        st.subheader("🧩 Explain a Result")
+        query = st.selectbox("📝 Text", texts.head(1000).tolist(), key='explain_query')
+        if st.button("🧩 Explain", key='explain_button'):
+            result = self.analyze_emotion(query, explain=True)
+            if not result.get('success'):
+                st.error(f"❌ Error: {result.get('error', 'Unknown error')}")
+            elif result['result'].get('explanation'):
+                self.display_explanation(query, result['result']['explanation'])
+            else:
+                st.info("🤷 Explanations need the BiLSTM model, which did not score this text")
+    
+    def display_similar_texts(self, texts):
+        """Search every text analyzed so far for ones like a text from this batch"""
+        st.subheader("🔎 Find Similar Texts")
+        
+        col1, col2, col3 = st.columns([3, 1, 1])
+        with col1:
+            query = st.selectbox("📝 Text", texts.head(1000).tolist(), key='similar_query')
+        with col2:
+            emotion_filter = st.selectbox("🎭 Emotion", ['any'] + self.emotion_labels, key='similar_emotion')
+        with col3:
+            k = st.number_input("🔢 Results", min_value=1, max_value=100, value=10, key='similar_k')
+        
+        if st.button("🔎 Find similar", key='similar_button'):
+            similar = self.find_similar(query, int(k), None if emotion_filter == 'any' else emotion_filter)
+            if not similar.get('success'):
+                st.error(f"❌ Error: {similar.get('error', 'Unknown error')}")
+            elif not similar['results']:
+                st.info("🤷 No similar texts found yet")
+            else:
+                similar_df = pd.DataFrame(similar['results'])
+                st.dataframe(pd.DataFrame({
+                    'Text': similar_df['text'],
+                    'Emotion': similar_df['emotion'].map(lambda emotion: f"{self.emotion_emojis.get(emotion, '')} {emotion}"),
+                    'Similarity': similar_df['similarity'].round(3),
+                    'Analyzed': pd.to_datetime(similar_df['timestamp'], unit='s').dt.strftime('%Y-%m-%d %H:%M')
+                }), use_container_width=True)
+                st.caption(f"⚡ {similar['query_ms']:.1f} ms over {similar['index']['items']} analyzed texts")
+    
     def batch_analysis(self):
         """Batch analysis interface"""
         st.header("📚 Batch Text Analysis")
@@ -699,9 +1140,9 @@ class EmotionAnalysisApp:
         
         # Enhanced file upload
         uploaded_file = st.file_uploader(
-            "📁 Upload a text file (one text per line)",
+            "📁 Upload a text file (one text per line) or a CSV",
             type=['txt', 'csv'],
-            help="💡 Supported formats: .txt, .csv. Each line should contain one text to analyze."
+            help="💡 .txt: one text per line. .csv: pick the text column and, for trends over time, a timestamp column."
         )
         
         # Manual input with better UI
@@ -714,8 +1155,35 @@ class EmotionAnalysisApp:
         )
         
         texts_to_analyze = []
+        timestamps = None
         
-        if uploaded_file is not None:
+        if uploaded_file is not None and uploaded_file.name.lower().endswith('.csv'):
+            upload_df = pd.read_csv(uploaded_file)
+            columns = list(upload_df.columns)
+            col1, col2 = st.columns(2)
+            with col1:
+                text_column = st.selectbox(
+                    "📝 Text column", columns,
+                    index=next((i for i, name in enumerate(columns) if str(name).lower() in ('text', 'message', 'feedback')), 0)
+                )
+            with col2:
+                time_options = ['(none)'] + columns
+                timestamp_column = st.selectbox(
+                    "🕒 Timestamp column", time_options,
+                    index=next((i for i, name in enumerate(time_options)
+                                if any(word in str(name).lower() for word in ('time', 'date', 'created'))), 0),
+                    help="💡 ISO dates or Unix seconds; rows are grouped into time windows after scoring"
+                )
+            keep = upload_df[text_column].notna()
+            texts_to_analyze = upload_df.loc[keep, text_column].astype(str).str.strip().tolist()
+            if timestamp_column != '(none)':
+                parsed = parse_timestamps(upload_df.loc[keep, timestamp_column])
+                timestamps = parsed.tolist()
+                unparsed = int(parsed.isna().sum())
+                if unparsed:
+                    st.warning(f"⚠️ {unparsed} timestamps could not be read; those rows are left out of the trends")
+            st.success(f"✅ Loaded {len(texts_to_analyze)} texts from file 📁")
+        elif uploaded_file is not None:
             # Read uploaded file
             content = uploaded_file.getvalue().decode("utf-8")
             texts_to_analyze = [line.strip() for line in content.split('\n') if line.strip()]
@@ -724,6 +1192,8 @@ class EmotionAnalysisApp:
         if manual_texts:
             manual_texts_list = [line.strip() for line in manual_texts.split('\n') if line.strip()]
             texts_to_analyze.extend(manual_texts_list)
+            if timestamps is not None:
+                timestamps.extend([None] * len(manual_texts_list))
         
         if texts_to_analyze:
             st.info(f"📊 Total texts to analyze: **{len(texts_to_analyze)}**")
@@ -735,10 +1205,21 @@ class EmotionAnalysisApp:
                 if len(texts_to_analyze) > 5:
                     st.write(f"📋 ... and **{len(texts_to_analyze) - 5}** more texts")
             
+            near_duplicates = st.checkbox(
+                "♻️ Merge near-duplicate texts",
+                help="💡 Exact repeats always share one result; this also merges templated or lightly edited copies"
+            )
+            dedup_threshold = None
+            if near_duplicates:
+                dedup_threshold = st.slider("🎚️ Similarity threshold", 0.5, 1.0, 0.9, 0.05)
+            
             if st.button("🚀 Analyze All Texts", type="primary", use_container_width=True):
                 with st.spinner(f"🔍 Analyzing {len(texts_to_analyze)} texts... 🌈"):
-                    batch_result = self.batch_analyze(texts_to_analyze)
-                    self.display_batch_results(batch_result)
+                    # Kept across reruns so the similar-text search below can use it
+                    st.session_state.batch_result = self.batch_analyze(texts_to_analyze, dedup_threshold, timestamps)
+            
+            if 'batch_result' in st.session_state:
+                self.display_batch_results(st.session_state.batch_result)
     
     def real_time_demo(self):
         """Real-time emotion analysis demo"""
@@ -757,16 +1238,8 @@ class EmotionAnalysisApp:
         )
         
         if demo_text:
-            # Simulate real-time analysis with enhanced visual feedback
             with st.spinner("🔍 Analyzing in real-time... ⚡"):
-                # Show typing animation
-                typing_placeholder = st.empty()
-                for i in range(3):
-                    typing_placeholder.markdown(f"🔍 Processing{'.' * (i + 1)}")
-                    time.sleep(0.3)
-                typing_placeholder.empty()
-                
-                result = self.analyze_emotion(demo_text)
+                result = self.analyze_live(demo_text)
                 
                 if result.get('success'):
                     emotion_data = result['result']
@@ -832,6 +1305,7 @@ class EmotionAnalysisApp:
         st.write("🎓 Learn about the different emotions this system can detect. Understand what each emotion means and see examples!")
         
         emotion_info = self.get_emotion_info()
+        dataset_stats = self.get_dataset_stats() or {}
         
         if emotion_info and emotion_info.get('success'):
             emotions_data = emotion_info['emotions']
@@ -945,6 +1419,14 @@ class EmotionAnalysisApp:
                             st.write("**🔍 Physical Signs:**")
                             for sign in info.get('physical_signs', []):
                                 st.write(f"• {sign}")
+                        
+                        # Statistics precomputed by backend/dataset_index.py
+                        stats = dataset_stats.get(emotion)
+                        if stats:
+                            st.write("**📊 In the Training Data:**")
+                            st.write(f"• {stats['rows']:,} texts ({stats['share']:.1%} of the dataset)")
+                            st.write(f"• {stats['mean_tokens']:.1f} words on average")
+                            st.write(f"• Most frequent words: {', '.join(stats['top_words'])}")
                 
                 st.markdown("---")
 
@@ -1,17 +1,42 @@
 # app.py
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 import pickle
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.sequence import pad_sequences
 import re
 import nltk
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 from nltk.stem import WordNetLemmatizer
 import os
+import atexit
+import hashlib
+import hmac
+import queue
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from numpy_bilstm import NumpyBiLSTM
+from cascade import cascade_predict
+from metrics import ServingMetrics
+from label_schema import LabelSchema
+from streaming import StreamHub
+from validation import RequestLimits, check_text, validate_texts, ERROR_MESSAGES
+from encoding import negotiate_format, encode_results
+from dedup import deduplicate
+from emoji_features import EmojiFeatures
+from chunking import chunk_document, select_chunks, aggregate_distributions
+from incremental import IncrementalSession, SessionStore, WORD_PATTERN
+from model_registry import ModelRegistry, ModelVersion, file_digest
+from result_cache import ResultCache
+from prediction_store import PredictionStore, prediction_key
+from shadow import ComparisonStore, ShadowScorer
+from profiler import SamplingProfiler
+from similarity import SimilarityIndex
+from scheduler import FairScheduler, Backpressure, INTERACTIVE, client_key_id, parse_weights
 
 # Download required NLTK data
 try:
@@ -32,24 +57,310 @@ except LookupError:
 app = Flask(__name__)
 CORS(app)
 
+# Oversized bodies are refused from Content-Length before they are read
+limits = RequestLimits()
+app.config['MAX_CONTENT_LENGTH'] = limits.max_request_bytes
+
+# Admin endpoints stay disabled unless a token is configured
+ADMIN_TOKEN = os.environ.get('EMOTION_ADMIN_TOKEN')
+profiler = SamplingProfiler()
+
+@app.before_request
+def start_request_profiling():
+    profiler.request_started()
+
+@app.teardown_request
+def finish_request_profiling(exception=None):
+    profiler.request_finished()
+
 class EmotionAnalyzer:
     def __init__(self):
-        self.model = None
+        # Models served together; replaced as a whole when a new version is loaded
+        self.serving = ModelVersion('unversioned')
         self.tokenizer = None
         self.lemmatizer = WordNetLemmatizer()
-        self.stop_words = set(stopwords.words('english'))
-        self.max_length = 66
-        self.class_names = ['love', 'sad', 'angry', 'neutral', 'joyful']
+        try:
+            self.stop_words = set(stopwords.words('english'))
+        except LookupError:
+            # Without NLTK data the backend still starts; model inputs keep their stopwords
+            print("NLTK stopwords not found. Model inputs will keep stopwords.")
+            self.stop_words = set()
+        # Shared label schema: display labels plus the model -> display gather index
+        self.label_schema = LabelSchema.load()
+        self.class_names = self.label_schema.display_labels
+        self.language_detector = None
+        self.results_cache = ResultCache()
+        # Shared on-disk results; opened by the server and bulk scoring, not by default
+        self.prediction_store = None
+        self.preload_size = 20000
+        self.reload_lock = threading.Lock()
+        self.reload_status = {'state': 'idle', 'version': None, 'error': None}
+        self.warmup_size = 256
+        # Candidate version for A/B routing and shadow scoring
+        self.candidate = None
+        self.candidate_fraction = 0.0
+        self.shadow_mode = False
+        self.comparisons = ComparisonStore()
+        # Sentence vectors of analyzed texts for /similar, added off the request path
+        self.similarity = None
+        self.similarity_queue = queue.Queue(maxsize=256)
+        self._similarity_worker = None
+        self.shadow = ShadowScorer(
+            lambda texts, mode, threshold, serving: self._predict_supported(texts, mode, threshold, serving, live=False),
+            self.comparisons
+        )
+        self.modes = ('model', 'fast', 'cascade', 'emotion_based')
+        # Texts whose fast-model top-class margin is below this go to the BiLSTM
+        self.cascade_threshold = 0.3
+        self.max_document_chunks = 64
+        self.metrics = ServingMetrics()
+        # Model passes of API requests are queued by priority and shared fairly across clients
+        self.scheduler = FairScheduler(weights=parse_weights(os.environ.get('EMOTION_CLIENT_WEIGHTS')))
+        
+        # Emotion word dictionaries for the emotion-based analysis
+        self.emotion_words = {
+            'love': ['love', 'adore', 'cherish', 'affection', 'romantic', 'heart', 'beloved',
+                     'sweetheart', 'darling', 'passion', 'devotion', 'fond', 'caring'],
+            'sad': ['sad', 'unhappy', 'depressed', 'miserable', 'gloomy', 'heartbroken',
+                    'sorrow', 'grief', 'tearful', 'melancholy', 'blue', 'down', 'hopeless'],
+            'angry': ['angry', 'mad', 'furious', 'outraged', 'irritated', 'annoyed', 'frustrated',
+                      'rage', 'hostile', 'bitter', 'resentful', 'livid', 'fuming', 'infuriated'],
+            'joyful': ['joyful', 'happy', 'delighted', 'ecstatic', 'cheerful', 'blissful',
+                       'jubilant', 'elated', 'thrilled', 'excited', 'euphoric', 'gleeful', 'merry'],
+            'neutral': ['okay', 'fine', 'alright', 'normal', 'regular', 'usual', 'typical',
+                        'moderate', 'average', 'standard', 'neutral', 'balanced']
+        }
+        # Emoji and emoticon counts from one codepoint table lookup per batch
+        self.emoji_features = EmojiFeatures()
+        self.heuristic_emotions = list(dict.fromkeys(list(self.emotion_words) + self.emoji_features.emotions))
+        self.emoji_heuristic_index = [self.heuristic_emotions.index(e) for e in self.emoji_features.emotions]
+        self.emoji_display_index = [self.class_names.index(e) for e in self.emoji_features.emotions]
+        # Log-linear weight of each emoji/emoticon on model probabilities
+        self.emoji_weight = 1.0
+        
+        # (word, emotion index) of every emotion word, plus the matches of recently seen tokens
+        self.lexicon = [
+            (word, self.heuristic_emotions.index(emotion)) for emotion, words in self.emotion_words.items() for word in words
+        ]
+        self.lexicon_matches = {}
+        self.sessions = SessionStore()
         
+    # Read-only views of the serving models, for callers outside a request
+    @property
+    def model(self):
+        return self.serving.model
+    
+    @property
+    def fast_model(self):
+        return self.serving.fast_model
+    
+    @property
+    def model_class_names(self):
+        return self.serving.model_class_names
+    
+    @property
+    def max_length(self):
+        return self.serving.max_length
+    
+    @property
+    def is_mock_model(self):
+        return self.serving.is_mock_model
+    
+    @property
+    def model_version(self):
+        return self.serving.version
+    
     def load_model(self, model_path):
         """Load the pre-trained BiLSTM model"""
         try:
-            self.model = load_model(model_path)
+            if model_path.endswith('.npz'):
+                # NumPy engine: same forward pass without importing TensorFlow
+                model = NumpyBiLSTM(model_path)
+            else:
+                # TensorFlow is only imported when a Keras model is served
+                from tensorflow.keras.models import load_model
+                model = load_model(model_path)
+            digests = dict(self.serving.digests, model=file_digest(model_path))
+            self.serving = self.serving.replace(model=model, is_mock_model=False, digests=digests)
             print("Model loaded successfully")
         except Exception as e:
             print(f"Error loading model: {e}")
             # If loading fails, create a mock model for demonstration
-            self.model = self._create_mock_model()
+            digests = {name: digest for name, digest in self.serving.digests.items() if name != 'model'}
+            self.serving = self.serving.replace(model=self._create_mock_model(), is_mock_model=True, digests=digests)
+    
+    def load_fast_model(self, model_path):
+        """Load the hashed n-gram fast-path model"""
+        try:
+            from fast_model import FastEmotionModel
+            fast_model = FastEmotionModel.load(model_path)
+            digests = dict(self.serving.digests, fast_model=file_digest(model_path))
+            self.serving = self.serving.replace(fast_model=fast_model, digests=digests)
+            print(f"Fast model loaded (test accuracy: {fast_model.accuracy.get('test', 0):.2%})")
+        except Exception as e:
+            print(f"Error loading fast model: {e}")
+            self.serving = self.serving.replace(fast_model=None)
+    
+    def load_version(self, registry, version=None):
+        """Load a registry version, warm it up and make it the serving version
+        
+        Requests that started before the swap keep the version they picked
+        up, so nothing in flight sees a half-loaded or mixed set of models.
+        """
+        version = version or registry.latest()
+        if version is None:
+            raise ValueError(f'No model versions in {registry.root}')
+        
+        with self.reload_lock:
+            self.reload_status = {'state': 'loading', 'version': version, 'error': None}
+            try:
+                serving = registry.load(version)
+                started = time.time()
+                self.warm_up(serving)
+                self.preload_predictions(serving)
+                print(f"Model version {version} warmed up in {time.time() - started:.2f}s")
+            except Exception as e:
+                self.reload_status = {'state': 'failed', 'version': version, 'error': str(e)}
+                self.metrics.increment('model_reload_failures')
+                raise
+            
+            previous = self.serving.version
+            self.serving = serving
+            self.reload_status = {'state': 'idle', 'version': version, 'error': None}
+            self.metrics.increment('model_reloads')
+            print(f"Serving model version {version} (was {previous})")
+    
+    def reload_in_background(self, registry, version=None):
+        """Start `load_version` on a worker thread; False if a reload is already running"""
+        if self.reload_lock.locked():
+            return False
+        
+        def run():
+            try:
+                self.load_version(registry, version)
+            except Exception as e:
+                print(f"Error loading model version {version or 'latest'}: {e}")
+        
+        threading.Thread(target=run, daemon=True).start()
+        return True
+    
+    def watch_registry(self, registry, interval=30):
+        """Poll the registry and load each newly published version in the background"""
+        def run():
+            while True:
+                time.sleep(interval)
+                latest = registry.latest()
+                failed = self.reload_status['state'] == 'failed' and self.reload_status['version'] == latest
+                if latest is not None and latest != self.serving.version and not failed:
+                    self.reload_in_background(registry, latest)
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def open_prediction_store(self, path, **options):
+        """Share results with other processes and later runs through a SQLite file"""
+        try:
+            self.prediction_store = PredictionStore(path, **options)
+            print(f"Prediction store opened ({self.prediction_store.rows} results)")
+        except Exception as e:
+            print(f"Error opening prediction store: {e}")
+    
+    def _store_model(self, serving, mode):
+        """Key of a version's results in the prediction store; None when they aren't stored"""
+        if self.prediction_store is None or mode == 'emotion_based' or serving.fingerprint is None:
+            return None
+        # Stored probabilities are in display order, so the labels are part of the key
+        return hashlib.sha256(f"{serving.fingerprint}|{','.join(self.class_names)}".encode()).hexdigest()[:16]
+    
+    def preload_predictions(self, serving, limit=None):
+        """Copy a version's most-hit stored results into the in-memory cache"""
+        store_model = self._store_model(serving, 'model')
+        if store_model is None:
+            return 0
+        rows = self.prediction_store.hot(store_model, limit or self.preload_size)
+        for _, result in rows:
+            result['class_names'] = self.class_names
+        self.results_cache.put_many([(serving.version, key) for key, _ in rows], [result for _, result in rows])
+        if rows:
+            print(f"Preloaded {len(rows)} stored results for version {serving.version}")
+        return len(rows)
+    
+    def warm_up(self, serving, texts=None):
+        """Run a new version over sample inputs before it takes traffic
+        
+        The first batches through a freshly loaded model pay for lazy
+        initialisation and cold caches; running validation texts through
+        each of the version's models moves that cost off live requests.
+        """
+        if texts is None:
+            from fast_model import DATASET_DIR, load_dataset
+            texts, _ = load_dataset(os.path.join(DATASET_DIR, 'val.txt'))
+            texts = texts[:self.warmup_size]
+        modes = ['model', 'emotion_based'] if serving.has_numpy_model() else ['emotion_based']
+        if serving.fast_model is not None:
+            modes.append('fast')
+        for mode in modes:
+            self._predict_supported(texts, mode, None, serving, live=False)
+    
+    def set_candidate(self, registry, version, fraction=0.0, shadow=False):
+        """Load a registry version next to the serving one for A/B routing and shadow scoring
+        
+        `fraction` of prediction batches are answered by the candidate; with
+        `shadow`, the rest are also scored by the candidate off the request
+        path and compared with what was served.
+        """
+        if isinstance(fraction, bool) or not isinstance(fraction, (int, float)) or not 0 <= fraction <= 1:
+            raise ValueError('Fraction must be a number between 0 and 1')
+        if version == self.serving.version:
+            raise ValueError(f"Version '{version}' is already serving")
+        
+        candidate = registry.load(version)
+        self.warm_up(candidate)
+        self.clear_candidate()
+        self.candidate_fraction = float(fraction)
+        self.shadow_mode = bool(shadow)
+        self.candidate = candidate
+        print(f"Candidate model version {version} (fraction {fraction:.0%}, shadow {'on' if shadow else 'off'})")
+    
+    def clear_candidate(self):
+        self.candidate = None
+        self.candidate_fraction = 0.0
+        self.shadow_mode = False
+    
+    def promote_candidate(self):
+        """Make the candidate the serving version"""
+        candidate = self.candidate
+        if candidate is None:
+            raise ValueError('No candidate model version')
+        self.clear_candidate()
+        previous = self.serving.version
+        self.serving = candidate
+        self.metrics.increment('model_promotions')
+        print(f"Promoted model version {candidate.version} (was {previous})")
+    
+    def comparison_summary(self):
+        candidate = self.candidate
+        if candidate is None:
+            return None
+        return self.comparisons.summary(self.serving.version, candidate.version)
+    
+    def pick_version(self, mode):
+        """Version that answers one prediction batch"""
+        candidate = self.candidate
+        if (candidate is not None and mode != 'emotion_based' and candidate.supports(mode)
+                and random.random() < self.candidate_fraction):
+            self.metrics.increment('ab_candidate_batches')
+            return candidate
+        return self.serving
+    
+    def load_language_profile(self, profile_path):
+        """Load the script/language pre-stage (build with `python language.py`)"""
+        try:
+            from language import LanguageDetector
+            self.language_detector = LanguageDetector.load(profile_path)
+            print("Language profile loaded")
+        except Exception as e:
+            print(f"Error loading language profile: {e}")
+            self.language_detector = None
     
     def _create_mock_model(self):
         """Create a mock model for demonstration purposes"""
@@ -60,7 +371,7 @@ class EmotionAnalyzer:
             Embedding(17097, 300, input_length=66, trainable=False),
             Bidirectional(LSTM(64, dropout=0.2, recurrent_dropout=0.2)),
             Dropout(0.2),
-            Dense(5, activation='softmax')  # Updated to 5 classes
+            Dense(len(self.label_schema.model_labels), activation='softmax')
         ])
         
         # Use random weights for demonstration
@@ -82,63 +393,341 @@ class EmotionAnalyzer:
         
         return ' '.join(tokens)
     
-    def predict_emotion(self, text):
+    def prepare_model_input(self, text):
+        """Clean text the way the training notebook did (lowercase, no stopwords)"""
+        text = re.sub(r'[^a-z\s]', ' ', text.lower())
+        return ' '.join(token for token in text.split() if token not in self.stop_words)
+    
+    def predict_emotion(self, text, mode='model', threshold=None, client=None, priority=INTERACTIVE, serving=None):
         """Predict emotion for given text"""
-        if self.model is None:
-            return self._mock_prediction(text)
+        return self.predict_batch([text], mode, threshold, client, priority, serving)[0]
+    
+    def predict_batch(self, texts, mode='model', threshold=None, client=None, priority=INTERACTIVE, serving=None):
+        """Predict emotions for a list of texts in one model pass
+        
+        With a `client`, the texts that miss the cache are scored through the
+        scheduler at `priority`; without one they are scored on this thread.
+        `serving` pins the model version; by default one is routed per batch.
+        """
+        if mode not in self.modes:
+            raise ValueError(f"Unknown mode '{mode}', expected one of {', '.join(self.modes)}")
+        self.metrics.increment(f'texts_{mode}', len(texts))
+        # Picked once: the whole batch is scored by one version even if a reload lands meanwhile
+        serving = self.pick_version(mode) if serving is None else serving
         
-        # Preprocess text
-        processed_text = self.preprocess_text(text)
+        keys = [prediction_key(mode, threshold, text) for text in texts]
+        cache_keys = [(serving.version, key) for key in keys]
+        results = self.results_cache.get_many(cache_keys)
+        missing = [i for i, result in enumerate(results) if result is None]
+        self.metrics.increment('cache_hits', len(texts) - len(missing))
+        self.metrics.increment('cache_lookups', len(texts))
         
-        # For demonstration, we'll use emotion-based approach
-        return self._emotion_based_analysis(text)
+        store_model = self._store_model(serving, mode)
+        if missing and store_model is not None:
+            stored = self.prediction_store.get_many(store_model, [keys[i] for i in missing])
+            found = [(i, result) for i, result in zip(missing, stored) if result is not None]
+            for i, result in found:
+                result['class_names'] = self.class_names
+                results[i] = result
+            self.results_cache.put_many([cache_keys[i] for i, _ in found], [result for _, result in found])
+            self.metrics.increment('store_hits', len(found))
+            self.metrics.increment('store_lookups', len(missing))
+            missing = [i for i in missing if results[i] is None]
+        
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            if client is None:
+                started = time.perf_counter()
+                scored = self._predict_uncached(missing_texts, mode, threshold, serving)
+                seconds = time.perf_counter() - started
+            else:
+                scored, seconds = self.scheduler.run(
+                    client, priority, missing_texts,
+                    lambda chunk: self._predict_uncached(chunk, mode, threshold, serving)
+                )
+            self._observe(serving, mode, threshold, missing_texts, scored, seconds)
+            self.results_cache.put_many([cache_keys[i] for i in missing], scored)
+            for i, result in zip(missing, scored):
+                results[i] = result
+            if store_model is not None:
+                # Unsupported texts depend on the language profile, not the model
+                kept = [(i, result) for i, result in zip(missing, scored) if result['tier'] != 'unsupported']
+                self.prediction_store.put_many(
+                    store_model, [keys[i] for i, _ in kept],
+                    [{name: value for name, value in result.items() if name != 'class_names'} for _, result in kept]
+                )
+        return results
     
-    def _emotion_based_analysis(self, text):
-        """Emotion-based analysis as fallback"""
-        # Emotion word dictionaries
-        love_words = ['love', 'adore', 'cherish', 'affection', 'romantic', 'heart', 'beloved', 
-                     'sweetheart', 'darling', 'passion', 'devotion', 'fond', 'caring']
+    def _observe(self, serving, mode, threshold, texts, results, seconds):
+        """Queue latency records and shadow comparisons while a candidate is set"""
+        candidate = self.candidate
+        if candidate is None or mode == 'emotion_based' or not candidate.supports(mode):
+            return
+        if serving is candidate or not self.shadow_mode:
+            self.shadow.submit_latency(serving.version, 'live', mode, len(texts), seconds)
+            return
         
-        sad_words = ['sad', 'unhappy', 'depressed', 'miserable', 'gloomy', 'heartbroken', 
-                    'sorrow', 'grief', 'tearful', 'melancholy', 'blue', 'down', 'hopeless']
+        # Unsupported texts never reach a model, so there is nothing to compare
+        kept = [(text, result) for text, result in zip(texts, results) if result['tier'] != 'unsupported']
+        if not kept:
+            return
+        submitted = self.shadow.submit_comparison(
+            serving.version, candidate, mode, threshold,
+            [text for text, _ in kept], [result for _, result in kept], seconds
+        )
+        self.metrics.increment('shadow_batches' if submitted else 'shadow_dropped')
+    
+    def _predict_uncached(self, texts, mode, threshold, serving):
+        if self.language_detector is None:
+            return self._predict_supported(texts, mode, threshold, serving)
         
-        angry_words = ['angry', 'mad', 'furious', 'outraged', 'irritated', 'annoyed', 'frustrated',
-                      'rage', 'hostile', 'bitter', 'resentful', 'livid', 'fuming', 'infuriated']
+        # Non-English texts would only produce a meaningless "neutral", so
+        # they are answered here and never reach a model
+        supported, scripts, languages = self.language_detector.detect(texts)
+        if supported.all():
+            return self._predict_supported(texts, mode, threshold, serving)
+        self.metrics.increment('texts_unsupported', int((~supported).sum()))
         
-        joyful_words = ['joyful', 'happy', 'delighted', 'ecstatic', 'cheerful', 'blissful', 
-                       'jubilant', 'elated', 'thrilled', 'excited', 'euphoric', 'gleeful', 'merry']
+        kept = [text for text, ok in zip(texts, supported) if ok]
+        kept_results = iter(self._predict_supported(kept, mode, threshold, serving) if kept else [])
+        return [
+            next(kept_results) if ok else self._unsupported_result(script, language)
+            for ok, script, language in zip(supported, scripts, languages)
+        ]
+    
+    def _predict_supported(self, texts, mode, threshold, serving, live=True):
+        if mode == 'fast':
+            if serving.fast_model is None:
+                raise ValueError('Fast model is not loaded')
+            probabilities = serving.fast_model.predict_proba(texts)
+            return self._format_model_results(probabilities, serving.fast_model.class_names, 'fast', texts)
         
-        neutral_words = ['okay', 'fine', 'alright', 'normal', 'regular', 'usual', 'typical',
-                        'moderate', 'average', 'standard', 'neutral', 'balanced']
+        if mode == 'cascade':
+            return self._cascade_batch(texts, threshold, serving, live)
         
-        text_lower = text.lower()
-        
-        # Count emotion words
-        love_count = sum(1 for word in love_words if word in text_lower)
-        sad_count = sum(1 for word in sad_words if word in text_lower)
-        angry_count = sum(1 for word in angry_words if word in text_lower)
-        joyful_count = sum(1 for word in joyful_words if word in text_lower)
-        neutral_count = sum(1 for word in neutral_words if word in text_lower)
-        
-        # Also check for emoticons and emojis
-        if '❤' in text or '💕' in text or '😍' in text or '😘' in text:
-            love_count += 2
-        if '😢' in text or '😭' in text or '💔' in text:
-            sad_count += 2
-        if '😠' in text or '😡' in text or '💢' in text:
-            angry_count += 2
-        if '😊' in text or '😂' in text or '🎉' in text or '🥳' in text:
-            joyful_count += 2
-        
-        # Calculate scores
-        emotion_scores = {
-            'love': love_count,
-            'sad': sad_count,
-            'angry': angry_count,
-            'joyful': joyful_count,
-            'neutral': neutral_count
+        if mode == 'emotion_based' or not serving.has_numpy_model():
+            # Only the exported NumPy weights carry the vocabulary and label order;
+            # Keras and mock models keep using the emotion-based analysis
+            emoji_counts = self.emoji_features.counts(texts)
+            return [self._emotion_based_analysis(text, counts) for text, counts in zip(texts, emoji_counts)]
+        
+        # Score every text in a single padded batch
+        probabilities = self._predict_texts(texts, serving)
+        return self._format_model_results(probabilities, serving.model_class_names, 'model', texts)
+    
+    def predict_batch_deduplicated(self, texts, mode='model', threshold=None, dedup_threshold=None,
+                                   client=None, priority=INTERACTIVE, serving=None):
+        """Score one representative per group of duplicate texts and fan the results out
+        
+        Returns (results, report); `dedup_threshold` enables near-duplicate
+        grouping at that Jaccard similarity, None merges exact repeats only.
+        """
+        representatives, assignment, report = deduplicate(texts, dedup_threshold)
+        self.metrics.increment('dedup_texts', len(texts))
+        self.metrics.increment('dedup_saved', report['saved'])
+        
+        unique_results = (
+            self.predict_batch([texts[i] for i in representatives], mode, threshold, client, priority, serving)
+            if representatives else []
+        )
+        return [unique_results[group] for group in assignment], report
+    
+    def analyze_document(self, text, mode='model', threshold=None, max_chunks=None, client=None, priority=INTERACTIVE):
+        """Score a long text chunk by chunk in one batch and aggregate the results
+        
+        The BiLSTM only reads `max_length` tokens, so longer texts are split
+        into sentence-aligned chunks of that size. At most `max_chunks` chunks,
+        spread evenly over the document, are scored.
+        """
+        max_chunks = max_chunks or self.max_document_chunks
+        chunks = chunk_document(text, self.max_length)
+        if not chunks:
+            raise ValueError('Empty text provided')
+        
+        selected = [chunks[i] for i in select_chunks(len(chunks), max_chunks)]
+        results = self.predict_batch([text[start:end] for start, end, _ in selected], mode, threshold, client, priority)
+        self.metrics.increment('document_chunks', len(selected))
+        
+        # Unsupported chunks carry no distribution and are left out of the mean
+        scored = [
+            (result, n_tokens) for result, (_, _, n_tokens) in zip(results, selected)
+            if result['tier'] != 'unsupported'
+        ]
+        if not scored:
+            return dict(results[0], chunks_total=len(chunks), chunks_scored=len(selected), segments=[])
+        probabilities = aggregate_distributions(
+            [result['probabilities'] for result, _ in scored],
+            [n_tokens for _, n_tokens in scored]
+        )
+        best = int(np.argmax(probabilities))
+        
+        return {
+            'emotion': self.class_names[best],
+            'confidence': float(probabilities[best]),
+            'probabilities': probabilities.tolist(),
+            'class_names': self.class_names,
+            'tier': 'document',
+            'chunks_total': len(chunks),
+            'chunks_scored': len(selected),
+            'segments': [
+                {
+                    'start': start,
+                    'end': end,
+                    'tokens': n_tokens,
+                    'emotion': result['emotion'],
+                    'confidence': result['confidence'],
+                    'probabilities': result['probabilities'],
+                    'tier': result['tier']
+                }
+                for (start, end, n_tokens), result in zip(selected, results)
+            ]
         }
+    
+    def has_numpy_model(self):
+        """Whether real BiLSTM weights are loaded"""
+        return self.serving.has_numpy_model()
+    
+    def _cascade_batch(self, texts, threshold, serving, live=True):
+        """Fast model first, BiLSTM only for texts it is unsure about"""
+        if serving.fast_model is None or not serving.has_numpy_model():
+            raise ValueError('Cascade mode needs both the fast model and the BiLSTM weights')
+        if serving.fast_model.class_names != serving.model_class_names:
+            raise ValueError('Fast model and BiLSTM use different label orders')
+        
+        threshold = self.cascade_threshold if threshold is None else threshold
+        probabilities, escalated = cascade_predict(
+            texts, serving.fast_model.predict_proba, lambda batch: self._predict_texts(batch, serving), threshold
+        )
+        
+        if live:
+            self.metrics.increment('cascade_texts', len(texts))
+            self.metrics.increment('cascade_escalated', int(escalated.sum()))
+        
+        tiers = np.where(escalated, 'model', 'fast')
+        return self._format_model_results(probabilities, serving.model_class_names, tiers, texts)
+    
+    def _predict_texts(self, texts, serving):
+        """Clean raw texts and run the BiLSTM over them in one batch"""
+        return serving.model.predict_texts([self.prepare_model_input(text) for text in texts])
+    
+    def explain(self, texts, results, serving, max_words, client=None, priority=INTERACTIVE):
+        """Copies of `results` with per-word contributions to the predicted emotion
+        
+        A word's score is the drop in the BiLSTM's probability of the
+        predicted emotion when the word is left out, so positive words argue
+        for it and negative ones against. Only results the BiLSTM produced are
+        explained. Texts are taken in order until `max_words` words are
+        spent; the others get `explanation: None`. Cached results are never
+        modified. `serving` must be the version that produced `results`, so
+        the scores come from the same weights as the prediction.
+        """
+        explanations = {}
+        if serving.has_numpy_model():
+            cleaned, spent = {}, 0
+            for text, result in zip(texts, results):
+                if result.get('tier') != 'model' or text in cleaned:
+                    continue
+                model_input = self.prepare_model_input(text)
+                words = min(len(model_input.split()), serving.max_length)
+                if spent + words > max_words:
+                    break
+                spent += words
+                cleaned[text] = model_input
+        
+            if cleaned:
+                occlude = lambda chunk: serving.model.occlusion(chunk)
+                if client is None:
+                    occluded = occlude(list(cleaned.values()))
+                else:
+                    occluded, _ = self.scheduler.run(client, priority, list(cleaned.values()), occlude)
+                for text, (words, probabilities) in zip(cleaned, occluded):
+                    explanations[text] = (words, self.label_schema.to_display(probabilities, serving.model_class_names))
+                self.metrics.increment('explained_texts', len(cleaned))
+                self.metrics.increment('explained_words', spent)
+        
+        explained = []
+        for text, result in zip(texts, results):
+            explanation = None
+            if text in explanations and result.get('tier') == 'model':
+                words, probabilities = explanations[text]
+                column = probabilities[:, self.class_names.index(result['emotion'])]
+                explanation = {
+                    'emotion': result['emotion'],
+                    'tokens': [{'token': word, 'score': float(score)} for word, score in zip(words, column[0] - column[1:])]
+                }
+            explained.append(dict(result, explanation=explanation))
+        return explained
+    
+    def _format_model_results(self, probabilities, class_names, tiers, texts=None):
+        """Remap model probabilities to the display labels and build API results"""
+        # One gather moves every row from model label order to display order
+        display_probabilities = self.label_schema.to_display(probabilities, class_names)
+        if texts is not None and self.emoji_weight:
+            display_probabilities = self._apply_emoji_evidence(display_probabilities, texts)
+        best = display_probabilities.argmax(axis=1)
+        if isinstance(tiers, str):
+            tiers = [tiers] * len(display_probabilities)
+        
+        return [
+            {
+                'emotion': self.class_names[index],
+                'confidence': float(row[index]),
+                'probabilities': row.tolist(),
+                'class_names': self.class_names,
+                'tier': str(tier)
+            }
+            for row, index, tier in zip(display_probabilities, best, tiers)
+        ]
+    
+    def _apply_emoji_evidence(self, display_probabilities, texts):
+        """Shift model probabilities toward the emotions of the emoji in each text
+        
+        Preprocessing removes emoji and the models never saw any in training,
+        so their counts are added on the log scale after the forward pass.
+        """
+        counts = self.emoji_features.counts(texts)[:, :len(self.emoji_display_index)]
+        rows = counts.any(axis=1)
+        if not rows.any():
+            return display_probabilities
+        
+        evidence = np.zeros((int(rows.sum()), display_probabilities.shape[1]))
+        evidence[:, self.emoji_display_index] = counts[rows]
+        adjusted = display_probabilities.copy()
+        adjusted[rows] *= np.exp(self.emoji_weight * evidence)
+        adjusted[rows] /= adjusted[rows].sum(axis=1, keepdims=True)
+        return adjusted
+    
+    def _emotion_based_analysis(self, text, emoji_counts=None):
+        """Emotion-based analysis as fallback"""
+        counts, _ = self.heuristic_counts(text, emoji_counts)
+        return self._emotion_scores_result(dict(zip(self.heuristic_emotions, counts.tolist())))
+    
+    def heuristic_counts(self, text, emoji_counts=None):
+        """Emotion word and emoji counts of a text per heuristic emotion, plus its token count
+        
+        A token counts once for every emotion word it contains, so "loved"
+        and "heartbroken" match like a search of the whole text, and each
+        emoji or emoticon counts 2. Counts are per occurrence, so the counts
+        of consecutive session segments add up to those of the joined text.
+        """
+        counts = np.zeros(len(self.heuristic_emotions), dtype=np.int64)
+        tokens = WORD_PATTERN.findall(text.lower())
+        for token in tokens:
+            matches = self.lexicon_matches.get(token)
+            if matches is None:
+                if len(self.lexicon_matches) >= 100000:
+                    self.lexicon_matches.clear()
+                matches = self.lexicon_matches[token] = [index for word, index in self.lexicon if word in token]
+            for index in matches:
+                counts[index] += 1
         
+        if emoji_counts is None:
+            emoji_counts = self.emoji_features.counts([text])[0]
+        counts[self.emoji_heuristic_index] += 2 * np.asarray(emoji_counts[:len(self.emoji_heuristic_index)], dtype=np.int64)
+        return counts, len(tokens)
+    
+    def _emotion_scores_result(self, emotion_scores):
+        """Turn emotion word counts into an API result"""
         # Determine dominant emotion
         dominant_emotion = max(emotion_scores, key=emotion_scores.get)
         max_score = emotion_scores[dominant_emotion]
@@ -152,11 +741,11 @@ class EmotionAnalyzer:
             dominant_emotion = 'neutral'
             confidence = 0.7
         
-        # Create probability distribution
+        # Create probability distribution over the display labels
         prob_dist = []
         for emotion in self.class_names:
             if total_score > 0:
-                prob = emotion_scores[emotion] / total_score
+                prob = emotion_scores.get(emotion, 0) / total_score
             else:
                 prob = 0.2 if emotion == 'neutral' else 0.0
             prob_dist.append(prob)
@@ -166,22 +755,234 @@ class EmotionAnalyzer:
         if prob_sum > 0:
             prob_dist = [p / prob_sum for p in prob_dist]
         else:
-            prob_dist = [0.2, 0.2, 0.2, 0.2, 0.2]  # Equal distribution if no scores
+            prob_dist = [1 / len(self.class_names)] * len(self.class_names)  # Equal distribution if no scores
         
         return {
             'emotion': dominant_emotion,
             'confidence': confidence,
             'probabilities': prob_dist,
             'class_names': self.class_names,
-            'emotion_scores': emotion_scores
+            'emotion_scores': emotion_scores,
+            'tier': 'emotion_based'
         }
     
-    def _mock_prediction(self, text):
-        """Mock prediction for demonstration"""
-        return self._emotion_based_analysis(text)
+    def open_session(self, mode='model', window=50):
+        """Start an incremental session for a growing text such as a chat or live captions"""
+        if mode not in ('model', 'fast', 'emotion_based'):
+            raise ValueError('Sessions support the model, fast and emotion_based modes')
+        if mode == 'fast' and self.fast_model is None:
+            raise ValueError('Fast model is not loaded')
+        if isinstance(window, bool) or not isinstance(window, int) or window < 1:
+            raise ValueError('Window must be a positive number of tokens')
+        
+        session_id = uuid.uuid4().hex
+        self.sessions.add(session_id, IncrementalSession(mode, window, len(self.heuristic_emotions)))
+        return session_id
+    
+    def append_to_session(self, session_id, text, final=False):
+        """Score only the newly appended text and return rolling scores over the window"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        
+        with session.lock:
+            session.last_seen = time.time()
+            new_text = session.take_complete_text(text, final)
+            if new_text.strip():
+                self._score_segment(session, new_text)
+            return self._session_result(session)
+    
+    def close_session(self, session_id):
+        return self.sessions.remove(session_id)
+    
+    def _score_segment(self, session, text):
+        """Lexicon counts and model probabilities for one appended segment"""
+        counts, n_words = self.heuristic_counts(text)
+        
+        probabilities, weight = None, 0
+        serving = self.serving
+        if session.model_version != serving.version:
+            # LSTM state from another version's weights can't be continued
+            session.model_state = None
+            session.model_version = serving.version
+        if session.mode == 'model' and serving.has_numpy_model():
+            # The forward LSTM state carries over, so earlier text is never re-read
+            unknown = {}
+            token_ids = serving.model.token_ids(self.prepare_model_input(text), unknown)
+            if token_ids:
+                model_probabilities, session.model_state = serving.model.predict_continuation(
+                    token_ids, session.model_state, unknown
+                )
+                probabilities = self.label_schema.to_display(model_probabilities[None, :], serving.model_class_names)[0]
+                weight = len(token_ids)
+        elif session.mode == 'fast' and n_words and serving.fast_model is not None:
+            fast_probabilities = serving.fast_model.predict_proba([text])
+            probabilities = self.label_schema.to_display(fast_probabilities, serving.fast_model.class_names)[0]
+            weight = n_words
+        
+        session.add_segment(n_words, counts, probabilities, weight)
+    
+    def _session_result(self, session):
+        emotion_scores = dict(zip(self.heuristic_emotions, session.lexicon_counts.tolist()))
+        rolling = session.rolling_probabilities()
+        
+        if rolling is None:
+            result = self._emotion_scores_result(emotion_scores)
+        else:
+            best = int(np.argmax(rolling))
+            result = {
+                'emotion': self.class_names[best],
+                'confidence': float(rolling[best]),
+                'probabilities': rolling.tolist(),
+                'class_names': self.class_names,
+                'emotion_scores': emotion_scores,
+                'tier': session.mode
+            }
+        
+        result['window_tokens'] = session.window_tokens
+        result['total_tokens'] = session.total_tokens
+        return result
+    
+    def index_texts(self, texts, results, timestamps=None):
+        """Queue analyzed texts for the similarity index; dropped when the queue is full"""
+        if not texts or not hasattr(self.serving.model, 'sentence_vectors'):
+            return
+        if self._similarity_worker is None:
+            self._similarity_worker = threading.Thread(target=self._similarity_loop, daemon=True)
+            self._similarity_worker.start()
+        if timestamps is None:
+            timestamps = [time.time()] * len(texts)
+        try:
+            self.similarity_queue.put_nowait((texts, results, timestamps))
+        except queue.Full:
+            self.metrics.increment('similarity_dropped', len(texts))
+    
+    def _similarity_loop(self):
+        while True:
+            texts, results, timestamps = self.similarity_queue.get()
+            try:
+                self._add_to_index(texts, results, timestamps)
+            except Exception as e:
+                print(f"Error indexing texts: {e}")
+    
+    def _add_to_index(self, texts, results, timestamps):
+        kept = [i for i, result in enumerate(results) if result['tier'] != 'unsupported']
+        vectors = self.serving.model.sentence_vectors([self.prepare_model_input(texts[i]) for i in kept])
+        # Texts without a known word have no direction to compare
+        known = vectors.any(axis=1)
+        kept = [i for i, ok in zip(kept, known) if ok]
+        if not kept:
+            return
+        if self.similarity is None or self.similarity.dim != vectors.shape[1]:
+            self.similarity = SimilarityIndex(vectors.shape[1])
+        added = self.similarity.add(
+            vectors[known], [texts[i] for i in kept], [results[i]['emotion'] for i in kept],
+            [results[i]['confidence'] for i in kept], [timestamps[i] for i in kept]
+        )
+        self.metrics.increment('similarity_indexed', added)
+    
+    def find_similar(self, text, k=10, emotion=None, since=None, until=None, client=None):
+        """Indexed texts closest to `text`, optionally with one emotion and within [since, until)"""
+        model = self.serving.model
+        if not hasattr(model, 'sentence_vectors'):
+            raise ValueError('Similarity search needs the BiLSTM weights')
+        embed = lambda chunk: model.sentence_vectors([self.prepare_model_input(item) for item in chunk])
+        if client is None:
+            vector = embed([text])[0]
+        else:
+            # The query runs the BiLSTM, so it takes its turn with the other interactive work
+            vector = self.scheduler.run(client, INTERACTIVE, [text], embed)[0][0]
+        if not vector.any():
+            raise ValueError('Text has no words in the model vocabulary')
+        
+        index = self.similarity
+        if index is None:
+            return []
+        return [
+            dict(index.item(item_id), similarity=score)
+            for item_id, score in index.search(vector, k, emotion, since, until)
+        ]
+    
+    def load_similarity_index(self, path):
+        try:
+            self.similarity = SimilarityIndex.load(path)
+            print(f"Similarity index loaded ({len(self.similarity)} texts)")
+        except Exception as e:
+            print(f"Error loading similarity index: {e}")
+    
+    def save_similarity_index(self, path):
+        if self.similarity is not None and len(self.similarity):
+            self.similarity.save(path)
+            print(f"Similarity index saved to {path}")
+    
+    def _unsupported_result(self, script, language):
+        """Result for a text in a script or language the models were not trained on"""
+        return {
+            'emotion': 'unsupported',
+            'confidence': 0.0,
+            'probabilities': [0.0] * len(self.class_names),
+            'class_names': self.class_names,
+            'tier': 'unsupported',
+            'script': script,
+            'language': language
+        }
 
 # Initialize the analyzer
 analyzer = EmotionAnalyzer()
+registry = ModelRegistry()
+stream_hub = StreamHub(analyzer.predict_emotion)
+
+def require_admin():
+    """Error response unless the request carries the admin token"""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints are disabled (set EMOTION_ADMIN_TOKEN)', 'success': False}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'Admin token required', 'success': False}), 401
+    return None
+
+def client_id():
+    """Scheduling and rate-limit identity: the API key if one is sent, else the remote address"""
+    api_key = request.headers.get('X-API-Key')
+    if api_key:
+        return client_key_id(api_key)
+    return f'ip-{request.remote_addr}'
+
+def parse_time(value, name):
+    """Unix timestamp or ISO 8601 date/datetime from a request body"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f'{name} must be a Unix timestamp or an ISO 8601 date')
+
+def check_session_text(value):
+    """check_text for live and incremental session input; returns (text, truncated, error response)
+    
+    Blank text is valid here: a lone space completes a session's pending
+    word, and a live text can be cleared.
+    """
+    text, code, truncated = check_text(value, limits.max_text_chars, limits.truncate)
+    if code == 'empty_text':
+        return value[:limits.max_text_chars], False, None
+    if code is not None:
+        analyzer.metrics.increment(f'rejected_{code}')
+        return None, False, (jsonify({'error': ERROR_MESSAGES[code], 'code': code, 'success': False}), 400)
+    if truncated:
+        analyzer.metrics.increment('truncated_texts')
+    return text, truncated, None
+
+def parse_threshold(value):
+    """Validate an optional threshold between 0 and 1 from a request body"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 1:
+        raise ValueError('Threshold must be a number between 0 and 1')
+    return float(value)
 
 @app.route('/')
 def home():
@@ -189,106 +990,500 @@ def home():
         'message': 'Emotion Analysis API',
         'status': 'running',
         'endpoints': {
-            '/analyze': 'POST - Analyze text emotion',
-            '/health': 'GET - API health check'
+            '/analyze': 'POST - Analyze text emotion (set document=true for long texts, explain=true for word scores)',
+            '/batch_analyze': 'POST - Analyze a list of texts (format: json, columnar, msgpack or arrow)',
+            '/health': 'GET - API health check',
+            '/metrics': 'GET - Serving counters and cascade escalation rate',
+            '/scheduler': 'GET - Queued texts and queue wait percentiles per priority',
+            '/labels': 'GET - Shared label schema',
+            '/dataset_stats': 'GET - Per-emotion statistics from the dataset index',
+            '/stream/sessions': 'POST - Open a live analysis session',
+            '/stream/<session_id>/update': 'POST - Send the latest text of a live session',
+            '/stream/<session_id>/events': 'GET - Server-Sent Events with emotion updates',
+            '/stream/<session_id>': 'DELETE - Close a live analysis session',
+            '/sessions': 'POST - Open an incremental scoring session',
+            '/sessions/<session_id>/append': 'POST - Append text and get rolling window scores',
+            '/models': 'GET - Registry versions and the serving version',
+            '/models/reload': 'POST - Load a registry version in the background and swap it in (admin)',
+            '/models/candidate': 'POST - Route a fraction of traffic to a candidate version and/or shadow it (admin)',
+            '/models/comparison': 'GET - Agreement, disagreement and latency of serving vs candidate',
+            '/admin/profile': 'POST - Start a sampling profiler run (admin); GET - its status and top functions',
+            '/admin/profile/collapsed': 'GET - Collapsed stacks of the last run for flame graphs (admin)',
+            '/similar': 'POST - Previously analyzed texts most similar to a text, filterable by emotion and date'
         },
-        'supported_emotions': ['love', 'sad', 'angry', 'neutral', 'joyful']
+        'modes': list(analyzer.modes),
+        'limits': limits.to_dict(),
+        'supported_emotions': analyzer.class_names
     })
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'model_loaded': analyzer.model is not None})
+    serving = analyzer.serving
+    fast_model = serving.fast_model
+    return jsonify({
+        'status': 'healthy',
+        'model_version': serving.version,
+        'model_loaded': serving.model is not None,
+        'fast_model_loaded': fast_model is not None,
+        'fast_model_accuracy': fast_model.accuracy if fast_model is not None else None,
+        'reload': analyzer.reload_status,
+        'prediction_store': analyzer.prediction_store.stats() if analyzer.prediction_store is not None else None
+    })
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    candidate = analyzer.candidate
+    return jsonify({
+        'versions': registry.versions(),
+        'serving': analyzer.serving.to_dict(),
+        'candidate': dict(
+            candidate.to_dict(), fraction=analyzer.candidate_fraction, shadow=analyzer.shadow_mode
+        ) if candidate is not None else None,
+        'reload': analyzer.reload_status,
+        'success': True
+    })
+
+@app.route('/models/reload', methods=['POST'])
+def reload_model():
+    """Load a version (the latest by default) without interrupting traffic"""
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    data = request.get_json(silent=True) or {}
+    version = data.get('version') or registry.latest()
+    
+    if version is None or version not in registry.versions():
+        return jsonify({'error': f'Unknown model version: {version}', 'success': False}), 404
+    if not analyzer.reload_in_background(registry, version):
+        return jsonify({'error': 'A model reload is already running', 'success': False}), 409
+    
+    return jsonify({'version': version, 'success': True}), 202
+
+@app.route('/models/candidate', methods=['POST'])
+def set_candidate_model():
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        version = data.get('version')
+        if version not in registry.versions():
+            return jsonify({'error': f'Unknown model version: {version}', 'success': False}), 404
+        
+        analyzer.set_candidate(registry, version, data.get('fraction', 0.0), bool(data.get('shadow', False)))
+        return jsonify({'version': version, 'success': True})
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+
+@app.route('/models/candidate', methods=['DELETE'])
+def clear_candidate_model():
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    analyzer.clear_candidate()
+    return jsonify({'success': True})
+
+@app.route('/models/candidate/promote', methods=['POST'])
+def promote_candidate_model():
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    try:
+        analyzer.promote_candidate()
+        return jsonify({'version': analyzer.model_version, 'success': True})
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+
+@app.route('/models/comparison', methods=['GET'])
+def get_model_comparison():
+    summary = analyzer.comparison_summary()
+    if summary is None:
+        return jsonify({'error': 'No candidate model version or nothing recorded yet', 'success': False}), 404
+    return jsonify(dict(summary, shadow_dropped=analyzer.shadow.dropped, success=True))
+
+@app.route('/labels', methods=['GET'])
+def get_labels():
+    """Label schema shared with the dashboard"""
+    return jsonify(analyzer.label_schema.to_dict())
+
+dataset_stats_cache = {}
+
+@app.route('/dataset_stats', methods=['GET'])
+def get_dataset_stats():
+    """Per-emotion dataset statistics read from the prebuilt index"""
+    try:
+        if 'stats' not in dataset_stats_cache:
+            # pyarrow is only needed when the index is actually used
+            from dataset_index import load_index, label_statistics
+            stats = label_statistics(load_index())
+            to_display = analyzer.label_schema.model_to_display
+            dataset_stats_cache['stats'] = {to_display.get(label, label): value for label, value in stats.items()}
+        
+        return jsonify({'stats': dataset_stats_cache['stats'], 'success': True})
+    except (ImportError, OSError) as e:
+        return jsonify({'error': f'Dataset index not available: {e}', 'success': False}), 404
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return jsonify(analyzer.metrics.snapshot())
+
+@app.errorhandler(413)
+def payload_too_large(e):
+    analyzer.metrics.increment('rejected_payload_too_large')
+    return jsonify({
+        'error': f'Request body exceeds {limits.max_request_bytes} bytes',
+        'code': 'payload_too_large',
+        'success': False
+    }), 413
+
+@app.errorhandler(Backpressure)
+def too_many_requests(e):
+    analyzer.metrics.increment(f'{e.code}_{e.priority}')
+    response = jsonify({
+        'error': str(e),
+        'code': e.code,
+        'retry_after': e.retry_after,
+        'success': False
+    })
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
+@app.route('/scheduler', methods=['GET'])
+def get_scheduler_status():
+    return jsonify(analyzer.scheduler.status())
 
 @app.route('/analyze', methods=['POST'])
 def analyze_emotion():
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         
-        if not data or 'text' not in data:
+        if not isinstance(data, dict) or 'text' not in data:
             return jsonify({'error': 'No text provided'}), 400
         
-        text = data['text']
+        mode = data.get('mode', 'model')
+        threshold = data.get('threshold')
+        max_chars = limits.max_document_chars if data.get('document') else limits.max_text_chars
+        
+        text, code, truncated = check_text(data['text'], max_chars, limits.truncate)
+        if code is not None:
+            analyzer.metrics.increment(f'rejected_{code}')
+            return jsonify({'error': ERROR_MESSAGES[code], 'code': code, 'success': False}), 400
+        if truncated:
+            analyzer.metrics.increment('truncated_texts')
         
-        if not text.strip():
-            return jsonify({'error': 'Empty text provided'}), 400
+        if mode not in analyzer.modes:
+            return jsonify({'error': f'Unknown mode: {mode}'}), 400
+        if data.get('explain') and data.get('document'):
+            return jsonify({'error': 'Explanations are not available in document mode'}), 400
+        
+        client = client_id()
+        analyzer.scheduler.admit(client, INTERACTIVE)
         
         # Analyze emotion
-        result = analyzer.predict_emotion(text)
+        if data.get('document'):
+            max_chunks = data.get('max_chunks')
+            if max_chunks is not None and (isinstance(max_chunks, bool) or not isinstance(max_chunks, int) or max_chunks < 1):
+                return jsonify({'error': 'max_chunks must be a positive integer'}), 400
+            result = analyzer.analyze_document(text, mode, parse_threshold(threshold), max_chunks, client)
+        else:
+            # Explanations must come from the version that made the prediction
+            serving = analyzer.pick_version(mode)
+            result = analyzer.predict_emotion(text, mode, parse_threshold(threshold), client, serving=serving)
+            analyzer.index_texts([text], [result])
+            if data.get('explain'):
+                result = analyzer.explain([text], [result], serving, limits.max_explained_words, client)[0]
         
         return jsonify({
             'text': text,
             'result': result,
+            'truncated': truncated,
             'success': True
         })
         
+    except (HTTPException, Backpressure):
+        # Answered by the 413 and 429 handlers
+        raise
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
     except Exception as e:
         return jsonify({'error': str(e), 'success': False}), 500
 
 @app.route('/batch_analyze', methods=['POST'])
 def batch_analyze():
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         
-        if not data or 'texts' not in data:
+        if not isinstance(data, dict) or 'texts' not in data:
             return jsonify({'error': 'No texts provided'}), 400
         
         texts = data['texts']
+        mode = data.get('mode', 'model')
+        threshold = data.get('threshold')
+        include_text = data.get('include_text', True)
+        response_format = negotiate_format(data.get('format'), request.headers.get('Accept'))
         
         if not isinstance(texts, list):
             return jsonify({'error': 'Texts must be a list'}), 400
         
-        results = []
-        for text in texts:
-            if text.strip():
-                result = analyzer.predict_emotion(text)
-                results.append({
-                    'text': text,
-                    'result': result
-                })
+        # Optional event time per text, used by /similar's since/until filters
+        timestamps = data.get('timestamps')
+        if timestamps is not None and (not isinstance(timestamps, list) or len(timestamps) != len(texts)):
+            return jsonify({'error': 'Timestamps must be a list with one entry per text'}), 400
         
-        return jsonify({
+        if len(texts) > limits.max_texts:
+            analyzer.metrics.increment('rejected_too_many_texts')
+            return jsonify({
+                'error': f'At most {limits.max_texts} texts per batch',
+                'code': 'too_many_texts',
+                'success': False
+            }), 413
+        
+        if mode not in analyzer.modes:
+            return jsonify({'error': f'Unknown mode: {mode}'}), 400
+        
+        explain = bool(data.get('explain'))
+        if explain and response_format != 'json':
+            return jsonify({'error': 'Explanations are only returned in JSON responses'}), 400
+        
+        # Bad items are reported one by one instead of failing the batch
+        texts, positions, errors, truncated = validate_texts(texts, limits)
+        for error in errors:
+            analyzer.metrics.increment(f"rejected_{error['code']}")
+        analyzer.metrics.increment('truncated_texts', len(truncated))
+        if timestamps is not None:
+            # Texts without a time are filed under the time of analysis
+            now = time.time()
+            timestamps = [parse_time(timestamps[i], f'timestamps[{i}]') for i in positions]
+            timestamps = [now if value is None else value for value in timestamps]
+        
+        # Bulk rate limits count texts, interactive ones count requests
+        client = client_id()
+        priority = analyzer.scheduler.priority_for(len(texts))
+        analyzer.scheduler.admit(client, priority, 1 if priority == INTERACTIVE else len(texts))
+        
+        serving = analyzer.pick_version(mode)
+        predictions, dedup_report = analyzer.predict_batch_deduplicated(
+            texts, mode, parse_threshold(threshold), parse_threshold(data.get('dedup_threshold')),
+            client, priority, serving
+        )
+        analyzer.index_texts(texts, predictions, timestamps)
+        if explain:
+            predictions = analyzer.explain(texts, predictions, serving, limits.max_explained_words, client, priority)
+        
+        if response_format != 'json':
+            # Class names once, probabilities as a float32 matrix
+            body, mimetype = encode_results(
+                predictions, analyzer.class_names, response_format,
+                texts if include_text else None, positions,
+                {'errors': errors, 'truncated': truncated, 'dedup': dedup_report}
+            )
+            return Response(body, mimetype=mimetype)
+        
+        results = [
+            {'index': index, 'text': text, 'result': result} if include_text else {'index': index, 'result': result}
+            for index, text, result in zip(positions, texts, predictions)
+        ]
+        
+        response = {
             'results': results,
+            'errors': errors,
+            'truncated': truncated,
+            'dedup': dedup_report,
             'total_analyzed': len(results),
             'success': True
-        })
+        }
+        if explain:
+            response['total_explained'] = sum(prediction['explanation'] is not None for prediction in predictions)
+        return jsonify(response)
         
+    except (HTTPException, Backpressure):
+        # Answered by the 413 and 429 handlers
+        raise
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
     except Exception as e:
         return jsonify({'error': str(e), 'success': False}), 500
 
+@app.route('/similar', methods=['POST'])
+def find_similar():
+    try:
+        data = request.get_json(silent=True)
+        
+        if not isinstance(data, dict) or not isinstance(data.get('text'), str) or not data['text'].strip():
+            return jsonify({'error': 'No text provided'}), 400
+        
+        k = data.get('k', 10)
+        if isinstance(k, bool) or not isinstance(k, int) or not 1 <= k <= 100:
+            return jsonify({'error': 'k must be an integer between 1 and 100'}), 400
+        emotion = data.get('emotion')
+        if emotion is not None and emotion not in analyzer.class_names:
+            return jsonify({'error': f'Unknown emotion: {emotion}'}), 400
+        
+        since, until = parse_time(data.get('since'), 'since'), parse_time(data.get('until'), 'until')
+        client = client_id()
+        analyzer.scheduler.admit(client, INTERACTIVE)
+        
+        started = time.perf_counter()
+        results = analyzer.find_similar(data['text'][:limits.max_text_chars], k, emotion, since, until, client)
+        index = analyzer.similarity
+        
+        return jsonify({
+            'results': results,
+            'query_ms': (time.perf_counter() - started) * 1000,
+            'index': index.stats() if index is not None else None,
+            'success': True
+        })
+    except (HTTPException, Backpressure):
+        # Answered by the 413 and 429 handlers
+        raise
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+
+@app.route('/stream/sessions', methods=['POST'])
+def create_stream_session():
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode', 'model')
+    
+    if mode not in analyzer.modes:
+        return jsonify({'error': f'Unknown mode: {mode}'}), 400
+    # Model mode falls back to the emotion-based analysis; fast and cascade would fail on every update
+    if mode != 'model' and not analyzer.serving.supports(mode):
+        return jsonify({'error': f'Mode {mode} needs models that are not loaded', 'success': False}), 400
+    
+    return jsonify({'session_id': stream_hub.create_session(mode), 'success': True})
+
+@app.route('/stream/<session_id>/update', methods=['POST'])
+def update_stream_session(session_id):
+    data = request.get_json(silent=True)
+    
+    if not data or not isinstance(data.get('text'), str):
+        return jsonify({'error': 'No text provided'}), 400
+    
+    text, truncated, rejected = check_session_text(data['text'])
+    if rejected:
+        return rejected
+    
+    try:
+        version = stream_hub.update(session_id, text)
+    except KeyError:
+        return jsonify({'error': 'Unknown session'}), 404
+    
+    return jsonify({'version': version, 'truncated': truncated, 'success': True}), 202
+
+@app.route('/stream/<session_id>/events', methods=['GET'])
+def stream_events(session_id):
+    if stream_hub.get(session_id) is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    
+    return Response(
+        stream_with_context(stream_hub.events(session_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/stream/<session_id>', methods=['DELETE'])
+def close_stream_session(session_id):
+    if not stream_hub.close_session(session_id):
+        return jsonify({'error': 'Unknown session', 'success': False}), 404
+    return jsonify({'success': True})
+
+@app.route('/sessions', methods=['POST'])
+def open_session():
+    try:
+        data = request.get_json(silent=True) or {}
+        session_id = analyzer.open_session(data.get('mode', 'model'), data.get('window', 50))
+        return jsonify({'session_id': session_id, 'success': True})
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+
+@app.route('/sessions/<session_id>/append', methods=['POST'])
+def append_to_session(session_id):
+    data = request.get_json(silent=True)
+    
+    if not data or not isinstance(data.get('text'), str):
+        return jsonify({'error': 'No text provided'}), 400
+    
+    text, truncated, rejected = check_session_text(data['text'])
+    if rejected:
+        return rejected
+    
+    try:
+        result = analyzer.append_to_session(session_id, text, bool(data.get('final', False)))
+    except KeyError:
+        return jsonify({'error': 'Unknown session', 'success': False}), 404
+    
+    return jsonify({'result': result, 'truncated': truncated, 'success': True})
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def close_session(session_id):
+    if not analyzer.close_session(session_id):
+        return jsonify({'error': 'Unknown session', 'success': False}), 404
+    return jsonify({'success': True})
+
+@app.route('/admin/profile', methods=['POST'])
+def start_profile():
+    """Sample request threads for `seconds` or until `requests` requests finished"""
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        interval_ms = data.get('interval_ms', 10)
+        if isinstance(interval_ms, bool) or not isinstance(interval_ms, (int, float)):
+            raise ValueError('interval_ms must be a number')
+        started = profiler.start(
+            data.get('seconds', 10), data.get('requests'), interval_ms / 1000,
+            bool(data.get('allocations', False)), data.get('top', 20)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e), 'success': False}), 400
+    
+    if not started:
+        return jsonify({'error': 'A profiling run is already in progress', 'success': False}), 409
+    return jsonify({'status': profiler.status, 'success': True}), 202
+
+@app.route('/admin/profile', methods=['GET'])
+def get_profile():
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    result = profiler.result
+    summary = None
+    if result is not None:
+        summary = {name: value for name, value in result.items() if name != 'collapsed'}
+    return jsonify({'status': profiler.status, 'result': summary, 'success': True})
+
+@app.route('/admin/profile/collapsed', methods=['GET'])
+def get_profile_collapsed():
+    denied = require_admin()
+    if denied:
+        return denied
+    
+    if profiler.result is None:
+        return jsonify({'error': 'No finished profiling run', 'success': False}), 404
+    return Response(
+        profiler.result['collapsed'],
+        mimetype='text/plain',
+        headers={'Content-Disposition': 'attachment; filename=profile.collapsed'}
+    )
+
 @app.route('/emotions', methods=['GET'])
 def get_emotions():
     """Get information about supported emotions"""
     emotion_info = {
-        'love': {
-            'description': 'Feelings of affection, care, and deep attachment',
-            'examples': ['I love you so much!', 'This is my favorite thing ever!', 'You mean everything to me ❤️'],
-            'color': '#e74c3c',
-            'emoji': '❤️'
-        },
-        'sad': {
-            'description': 'Feelings of unhappiness, sorrow, or disappointment',
-            'examples': ['I feel so lonely today', 'This makes me want to cry 😢', 'Nothing seems to work out'],
-            'color': '#3498db',
-            'emoji': '😢'
-        }, 
-        'angry': {
-            'description': 'Feelings of frustration, irritation, or rage',
-            'examples': ['This makes me so mad!', 'I cant believe this happened!', 'Im furious about this! 😠'],
-            'color': '#e67e22',
-            'emoji': '😠'
-        },
-        'neutral': {
-            'description': 'Neutral or balanced emotional state',
-            'examples': ['The weather is okay today', 'Nothing special happened', 'Its a regular day'],
-            'color': '#95a5a6',
-            'emoji': '😐'
-        },
-        'joyful': {
-            'description': 'Feelings of happiness, excitement, and delight',
-            'examples': ['Im so happy right now!', 'This is amazing! 🎉', 'What a wonderful day! 😊'],
-            'color': '#f1c40f',
-            'emoji': '😊'
+        emotion: {
+            'description': info['description'],
+            'examples': info['examples'],
+            'color': info['color'],
+            'emoji': info['emoji']
         }
+        for emotion, info in analyzer.label_schema.emotions.items()
     }
     
     return jsonify({
@@ -297,11 +1492,40 @@ def get_emotions():
     })
 
 if __name__ == '__main__':
-    # Try to load the model
+    weights_path = 'bilstm_weights.npz'
     model_path = 'bilstm_model.pkl'
-    if os.path.exists(model_path):
-        analyzer.load_model(model_path)
+    fast_model_path = 'fast_model.pkl'
+    # Results shared with other server processes and bulk scoring, kept across restarts;
+    # each loaded version preloads its most-hit ones into memory
+    analyzer.open_prediction_store('predictions.sqlite')
+    if registry.latest() is not None:
+        # Serve the newest registry version and pick up later ones without a restart
+        analyzer.load_version(registry)
+        analyzer.watch_registry(registry)
     else:
-        print("Model file not found. Using emotion-based analysis.")
+        # Prefer the exported NumPy weights, fall back to the Keras model
+        if os.path.exists(weights_path):
+            analyzer.load_model(weights_path)
+        elif os.path.exists(model_path):
+            analyzer.load_model(model_path)
+        else:
+            print("Model file not found. Using emotion-based analysis.")
+        
+        # Optional fast-path model for mode=fast (train with `python fast_model.py`)
+        if os.path.exists(fast_model_path):
+            analyzer.load_fast_model(fast_model_path)
+        analyzer.preload_predictions(analyzer.serving)
+    
+    # Optional pre-stage that answers non-English texts without a model pass
+    language_profile_path = 'language_profile.npz'
+    if os.path.exists(language_profile_path):
+        analyzer.load_language_profile(language_profile_path)
+    
+    # Texts analyzed in earlier runs stay searchable through /similar
+    similarity_index_path = 'similarity_index.npz'
+    if os.path.exists(similarity_index_path):
+        analyzer.load_similarity_index(similarity_index_path)
+    atexit.register(analyzer.save_similarity_index, similarity_index_path)
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Threaded so open event streams don't block other requests
+    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
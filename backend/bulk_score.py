@@ -0,0 +1,218 @@
+# bulk_score.py
+"""Score text files offline with EmotionAnalyzer, without the Flask server
+
+Reads `text;label` dataset files or plain one-text-per-line files as a
+stream, shards them across a process pool (each worker loads the model
+once) and writes results incrementally to CSV or Parquet. A checkpoint
+file records finished chunks, so an interrupted run picks up where it
+stopped when started again with the same arguments. Results are read from
+and written to the server's prediction store, so texts scored by an
+earlier run or by the server are not scored again.
+
+    python bulk_score.py ../dataset/test.txt --output scores.csv
+"""
+import argparse
+import csv
+import json
+import os
+from collections import deque
+from multiprocessing import Pool
+
+_worker_analyzer = None
+
+
+def read_chunks(paths, chunk_size, known_labels):
+    """Yield lists of (source, line number, text, label) rows"""
+    chunk = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                # `text;label` lines from the dataset keep their label for later evaluation
+                text, label = line, ''
+                head, sep, tail = line.rpartition(';')
+                if sep and tail in known_labels:
+                    text, label = head, tail
+                chunk.append((path, line_number, text, label))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def _init_worker(weights_path, fast_model_path, store_path):
+    """Load the models once per worker process"""
+    global _worker_analyzer
+    from app import EmotionAnalyzer
+
+    _worker_analyzer = EmotionAnalyzer()
+    if weights_path and os.path.exists(weights_path):
+        _worker_analyzer.load_model(weights_path)
+    if fast_model_path and os.path.exists(fast_model_path):
+        _worker_analyzer.load_fast_model(fast_model_path)
+    if store_path:
+        _worker_analyzer.open_prediction_store(store_path)
+
+
+def _score_chunk(chunk, mode):
+    results = _worker_analyzer.predict_batch([row[2] for row in chunk], mode)
+    if _worker_analyzer.prediction_store is not None:
+        # The pool terminates its workers at the end, so queued writes can't wait
+        _worker_analyzer.prediction_store.flush()
+    return [
+        list(row) + [result['emotion'], result['confidence'], result['tier']] + result['probabilities']
+        for row, result in zip(chunk, results)
+    ]
+
+
+class CsvSink:
+    def __init__(self, path, columns, resume_bytes):
+        exists = resume_bytes is not None and os.path.exists(path)
+        self.file = open(path, 'r+' if exists else 'w', newline='', encoding='utf-8')
+        if exists:
+            # Drop anything written after the last checkpoint
+            self.file.truncate(resume_bytes)
+            self.file.seek(resume_bytes)
+        self.writer = csv.writer(self.file)
+        if not exists:
+            self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    """One part file per chunk, so finished parts survive an interruption"""
+
+    def __init__(self, path, columns, resume_bytes):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa, self.pq = pa, pq
+        self.path = path
+        self.columns = columns
+        self.part = 0
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, rows):
+        table = self.pa.Table.from_pylist([dict(zip(self.columns, row)) for row in rows])
+        self.pq.write_table(table, os.path.join(self.path, f'part-{self.part:06d}.parquet'))
+        self.part += 1
+        return self.part
+
+    def close(self):
+        pass
+
+
+def load_checkpoint(path, run_config):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        checkpoint = json.load(f)
+    if checkpoint['config'] != run_config:
+        raise SystemExit(f"Checkpoint {path} was written with different arguments; delete it to start over")
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    # Write then rename so a crash never leaves a half-written checkpoint
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def bulk_score(inputs, output, mode='model', weights_path='bilstm_weights.npz', fast_model_path='fast_model.pkl',
+               processes=None, chunk_size=2000, output_format=None, store_path='predictions.sqlite'):
+    from label_schema import LabelSchema
+    from model_registry import file_digest
+
+    schema = LabelSchema.load()
+    output_format = output_format or ('parquet' if output.endswith('.parquet') else 'csv')
+    checkpoint_path = output + '.checkpoint.json'
+    columns = ['source', 'line', 'text', 'label', 'emotion', 'confidence', 'tier']
+    columns += [f'prob_{label}' for label in schema.display_labels]
+
+    run_config = {
+        'inputs': [os.path.abspath(path) for path in inputs],
+        'mode': mode,
+        'chunk_size': chunk_size,
+        'format': output_format,
+        # Resuming with retrained models would mix two models' results in one output
+        'weights_digest': file_digest(weights_path) if os.path.exists(weights_path) else None,
+        'fast_model_digest': file_digest(fast_model_path) if os.path.exists(fast_model_path) else None
+    }
+    checkpoint = load_checkpoint(checkpoint_path, run_config)
+    done_chunks = checkpoint['chunks_done'] if checkpoint else 0
+    rows_written = checkpoint['rows_written'] if checkpoint else 0
+    if checkpoint:
+        print(f"Resuming after {done_chunks} chunks ({rows_written} rows)")
+
+    if output_format == 'parquet':
+        sink = ParquetSink(output, columns, None)
+        sink.part = done_chunks
+    else:
+        sink = CsvSink(output, columns, checkpoint['output_position'] if checkpoint else None)
+
+    chunks = read_chunks(inputs, chunk_size, set(schema.model_labels))
+    # Re-reading skipped chunks is cheap next to scoring them
+    for _ in range(done_chunks):
+        next(chunks, None)
+
+    processes = processes or os.cpu_count() or 1
+    with Pool(processes, initializer=_init_worker, initargs=(weights_path, fast_model_path, store_path)) as pool:
+        # Keep a bounded number of chunks in flight so memory stays flat on huge inputs,
+        # and write them back in input order so the checkpoint is a simple count
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_score_chunk, (chunk, mode)))
+            if len(pending) >= processes * 2:
+                done_chunks, rows_written = _drain(pending.popleft(), sink, checkpoint_path, run_config,
+                                                   done_chunks, rows_written)
+        while pending:
+            done_chunks, rows_written = _drain(pending.popleft(), sink, checkpoint_path, run_config,
+                                               done_chunks, rows_written)
+
+    sink.close()
+    print(f"Scored {rows_written} texts into {output}")
+    return rows_written
+
+
+def _drain(job, sink, checkpoint_path, run_config, done_chunks, rows_written):
+    rows = job.get()
+    position = sink.write(rows)
+    done_chunks += 1
+    rows_written += len(rows)
+    save_checkpoint(checkpoint_path, {
+        'config': run_config,
+        'chunks_done': done_chunks,
+        'rows_written': rows_written,
+        'output_position': position
+    })
+    return done_chunks, rows_written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk-score text files with EmotionAnalyzer')
+    parser.add_argument('inputs', nargs='+', help='`text;label` dataset files or one-text-per-line files')
+    parser.add_argument('--output', required=True, help='Output .csv file or .parquet directory')
+    parser.add_argument('--format', choices=['csv', 'parquet'], help='Defaults to the output extension')
+    parser.add_argument('--mode', default='model', choices=['model', 'fast', 'cascade', 'emotion_based'])
+    parser.add_argument('--weights', default='bilstm_weights.npz')
+    parser.add_argument('--fast-model', default='fast_model.pkl')
+    parser.add_argument('--processes', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--store', default='predictions.sqlite', help='Prediction store shared with the server')
+    parser.add_argument('--no-store', action='store_true', help='Score every text, without the prediction store')
+    args = parser.parse_args()
+
+    bulk_score(args.inputs, args.output, args.mode, args.weights, args.fast_model,
+               args.processes, args.chunk_size, args.format, None if args.no_store else args.store)
@@ -0,0 +1,64 @@
+# cascade.py
+import numpy as np
+
+
+def top_margin(probabilities):
+    """Gap between the two most likely classes for each row"""
+    if probabilities.shape[1] < 2:
+        return np.ones(len(probabilities))
+    top_two = np.partition(probabilities, -2, axis=1)[:, -2:]
+    return top_two[:, 1] - top_two[:, 0]
+
+
+def cascade_predict(texts, cheap_predict, expensive_predict, threshold):
+    """Score with the cheap tier, re-score uncertain rows with the expensive one
+
+    Both predict functions take a list of texts and return a probability
+    matrix over the same classes. Returns the merged probabilities and a
+    boolean mask of the rows answered by the expensive tier.
+    """
+    probabilities = np.array(cheap_predict(texts), dtype=np.float64)
+    escalated = top_margin(probabilities) < threshold
+
+    # All uncertain texts go through the expensive model in one batched pass
+    escalated_rows = np.flatnonzero(escalated)
+    if escalated_rows.size:
+        probabilities[escalated_rows] = expensive_predict([texts[i] for i in escalated_rows])
+    return probabilities, escalated
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    import time
+    from app import EmotionAnalyzer
+    from fast_model import DATASET_DIR, load_dataset
+
+    parser = argparse.ArgumentParser(description='Measure cascade accuracy and cost on dataset/test.txt')
+    parser.add_argument('--weights', default='bilstm_weights.npz')
+    parser.add_argument('--fast-model', default='fast_model.pkl')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.1, 0.2, 0.3, 0.5])
+    args = parser.parse_args()
+
+    analyzer = EmotionAnalyzer()
+    analyzer.load_model(args.weights)
+    analyzer.load_fast_model(args.fast_model)
+
+    texts, labels = load_dataset(os.path.join(DATASET_DIR, 'test.txt'))
+    # Results come back in display labels, so compare against those
+    labels = np.asarray([analyzer.label_schema.model_to_display[label] for label in labels])
+
+    for mode in ('fast', 'model'):
+        start = time.perf_counter()
+        predictions = [result['emotion'] for result in analyzer.predict_batch(texts, mode)]
+        elapsed = time.perf_counter() - start
+        print(f"{mode:>7}: accuracy {np.mean(np.asarray(predictions) == labels):.4f}, {elapsed * 1000 / len(texts):.3f} ms/text")
+
+    for threshold in args.thresholds:
+        start = time.perf_counter()
+        results = analyzer.predict_batch(texts, 'cascade', threshold=threshold)
+        elapsed = time.perf_counter() - start
+        predictions = np.asarray([result['emotion'] for result in results])
+        escalation_rate = np.mean([result['tier'] == 'model' for result in results])
+        print(f"cascade threshold={threshold}: accuracy {np.mean(predictions == labels):.4f}, "
+              f"escalated {escalation_rate:.1%}, {elapsed * 1000 / len(texts):.3f} ms/text")
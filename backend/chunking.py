@@ -0,0 +1,71 @@
+# chunking.py
+import re
+import numpy as np
+
+SENTENCE_PATTERN = re.compile(r'[^.!?\n]+(?:[.!?]+|\n+|$)')
+TOKEN_PATTERN = re.compile(r'\S+')
+
+
+def split_sentences(text):
+    """Sentence spans as (start, end) character offsets"""
+    return [
+        (match.start(), match.end())
+        for match in SENTENCE_PATTERN.finditer(text)
+        if match.group().strip()
+    ]
+
+
+def chunk_document(text, max_tokens=66):
+    """Split a long text into chunks of at most `max_tokens` whitespace tokens
+
+    Whole sentences are packed together while they fit; a sentence longer
+    than the window is cut into consecutive token windows. Returns a list of
+    (start, end, n_tokens) character spans covering every token once.
+    """
+    chunks = []
+    chunk_start, chunk_end, chunk_tokens = None, None, 0
+
+    for sentence_start, sentence_end in split_sentences(text):
+        tokens = [
+            (sentence_start + match.start(), sentence_start + match.end())
+            for match in TOKEN_PATTERN.finditer(text[sentence_start:sentence_end])
+        ]
+        if not tokens:
+            continue
+
+        if chunk_tokens and chunk_tokens + len(tokens) > max_tokens:
+            chunks.append((chunk_start, chunk_end, chunk_tokens))
+            chunk_start, chunk_end, chunk_tokens = None, None, 0
+
+        if len(tokens) > max_tokens:
+            for offset in range(0, len(tokens), max_tokens):
+                window = tokens[offset:offset + max_tokens]
+                chunks.append((window[0][0], window[-1][1], len(window)))
+            continue
+
+        if chunk_start is None:
+            chunk_start = tokens[0][0]
+        chunk_end = tokens[-1][1]
+        chunk_tokens += len(tokens)
+
+    if chunk_tokens:
+        chunks.append((chunk_start, chunk_end, chunk_tokens))
+    return chunks
+
+
+def select_chunks(n_chunks, max_chunks):
+    """Indices of at most `max_chunks` chunks spread evenly over the document
+
+    Bounds the cost of one document while still sampling its beginning,
+    middle and end rather than only the first pages.
+    """
+    if n_chunks <= max_chunks:
+        return list(range(n_chunks))
+    return sorted(set(np.linspace(0, n_chunks - 1, max_chunks).round().astype(int).tolist()))
+
+
+def aggregate_distributions(probabilities, weights):
+    """Token-weighted mean of per-chunk distributions"""
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    return weights @ probabilities / weights.sum()
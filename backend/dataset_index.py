@@ -0,0 +1,176 @@
+# dataset_index.py
+"""Columnar index of the `text;label` dataset files
+
+Parses dataset/*.txt once into Arrow IPC files holding per-row token ids,
+lengths and stopword counts, per-label counts and a token frequency table.
+The files are uncompressed so `load_index` can memory-map them without
+copying; training, EDA and the dashboard statistics read from here
+instead of reparsing the text on every run.
+
+    python dataset_index.py            # writes dataset/index/
+"""
+import json
+import os
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+DATASET_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataset'))
+INDEX_DIR = os.path.join(DATASET_DIR, 'index')
+SPLITS = ('train', 'val', 'test')
+
+
+def read_split(path):
+    """Read one `text;label` file as an Arrow table"""
+    return pa_csv.read_csv(
+        path,
+        read_options=pa_csv.ReadOptions(column_names=['text', 'label']),
+        parse_options=pa_csv.ParseOptions(delimiter=';', quote_char=False),
+        convert_options=pa_csv.ConvertOptions(column_types={'text': pa.string(), 'label': pa.string()})
+    )
+
+
+def _source_stamp(paths):
+    return {os.path.basename(path): [os.path.getsize(path), os.path.getmtime(path)] for path in paths}
+
+
+def build_index(dataset_dir=DATASET_DIR, index_dir=INDEX_DIR, splits=SPLITS, stop_words=None):
+    """Tokenize every split once, with Arrow compute kernels instead of per-row Python"""
+    paths = [os.path.join(dataset_dir, f'{split}.txt') for split in splits]
+    tables = []
+    for split, path in zip(splits, paths):
+        table = read_split(path)
+        tables.append(table.append_column('split', pa.array([split] * table.num_rows, pa.string())))
+    rows = pa.concat_tables(tables)
+
+    tokens = pc.utf8_split_whitespace(rows['text'])
+    n_tokens = pc.list_value_length(tokens).to_numpy(zero_copy_only=False).astype(np.int32)
+    flat_tokens = pc.list_flatten(tokens)
+
+    # Vocabulary ordered by frequency, ids start at 1 so 0 stays free for padding
+    frequencies = pc.value_counts(flat_tokens)
+    vocab = frequencies.field('values')
+    counts = frequencies.field('counts').to_numpy()
+    order = np.argsort(-counts, kind='stable')
+    vocab = vocab.take(pa.array(order))
+    counts = counts[order]
+    flat_ids = pc.index_in(flat_tokens, value_set=vocab).to_numpy(zero_copy_only=False).astype(np.int32) + 1
+
+    offsets = np.concatenate([[0], np.cumsum(n_tokens)]).astype(np.int32)
+    token_ids = pa.ListArray.from_arrays(pa.array(offsets), pa.array(flat_ids))
+
+    labels = sorted(pc.unique(rows['label']).to_pylist())
+    label_ids = pc.index_in(rows['label'], value_set=pa.array(labels)).to_numpy(zero_copy_only=False)
+
+    stop_words = stop_words if stop_words is not None else _default_stop_words()
+    is_stop = pc.is_in(flat_tokens, value_set=pa.array(sorted(stop_words), pa.string()))
+    is_stop = is_stop.to_numpy(zero_copy_only=False).astype(np.int32)
+    # Per-row sums over the flattened tokens via the list offsets
+    stop_cumsum = np.concatenate([[0], np.cumsum(is_stop)])
+    stopword_count = (stop_cumsum[offsets[1:]] - stop_cumsum[offsets[:-1]]).astype(np.int32)
+
+    rows_table = pa.table({
+        'split': rows['split'],
+        'text': rows['text'],
+        'label': rows['label'],
+        'label_id': pa.array(label_ids.astype(np.int8)),
+        'length_chars': pc.utf8_length(rows['text']).cast(pa.int32()),
+        'n_tokens': pa.array(n_tokens),
+        'stopword_count': pa.array(stopword_count),
+        'token_ids': token_ids
+    })
+
+    # Token x label counts in one bincount over the flattened tokens
+    token_labels = np.repeat(label_ids, n_tokens)
+    per_label = np.bincount(
+        (flat_ids - 1).astype(np.int64) * len(labels) + token_labels,
+        minlength=len(vocab) * len(labels)
+    ).reshape(len(vocab), len(labels))
+    vocab_columns = {
+        'token_id': pa.array(np.arange(1, len(vocab) + 1, dtype=np.int32)),
+        'token': vocab,
+        'count': pa.array(counts),
+        'is_stopword': pc.is_in(vocab, value_set=pa.array(sorted(stop_words), pa.string()))
+    }
+    for i, label in enumerate(labels):
+        vocab_columns[f'count_{label}'] = pa.array(per_label[:, i])
+    vocab_table = pa.table(vocab_columns)
+
+    label_counts = np.bincount(label_ids, minlength=len(labels))
+    labels_table = pa.table({
+        'label': pa.array(labels),
+        'rows': pa.array(label_counts),
+        'mean_length_chars': pa.array([
+            float(np.mean(rows_table['length_chars'].to_numpy()[label_ids == i])) for i in range(len(labels))
+        ]),
+        'mean_tokens': pa.array([float(np.mean(n_tokens[label_ids == i])) for i in range(len(labels))])
+    })
+
+    os.makedirs(index_dir, exist_ok=True)
+    for name, table in (('rows', rows_table), ('vocab', vocab_table), ('labels', labels_table)):
+        with pa.OSFile(os.path.join(index_dir, f'{name}.arrow'), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    with open(os.path.join(index_dir, 'meta.json'), 'w') as f:
+        json.dump({'splits': list(splits), 'sources': _source_stamp(paths)}, f, indent=2)
+
+    print(f"Indexed {rows_table.num_rows} rows and {vocab_table.num_rows} tokens into {index_dir}")
+
+
+def _default_stop_words():
+    from nltk.corpus import stopwords
+    return set(stopwords.words('english'))
+
+
+def is_stale(dataset_dir=DATASET_DIR, index_dir=INDEX_DIR):
+    """Whether any source file changed since the index was built"""
+    meta_path = os.path.join(index_dir, 'meta.json')
+    if not os.path.exists(meta_path):
+        return True
+    with open(meta_path, 'r') as f:
+        meta = json.load(f)
+    paths = [os.path.join(dataset_dir, f'{split}.txt') for split in meta['splits']]
+    return _source_stamp(paths) != meta['sources']
+
+
+def load_index(index_dir=INDEX_DIR):
+    """Memory-map the index tables (no copy, no parsing)"""
+    tables = {}
+    for name in ('rows', 'vocab', 'labels'):
+        source = pa.memory_map(os.path.join(index_dir, f'{name}.arrow'), 'r')
+        tables[name] = pa.ipc.open_file(source).read_all()
+    return tables
+
+
+def label_statistics(tables, top_n=8):
+    """Per-label row counts, lengths and most frequent non-stopword tokens"""
+    labels = tables['labels'].to_pylist()
+    total_rows = sum(row['rows'] for row in labels)
+    vocab = tables['vocab'].filter(pc.invert(tables['vocab']['is_stopword']))
+    tokens = vocab['token'].to_numpy(zero_copy_only=False)
+
+    stats = {}
+    for row in labels:
+        label_counts = vocab[f"count_{row['label']}"].to_numpy()
+        top = np.argsort(-label_counts, kind='stable')[:top_n]
+        stats[row['label']] = {
+            'rows': row['rows'],
+            'share': row['rows'] / total_rows if total_rows else 0.0,
+            'mean_length_chars': row['mean_length_chars'],
+            'mean_tokens': row['mean_tokens'],
+            'top_words': [str(tokens[i]) for i in top]
+        }
+    return stats
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build the columnar dataset index')
+    parser.add_argument('--dataset-dir', default=DATASET_DIR)
+    parser.add_argument('--index-dir', default=INDEX_DIR)
+    parser.add_argument('--splits', nargs='+', default=list(SPLITS))
+    args = parser.parse_args()
+
+    build_index(args.dataset_dir, args.index_dir, args.splits)
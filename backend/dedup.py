@@ -0,0 +1,147 @@
+# dedup.py
+"""Duplicate and near-duplicate grouping for batch inputs
+
+Uploaded feedback often repeats the same templated or copy-pasted text.
+`deduplicate` groups a batch so that only one representative per group is
+scored:
+
+- exact: texts equal after lowercasing and collapsing whitespace, which
+  none of the prediction modes distinguish, always share one result.
+- near: with a Jaccard threshold, MinHash signatures over word and word
+  bigram shingles are bucketed by LSH bands, and candidates whose estimated
+  similarity reaches the threshold are merged. Texts shorter than
+  `min_words` only take part in exact matching, since one changed word
+  ("i am feeling happy" / "i am feeling sad") is a different emotion.
+"""
+import re
+import zlib
+import numpy as np
+
+WHITESPACE = re.compile(r'\s+')
+NUM_PERM = 64
+# MinHash rows per LSH band; the candidate threshold is about (1/bands) ** (1/rows)
+ROWS_PER_BAND = (2, 4, 8, 16)
+
+
+def normalize(text):
+    return WHITESPACE.sub(' ', text.lower()).strip()
+
+
+def shingle_hashes(text):
+    """CRC32 of every word and word bigram of a normalized text
+
+    CRC32 is stable across processes, unlike hash(), so signatures can be
+    compared between runs.
+    """
+    words = text.encode('utf-8').split(b' ')
+    shingles = words + [first + b' ' + second for first, second in zip(words, words[1:])]
+    return np.unique(np.array([zlib.crc32(shingle) for shingle in shingles], dtype=np.uint64))
+
+
+class MinHasher:
+    """Multiply-shift hash family; signatures are the per-function minimum over shingles"""
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signatures(self, texts, max_shingles=200000):
+        """One signature row per text, computed over groups of texts to bound memory"""
+        signatures = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        start = 0
+        while start < len(texts):
+            hashes, lengths = [], []
+            end, total = start, 0
+            while end < len(texts) and total < max_shingles:
+                shingles = shingle_hashes(texts[end])
+                hashes.append(shingles)
+                lengths.append(len(shingles))
+                total += len(shingles)
+                end += 1
+
+            # uint64 arithmetic wraps, which is exactly the mod 2**64 we want
+            hashed = (np.concatenate(hashes)[:, None] * self.a + self.b) >> np.uint64(32)
+            offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+            signatures[start:end] = np.minimum.reduceat(hashed, offsets, axis=0)
+            start = end
+        return signatures
+
+
+def _lsh_shape(threshold, num_perm):
+    """Band layout whose candidate threshold is the highest one not above `threshold`"""
+    layouts = [(num_perm // rows, rows) for rows in ROWS_PER_BAND if num_perm % rows == 0]
+    below = [layout for layout in layouts if (1 / layout[0]) ** (1 / layout[1]) <= threshold]
+    return max(below, key=lambda layout: (1 / layout[0]) ** (1 / layout[1])) if below else layouts[0]
+
+
+def deduplicate(texts, threshold=None, min_words=8, hasher=None):
+    """Group duplicate texts
+
+    Returns (representatives, assignment, report): `representatives` are
+    indices into `texts` to score, `assignment[i]` is the position in
+    `representatives` whose result text i should get. `threshold` is the
+    Jaccard similarity for near-duplicates; None keeps exact matches only.
+    """
+    keys = {}
+    unique_of = np.empty(len(texts), dtype=np.int64)
+    unique_texts = []
+    for i, text in enumerate(texts):
+        key = normalize(text)
+        if key not in keys:
+            keys[key] = len(unique_texts)
+            unique_texts.append(key)
+        unique_of[i] = keys[key]
+
+    # Each unique text points at the earlier text it was merged into. Only
+    # texts that are not followers themselves can lead, so groups never
+    # chain through intermediate texts
+    leader_of = np.arange(len(unique_texts))
+    has_followers = np.zeros(len(unique_texts), dtype=bool)
+    eligible = np.array(
+        [i for i, text in enumerate(unique_texts) if text.count(' ') + 1 >= min_words], dtype=np.int64
+    )
+    if threshold is not None and len(eligible) > 1:
+        hasher = hasher or MinHasher()
+        signatures = np.zeros((len(unique_texts), hasher.num_perm), dtype=np.uint32)
+        signatures[eligible] = hasher.signatures([unique_texts[i] for i in eligible])
+        bands, rows = _lsh_shape(threshold, hasher.num_perm)
+        for band in range(bands):
+            _, buckets = np.unique(
+                signatures[eligible, band * rows:(band + 1) * rows], axis=0, return_inverse=True
+            )
+            buckets = buckets.ravel()
+            order = eligible[np.argsort(buckets, kind='stable')]
+            starts = np.flatnonzero(np.diff(np.sort(buckets), prepend=-1))
+            sizes = np.diff(np.append(starts, len(order)))
+            # Only buckets with more than one member hold candidates
+            for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+                leaders = []
+                for member in order[start:start + size]:
+                    if leader_of[member] != member:
+                        continue
+                    if leaders and not has_followers[member]:
+                        similarity = (signatures[leaders] == signatures[member]).mean(axis=1)
+                        best = int(np.argmax(similarity))
+                        if similarity[best] >= threshold:
+                            leader_of[member] = leaders[best]
+                            has_followers[leaders[best]] = True
+                            continue
+                    leaders.append(member)
+
+    # The first text of every group is its representative
+    group_of_text = leader_of[unique_of]
+    representatives, assignment = np.unique(group_of_text, return_inverse=True)
+    first_index = np.full(len(representatives), len(texts), dtype=np.int64)
+    np.minimum.at(first_index, assignment, np.arange(len(texts)))
+
+    report = {
+        'texts': len(texts),
+        'unique_texts': len(unique_texts),
+        'scored': len(representatives),
+        'saved': len(texts) - len(representatives),
+        'saved_ratio': (len(texts) - len(representatives)) / len(texts) if texts else 0.0,
+        'threshold': threshold
+    }
+    return first_index.tolist(), assignment.tolist(), report
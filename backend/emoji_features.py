@@ -0,0 +1,97 @@
+# emoji_features.py
+"""Emoji and emoticon counts per emotion, shared by the heuristic and model paths
+
+Every codepoint of the Unicode emoji blocks is looked up in one table that
+is built once: 0 for ordinary characters, 1 for an emoji without a known
+emotion, 2 + i for an emoji of emotion i. A batch is scored by joining the
+texts into one codepoint array, indexing the table and counting per text
+with a single bincount. ASCII emoticons are matched by one compiled regex.
+"""
+import re
+import numpy as np
+
+EMOTION_EMOJIS = {
+    'love': '❤♥💕💖💗💓💞💘💝💟😍😘🥰😻💋😙😚💑💏🌹💌🫶',
+    'joyful': '😊😂🎉🥳😀😃😄😁😆🤣😹😸🙂😺☺🤗😎🎊🙌👏✨🌈👍💃🕺🥂🍾😇😋😜😝😛🤩',
+    'sad': '😢😭💔😞😔😟😿🥺☹🙁😥😓😩😫🥀😪',
+    'angry': '😠😡💢🤬👿😤😾🖕👊',
+    'fearful': '😨😰😱😧😦🙀😬😖😣🫣',
+    'surprised': '😮😯😲😳🤯😵‼⁉❗❕❓🫢',
+    'neutral': '😐😑😶🤔🫤'
+}
+
+# ASCII emoticons, longest alternatives first so ">:(" is not read as ":("
+EMOTION_EMOTICONS = {
+    'love': ['<3', ':-*', ':*'],
+    'joyful': [':-)', ':)', ':]', '=)', ':-D', ':D', '=D', 'xD', 'XD', '^_^', '^^', ';-)', ';)', ':P', ':p'],
+    'sad': ["</3", ":'(", ':-(', ':(', ':[', '=(', ';(', 'T_T'],
+    'angry': ['>:-(', '>:(', '>:['],
+    'fearful': ['D:'],
+    'surprised': [':-O', ':O', ':o', 'o_O', 'O_o', ':0'],
+    'neutral': [':-|', ':|', '-_-']
+}
+
+# Pictographic blocks; anything here without a listed emotion counts as a generic emoji
+EMOJI_RANGES = [
+    (0x2300, 0x23FF), (0x2600, 0x27BF), (0x2B00, 0x2BFF), (0x1F000, 0x1F2FF),
+    (0x1F300, 0x1F5FF), (0x1F600, 0x1F64F), (0x1F680, 0x1F6FF), (0x1F700, 0x1F7FF),
+    (0x1F900, 0x1F9FF), (0x1FA70, 0x1FAFF)
+]
+UNICODE_SIZE = 0x110000
+
+
+class EmojiFeatures:
+    """Per-emotion emoji and emoticon counts, plus a count of other emoji"""
+
+    def __init__(self, emotion_emojis=EMOTION_EMOJIS, emotion_emoticons=EMOTION_EMOTICONS):
+        self.emotions = list(emotion_emojis)
+
+        self.table = np.zeros(UNICODE_SIZE, dtype=np.uint8)
+        for start, end in EMOJI_RANGES:
+            self.table[start:end + 1] = 1
+        for i, emotion in enumerate(self.emotions):
+            for char in emotion_emojis[emotion]:
+                self.table[ord(char)] = 2 + i
+
+        self.emoticon_emotion = {
+            emoticon: self.emotions.index(emotion)
+            for emotion, emoticons in emotion_emoticons.items() for emoticon in emoticons
+        }
+        alternatives = sorted(self.emoticon_emotion, key=len, reverse=True)
+        first_chars = ''.join(sorted({emoticon[0] for emoticon in alternatives}))
+        # The leading character class rejects most positions before the alternation is tried
+        self.emoticon_pattern = re.compile(
+            '(?=[' + re.escape(first_chars) + r'])(?<![A-Za-z0-9])('
+            + '|'.join(re.escape(emoticon) for emoticon in alternatives) + r')(?![A-Za-z0-9])'
+        )
+
+    @property
+    def columns(self):
+        return self.emotions + ['other_emoji']
+
+    def counts(self, texts):
+        """Array of shape (len(texts), len(emotions) + 1) with emoji and emoticon counts"""
+        n_columns = len(self.emotions) + 1
+        joined = '\x00'.join(texts)
+        codes = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32)
+        # Ids come from the text lengths, since a text may itself contain U+0000
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+        text_ids = np.repeat(np.arange(len(texts)), lengths + 1)[:len(codes)]
+        categories = self.table[codes].astype(np.int64)
+        hits = categories > 0
+        # Category 1 (generic emoji) goes to the last column, 2 + i to column i
+        columns = np.where(categories[hits] == 1, n_columns - 1, categories[hits] - 2)
+        counts = np.bincount(
+            text_ids[hits] * n_columns + columns, minlength=len(texts) * n_columns
+        ).reshape(len(texts), n_columns)
+
+        # One regex pass over the joined batch; match offsets map back to texts
+        matches = [(match.start(), self.emoticon_emotion[match.group(1)]) for match in self.emoticon_pattern.finditer(joined)]
+        if matches:
+            starts, columns = np.array(matches).T
+            np.add.at(counts, (text_ids[starts], columns), 1)
+        return counts
+
+    def emotion_counts(self, text):
+        """{emotion: count} for one text"""
+        return dict(zip(self.emotions, self.counts([text])[0].tolist()))
@@ -0,0 +1,119 @@
+# encoding.py
+"""Compact encodings for batch results
+
+The default `/batch_analyze` response repeats the text, the class names and
+a probability list per item. The formats here send the class names once and
+the probabilities as one float32 matrix:
+
+- columnar: JSON object of columns
+- msgpack:  the same columns, probabilities as raw little-endian float32 bytes
+- arrow:    Arrow IPC stream, one `prob_<label>` float32 column per label
+"""
+import json
+import numpy as np
+
+MIMETYPES = {
+    'json': 'application/json',
+    'columnar': 'application/json',
+    'msgpack': 'application/x-msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+
+def negotiate_format(requested, accept_header):
+    """Pick a response format from the request body or the Accept header"""
+    if requested is not None:
+        if requested not in MIMETYPES:
+            raise ValueError(f"Unknown format '{requested}', expected one of {', '.join(MIMETYPES)}")
+        return requested
+    for name in ('arrow', 'msgpack'):
+        if MIMETYPES[name] in (accept_header or ''):
+            return name
+    return 'json'
+
+
+def result_columns(results, class_names, texts=None, positions=None, reports=None):
+    """Column-oriented view of a list of API results
+
+    `positions` holds the request index of every result, so clients can line
+    results up with their input when some items were rejected. `reports`
+    holds batch-level extras (validation errors, truncated indices, the
+    dedup report) that travel next to the columns.
+    """
+    columns = {
+        'class_names': list(class_names),
+        'index': np.asarray(positions if positions is not None else range(len(results)), dtype=np.int32),
+        'emotion': [result['emotion'] for result in results],
+        'confidence': np.array([result['confidence'] for result in results], dtype=np.float32),
+        'tier': [result['tier'] for result in results],
+        'probabilities': np.array(
+            [result['probabilities'] for result in results], dtype=np.float32
+        ).reshape(len(results), len(class_names))
+    }
+    if texts is not None:
+        columns['text'] = list(texts)
+    columns['reports'] = dict(reports or {})
+    return columns
+
+
+def encode_columnar(columns):
+    payload = dict(columns)
+    payload.update(payload.pop('reports'))
+    payload['index'] = columns['index'].tolist()
+    # Six decimals is already finer than float32 resolution near 1.0
+    payload['confidence'] = np.round(columns['confidence'].astype(np.float64), 6).tolist()
+    payload['probabilities'] = np.round(columns['probabilities'].astype(np.float64), 6).tolist()
+    payload['success'] = True
+    return json.dumps(payload, separators=(',', ':'))
+
+
+def encode_msgpack(columns):
+    import msgpack
+
+    payload = dict(columns)
+    payload.update(payload.pop('reports'))
+    payload['index'] = columns['index'].tolist()
+    payload['confidence'] = columns['confidence'].astype('<f4').tobytes()
+    payload['probabilities'] = {
+        'shape': list(columns['probabilities'].shape),
+        'data': columns['probabilities'].astype('<f4').tobytes()
+    }
+    payload['success'] = True
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def encode_arrow(columns):
+    import pyarrow as pa
+
+    arrays = {'index': pa.array(columns['index'])}
+    if 'text' in columns:
+        arrays['text'] = pa.array(columns['text'], pa.string())
+    arrays['emotion'] = pa.array(columns['emotion'], pa.string()).dictionary_encode()
+    arrays['confidence'] = pa.array(columns['confidence'])
+    arrays['tier'] = pa.array(columns['tier'], pa.string()).dictionary_encode()
+    for i, label in enumerate(columns['class_names']):
+        arrays[f'prob_{label}'] = pa.array(columns['probabilities'][:, i])
+
+    metadata = {name: json.dumps(value) for name, value in columns['reports'].items()}
+    metadata['class_names'] = json.dumps(columns['class_names'])
+    table = pa.table(arrays).replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+ENCODERS = {
+    'columnar': encode_columnar,
+    'msgpack': encode_msgpack,
+    'arrow': encode_arrow
+}
+
+
+def encode_results(results, class_names, fmt, texts=None, positions=None, reports=None):
+    """Encode batch results in a compact format; returns (body, mimetype)"""
+    try:
+        body = ENCODERS[fmt](result_columns(results, class_names, texts, positions, reports))
+    except ImportError as e:
+        raise ValueError(f"Format '{fmt}' is not available on this server: {e}")
+    return body, MIMETYPES[fmt]
@@ -0,0 +1,178 @@
+# evaluate.py
+"""Accuracy and latency report for every EmotionAnalyzer backend
+
+Runs each available prediction mode over dataset/test.txt and
+dataset/val.txt in batches and reports macro-F1, a confusion matrix and
+expected calibration error next to throughput and per-item latency. The
+report is saved as JSON per model version, so a speed-up that costs
+accuracy shows up next to the numbers it changed.
+
+    python evaluate.py --output-dir reports
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+from fast_model import DATASET_DIR, load_dataset
+from model_registry import file_digest
+
+
+def macro_f1(y_true, y_pred, labels):
+    """Unweighted mean of per-label F1 over `labels`"""
+    scores = []
+    for label in labels:
+        true_positive = np.sum((y_pred == label) & (y_true == label))
+        predicted = np.sum(y_pred == label)
+        actual = np.sum(y_true == label)
+        if predicted == 0 and actual == 0:
+            continue
+        scores.append(2 * true_positive / (predicted + actual))
+    return float(np.mean(scores)) if scores else 0.0
+
+
+def confusion_matrix(y_true, y_pred, labels):
+    """Rows are true labels, columns predicted labels"""
+    index = {label: i for i, label in enumerate(labels)}
+    matrix = np.zeros((len(labels), len(labels)), dtype=np.int64)
+    np.add.at(matrix, ([index[label] for label in y_true], [index[label] for label in y_pred]), 1)
+    return matrix
+
+
+def expected_calibration_error(confidences, correct, bins=15):
+    """Weighted gap between confidence and accuracy over equal-width bins"""
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    bin_ids = np.clip(np.digitize(confidences, edges[1:-1]), 0, bins - 1)
+    error = 0.0
+    for b in range(bins):
+        in_bin = bin_ids == b
+        if in_bin.any():
+            error += in_bin.mean() * abs(confidences[in_bin].mean() - correct[in_bin].mean())
+    return float(error)
+
+
+def available_modes(analyzer):
+    """Modes that can actually run with the models loaded in `analyzer`"""
+    modes = ['emotion_based']
+    if analyzer.fast_model is not None:
+        modes.append('fast')
+    if analyzer.has_numpy_model():
+        modes.append('model')
+        if analyzer.fast_model is not None:
+            modes.append('cascade')
+    return modes
+
+
+def evaluate_mode(analyzer, mode, texts, labels, batch_size=512, latency_samples=200):
+    """Batched accuracy pass plus single-item latency for one mode"""
+    display_labels = analyzer.class_names
+
+    results = []
+    start = time.perf_counter()
+    for offset in range(0, len(texts), batch_size):
+        results.extend(analyzer.predict_batch(texts[offset:offset + batch_size], mode))
+    batch_seconds = time.perf_counter() - start
+
+    # Per-item latency is what an interactive /analyze call pays
+    latencies = []
+    for text in texts[:latency_samples]:
+        item_start = time.perf_counter()
+        analyzer.predict_emotion(text, mode)
+        latencies.append((time.perf_counter() - item_start) * 1000)
+
+    y_true = np.asarray(labels)
+    y_pred = np.asarray([result['emotion'] for result in results])
+    confidences = np.asarray([result['confidence'] for result in results], dtype=np.float64)
+    correct = (y_true == y_pred).astype(np.float64)
+    tiers = [result.get('tier') for result in results]
+    # Texts turned away by the language pre-stage get their own column
+    matrix_labels = display_labels + sorted(set(y_pred) - set(display_labels))
+
+    report = {
+        'accuracy': float(correct.mean()),
+        'macro_f1': macro_f1(y_true, y_pred, sorted(set(y_true) | set(y_pred))),
+        'expected_calibration_error': expected_calibration_error(confidences, correct),
+        'confusion_matrix': {
+            'labels': matrix_labels,
+            'matrix': confusion_matrix(y_true, y_pred, matrix_labels).tolist()
+        },
+        'throughput_texts_per_second': len(texts) / batch_seconds if batch_seconds else None,
+        'batch_size': batch_size,
+        'latency_ms': {
+            'p50': float(np.percentile(latencies, 50)),
+            'p95': float(np.percentile(latencies, 95)),
+            'p99': float(np.percentile(latencies, 99)),
+            'mean': float(np.mean(latencies))
+        }
+    }
+    if mode == 'cascade':
+        report['escalation_rate'] = tiers.count('model') / len(tiers)
+    return report
+
+
+def run_evaluation(analyzer, splits=('test', 'val'), modes=None, dataset_dir=DATASET_DIR, batch_size=512):
+    modes = modes or available_modes(analyzer)
+    to_display = analyzer.label_schema.model_to_display
+    # Cached or stored results would make the throughput and latency numbers meaningless
+    analyzer.results_cache.max_entries = 0
+    analyzer.results_cache.entries.clear()
+    analyzer.prediction_store = None
+
+    report = {}
+    for split in splits:
+        texts, labels = load_dataset(os.path.join(dataset_dir, f'{split}.txt'))
+        labels = [to_display[label] for label in labels]
+        report[split] = {}
+        for mode in modes:
+            print(f"Evaluating {mode} on {split}.txt ...")
+            report[split][mode] = evaluate_mode(analyzer, mode, texts, labels, batch_size)
+    return report
+
+
+def print_summary(report):
+    print(f"{'split':<6} {'mode':<14} {'acc':>7} {'macroF1':>8} {'ECE':>7} {'texts/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for split, modes in report.items():
+        for mode, r in modes.items():
+            print(f"{split:<6} {mode:<14} {r['accuracy']:>7.4f} {r['macro_f1']:>8.4f} "
+                  f"{r['expected_calibration_error']:>7.4f} {r['throughput_texts_per_second']:>10.0f} "
+                  f"{r['latency_ms']['p50']:>8.3f} {r['latency_ms']['p99']:>8.3f}")
+
+
+if __name__ == '__main__':
+    from app import EmotionAnalyzer
+
+    parser = argparse.ArgumentParser(description='Evaluate accuracy and latency of every prediction backend')
+    parser.add_argument('--weights', default='bilstm_weights.npz')
+    parser.add_argument('--fast-model', default='fast_model.pkl')
+    parser.add_argument('--modes', nargs='+', help='Defaults to every mode the loaded models support')
+    parser.add_argument('--splits', nargs='+', default=['test', 'val'])
+    parser.add_argument('--batch-size', type=int, default=512)
+    parser.add_argument('--version', help='Model version label (default: hash of the model files)')
+    parser.add_argument('--output-dir', default='reports')
+    args = parser.parse_args()
+
+    analyzer = EmotionAnalyzer()
+    if os.path.exists(args.weights):
+        analyzer.load_model(args.weights)
+    if os.path.exists(args.fast_model):
+        analyzer.load_fast_model(args.fast_model)
+
+    fingerprints = {
+        'weights': file_digest(args.weights) if os.path.exists(args.weights) else None,
+        'fast_model': file_digest(args.fast_model) if os.path.exists(args.fast_model) else None
+    }
+    version = args.version or '-'.join(value or 'none' for value in fingerprints.values())
+
+    report = run_evaluation(analyzer, args.splits, args.modes, batch_size=args.batch_size)
+    print_summary(report)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_path = os.path.join(args.output_dir, f'eval_{version}.json')
+    with open(output_path, 'w') as f:
+        json.dump({
+            'version': version,
+            'model_files': fingerprints,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': report
+        }, f, indent=2)
+    print(f"Report saved to {output_path}")
@@ -0,0 +1,139 @@
+# fast_model.py
+import os
+import pickle
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.linear_model import LogisticRegression
+from label_schema import SCHEMA_PATH, LabelSchema, write_label_schema
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataset')
+
+
+def load_dataset(path):
+    """Read a `text;label` dataset file into two lists"""
+    texts, labels = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            text, label = line.rsplit(';', 1)
+            texts.append(text)
+            labels.append(label)
+    return texts, labels
+
+
+class FastEmotionModel:
+    """Hashed n-gram TF-IDF features with a sparse linear classifier
+
+    Much cheaper than the BiLSTM: scoring is one sparse matrix product, so it
+    can take high-volume traffic where the keyword heuristic is too crude.
+    """
+
+    def __init__(self, n_features=2 ** 18, ngram_range=(1, 2), C=30.0):
+        # Hashing keeps the feature space fixed, so there is no vocabulary to store
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=ngram_range,
+            alternate_sign=False,
+            norm=None
+        )
+        self.tfidf = TfidfTransformer(sublinear_tf=True)
+        self.classifier = LogisticRegression(C=C, max_iter=1000)
+        self.class_names = None
+        self.accuracy = {}
+
+    def fit(self, texts, labels):
+        """Fit the TF-IDF weights and the classifier"""
+        features = self.tfidf.fit_transform(self.vectorizer.transform(texts))
+        self.classifier.fit(features, labels)
+        self.class_names = [str(name) for name in self.classifier.classes_]
+        return self
+
+    def predict_proba(self, texts):
+        """Return class probabilities for a batch of raw texts"""
+        if not texts:
+            return np.zeros((0, len(self.class_names)))
+        features = self.tfidf.transform(self.vectorizer.transform(texts))
+        return self.classifier.predict_proba(features)
+
+    def score(self, texts, labels):
+        """Accuracy on a labelled set"""
+        predictions = np.asarray(self.class_names)[self.predict_proba(texts).argmax(axis=1)]
+        return float(np.mean(predictions == np.asarray(labels)))
+
+    def save(self, path):
+        # Pickle the fitted parts rather than the instance, so a model trained
+        # from the command line (where this module is __main__) still loads
+        with open(path, 'wb') as f:
+            pickle.dump({
+                'vectorizer': self.vectorizer,
+                'tfidf': self.tfidf,
+                'classifier': self.classifier,
+                'class_names': self.class_names,
+                'accuracy': self.accuracy
+            }, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        model = cls()
+        model.__dict__.update(state)
+        return model
+
+
+def train_fast_model(dataset_dir=DATASET_DIR, c_values=(10.0, 30.0, 100.0)):
+    """Train on train.txt, pick C on val.txt and report accuracy on test.txt"""
+    train_texts, train_labels = load_dataset(os.path.join(dataset_dir, 'train.txt'))
+    val_texts, val_labels = load_dataset(os.path.join(dataset_dir, 'val.txt'))
+    test_texts, test_labels = load_dataset(os.path.join(dataset_dir, 'test.txt'))
+
+    best_model, best_val = None, -1.0
+    for C in c_values:
+        model = FastEmotionModel(C=C).fit(train_texts, train_labels)
+        val_accuracy = model.score(val_texts, val_labels)
+        print(f"C={C}: validation accuracy {val_accuracy:.4f}")
+        if val_accuracy > best_val:
+            best_model, best_val = model, val_accuracy
+
+    best_model.accuracy = {
+        'validation': best_val,
+        'test': best_model.score(test_texts, test_labels)
+    }
+    return best_model
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Train the fast-path emotion model')
+    parser.add_argument('--dataset-dir', default=DATASET_DIR)
+    parser.add_argument('--output', default='fast_model.pkl')
+    parser.add_argument('--write-schema', action='store_true',
+                        help='Replace label_schema.json with one built from the trained classes')
+    args = parser.parse_args()
+
+    model = train_fast_model(args.dataset_dir)
+    print(f"Test accuracy: {model.accuracy['test']:.4f}")
+
+    # The schema is shared with the BiLSTM, so a model with other classes must not be served under it
+    if not args.write_schema:
+        schema_labels = LabelSchema.load().model_labels if os.path.exists(SCHEMA_PATH) else []
+        if sorted(schema_labels) != sorted(model.class_names):
+            raise SystemExit(
+                f"Trained classes {model.class_names} do not match {SCHEMA_PATH} ({schema_labels}); "
+                f"model not saved. Re-run with --write-schema to replace the schema."
+            )
+
+    test_texts, _ = load_dataset(os.path.join(args.dataset_dir, 'test.txt'))
+    start = time.perf_counter()
+    model.predict_proba(test_texts)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {len(test_texts)} texts in {elapsed:.3f}s ({len(test_texts) / elapsed:.0f} texts/s)")
+
+    model.save(args.output)
+    print(f"Model saved to {args.output}")
+    if args.write_schema:
+        write_label_schema(model.class_names)
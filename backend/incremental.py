@@ -0,0 +1,103 @@
+# incremental.py
+import re
+import threading
+import time
+from collections import deque
+import numpy as np
+
+WORD_PATTERN = re.compile(r"[a-z']+")
+
+
+class IncrementalSession:
+    """Rolling emotion state over the last `window` tokens of a growing text
+
+    Each append is scored on its own and kept as a segment; the rolling
+    scores are token-weighted sums over the segments still in the window, so
+    an update costs time proportional to the appended text, not the whole
+    transcript. Old segments are evicted whole once the newer ones already
+    cover the window.
+    """
+
+    def __init__(self, mode, window, n_emotions, max_pending=100):
+        self.mode = mode
+        self.window = window
+        self.pending = ''
+        self.max_pending = max_pending
+        self.segments = deque()
+        self.window_tokens = 0
+        self.total_tokens = 0
+        self.lexicon_counts = np.zeros(n_emotions, dtype=np.int64)
+        self.probability_sum = None
+        self.probability_weight = 0
+        self.model_state = None
+        self.model_version = None
+        self.last_seen = time.time()
+        self.lock = threading.Lock()
+
+    def take_complete_text(self, text, final=False):
+        """Append text and return the part made of complete words
+
+        A trailing word without whitespace after it may still be growing
+        ("hap" + "py"), so it is held back until more text or `final` arrives.
+        Past `max_pending` characters it is no word, and it is released as it is.
+        """
+        text = self.pending + text
+        cut = max(text.rfind(' '), text.rfind('\n'), text.rfind('\t')) + 1
+        if final or len(text) - cut > self.max_pending:
+            self.pending = ''
+            return text
+        self.pending = text[cut:]
+        return text[:cut]
+
+    def add_segment(self, n_tokens, lexicon_counts, probabilities=None, weight=0):
+        """Add one scored segment and evict segments that fell out of the window"""
+        self.segments.append((n_tokens, lexicon_counts, probabilities, weight))
+        self.window_tokens += n_tokens
+        self.total_tokens += n_tokens
+        self.lexicon_counts += lexicon_counts
+        if probabilities is not None and weight:
+            if self.probability_sum is None:
+                self.probability_sum = np.zeros_like(probabilities, dtype=np.float64)
+            self.probability_sum += weight * probabilities
+            self.probability_weight += weight
+
+        while len(self.segments) > 1 and self.window_tokens - self.segments[0][0] >= self.window:
+            old_tokens, old_counts, old_probabilities, old_weight = self.segments.popleft()
+            self.window_tokens -= old_tokens
+            self.lexicon_counts -= old_counts
+            if old_probabilities is not None and old_weight:
+                self.probability_sum -= old_weight * old_probabilities
+                self.probability_weight -= old_weight
+
+    def rolling_probabilities(self):
+        if not self.probability_weight:
+            return None
+        return self.probability_sum / self.probability_weight
+
+
+class SessionStore:
+    """Thread-safe registry of incremental sessions with idle expiry"""
+
+    def __init__(self, session_ttl=900):
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+    def add(self, session_id, session):
+        self.expire_idle()
+        with self._lock:
+            self.sessions[session_id] = session
+
+    def get(self, session_id):
+        with self._lock:
+            return self.sessions.get(session_id)
+
+    def remove(self, session_id):
+        with self._lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def expire_idle(self):
+        cutoff = time.time() - self.session_ttl
+        with self._lock:
+            for session_id in [key for key, session in self.sessions.items() if session.last_seen < cutoff]:
+                del self.sessions[session_id]
@@ -0,0 +1,172 @@
+# label_schema.py
+import json
+import os
+import numpy as np
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'label_schema.json')
+
+# Labels shown by the API and the dashboard, with their presentation details.
+# 'neutral' only comes from the emotion-based analysis; the models never emit it.
+DISPLAY_EMOTIONS = {
+    'love': {
+        'description': 'Feelings of affection, care, and deep attachment',
+        'examples': ['I love you so much!', 'This is my favorite thing ever!', 'You mean everything to me ❤️'],
+        'color': '#e74c3c',
+        'dark_color': '#c0392b',
+        'emoji': '❤️',
+        'image': '💕'
+    },
+    'sad': {
+        'description': 'Feelings of unhappiness, sorrow, or disappointment',
+        'examples': ['I feel so lonely today', 'This makes me want to cry 😢', 'Nothing seems to work out'],
+        'color': '#3498db',
+        'dark_color': '#2980b9',
+        'emoji': '😢',
+        'image': '🌧️'
+    },
+    'angry': {
+        'description': 'Feelings of frustration, irritation, or rage',
+        'examples': ['This makes me so mad!', 'I cant believe this happened!', 'Im furious about this! 😠'],
+        'color': '#e67e22',
+        'dark_color': '#d35400',
+        'emoji': '😠',
+        'image': '🔥'
+    },
+    'neutral': {
+        'description': 'Neutral or balanced emotional state',
+        'examples': ['The weather is okay today', 'Nothing special happened', 'Its a regular day'],
+        'color': '#95a5a6',
+        'dark_color': '#7f8c8d',
+        'emoji': '😐',
+        'image': '⚖️'
+    },
+    'joyful': {
+        'description': 'Feelings of happiness, excitement, and delight',
+        'examples': ['Im so happy right now!', 'This is amazing! 🎉', 'What a wonderful day! 😊'],
+        'color': '#f1c40f',
+        'dark_color': '#f39c12',
+        'emoji': '😊',
+        'image': '🌈'
+    },
+    'fearful': {
+        'description': 'Feelings of worry, anxiety, or being under threat',
+        'examples': ['I am so nervous about tomorrow', 'This situation makes me anxious', 'I feel scared and alone 😨'],
+        'color': '#8e44ad',
+        'dark_color': '#6c3483',
+        'emoji': '😨',
+        'image': '🌪️'
+    },
+    'surprised': {
+        'description': 'Feelings of amazement or of something unexpected',
+        'examples': ['I did not see that coming!', 'Wow, I am amazed 😮', 'I am shocked by the news'],
+        'color': '#1abc9c',
+        'dark_color': '#16a085',
+        'emoji': '😮',
+        'image': '✨'
+    }
+}
+
+# Dataset label -> display label
+MODEL_TO_DISPLAY = {
+    'anger': 'angry',
+    'fear': 'fearful',
+    'joy': 'joyful',
+    'love': 'love',
+    'sadness': 'sad',
+    'surprise': 'surprised'
+}
+
+
+def gather_index(model_labels, display_labels, model_to_display):
+    """Index array that reorders model outputs into display order
+
+    Display labels the model does not produce point one past the last model
+    column, which LabelSchema.to_display fills with zeros.
+    """
+    position = {model_to_display[label]: i for i, label in enumerate(model_labels)}
+    return [position.get(label, len(model_labels)) for label in display_labels]
+
+
+def build_label_schema(model_labels):
+    """Build the schema for a model trained on `model_labels` (LabelEncoder order)"""
+    model_labels = [str(label) for label in model_labels]
+    unknown = [label for label in model_labels if label not in MODEL_TO_DISPLAY]
+    if unknown:
+        raise ValueError(f"No display label for: {', '.join(unknown)}")
+
+    display_labels = list(DISPLAY_EMOTIONS)
+    return {
+        'model_labels': model_labels,
+        'display_labels': display_labels,
+        'model_to_display': {label: MODEL_TO_DISPLAY[label] for label in model_labels},
+        'gather_index': gather_index(model_labels, display_labels, MODEL_TO_DISPLAY),
+        'emotions': DISPLAY_EMOTIONS
+    }
+
+
+def write_label_schema(model_labels, path=SCHEMA_PATH):
+    """Write the schema artifact next to the trained model"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(build_label_schema(model_labels), f, indent=2, ensure_ascii=False)
+    print(f"Label schema written to {path}")
+
+
+class LabelSchema:
+    """Shared label space for the backend and the dashboard"""
+
+    def __init__(self, schema):
+        self.model_labels = schema['model_labels']
+        self.display_labels = schema['display_labels']
+        self.model_to_display = schema['model_to_display']
+        self.gather_index = np.asarray(schema['gather_index'], dtype=np.intp)
+        self.emotions = schema['emotions']
+        self._index_cache = {tuple(self.model_labels): self.gather_index}
+
+    @classmethod
+    def load(cls, path=SCHEMA_PATH):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def to_dict(self):
+        return {
+            'model_labels': self.model_labels,
+            'display_labels': self.display_labels,
+            'model_to_display': self.model_to_display,
+            'gather_index': self.gather_index.tolist(),
+            'emotions': self.emotions
+        }
+
+    def index_for(self, class_names):
+        """Gather index for a model whose outputs are in `class_names` order"""
+        key = tuple(class_names)
+        if key not in self._index_cache:
+            self._index_cache[key] = np.asarray(
+                gather_index(class_names, self.display_labels, self.model_to_display), dtype=np.intp
+            )
+        return self._index_cache[key]
+
+    def to_display(self, probabilities, class_names=None):
+        """Remap a (batch, model classes) matrix to display order with one gather"""
+        probabilities = np.asarray(probabilities)
+        index = self.gather_index if class_names is None else self.index_for(class_names)
+        # Extra zero column for display labels the model cannot produce
+        padded = np.concatenate([probabilities, np.zeros((len(probabilities), 1), probabilities.dtype)], axis=1)
+        return padded[:, index]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Write label_schema.json for a trained model')
+    parser.add_argument('--weights', help='Exported bilstm_weights.npz to read the label order from')
+    parser.add_argument('--labels', help='Comma-separated model labels in LabelEncoder order')
+    parser.add_argument('--output', default=SCHEMA_PATH)
+    args = parser.parse_args()
+
+    if args.weights:
+        labels = [str(label) for label in np.load(args.weights)['class_names']]
+    elif args.labels:
+        labels = args.labels.split(',')
+    else:
+        labels = sorted(MODEL_TO_DISPLAY)
+    write_label_schema(labels, args.output)
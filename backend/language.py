@@ -0,0 +1,191 @@
+# language.py
+"""Script and language pre-stage for the prediction pipeline
+
+The models are trained on English only, and preprocessing strips every
+non-ASCII letter, so other languages come out as near-empty inputs that
+score as "neutral". `LanguageDetector` flags those texts before inference:
+
+- script: letters are bucketed by Unicode block; a text whose letters are
+  mostly non-Latin is unsupported.
+- language: Latin texts are scored against a character trigram profile of
+  the English training set. A text is unsupported when it is less
+  English-like than almost all of the validation split and most of its
+  words are also missing from the training vocabulary; the vocabulary
+  check keeps English slang and typos, which score poorly on trigrams
+  alone, from being turned away.
+
+Script and trigram scoring run over a whole batch at once on one array of
+codepoints.
+
+    python language.py                 # writes language_profile.npz
+"""
+import os
+import re
+from collections import Counter
+import numpy as np
+
+PROFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'language_profile.npz')
+
+# Start of each Unicode range and the script it belongs to; letters outside
+# these ranges (digits, punctuation, emoji) are not counted
+SCRIPT_RANGES = [
+    (0x0000, None), (0x0041, 'latin'), (0x005B, None), (0x0061, 'latin'), (0x007B, None),
+    (0x00C0, 'latin'), (0x0250, None), (0x0370, 'greek'), (0x0400, 'cyrillic'), (0x0530, None),
+    (0x0590, 'hebrew'), (0x0600, 'arabic'), (0x0700, None), (0x0900, 'devanagari'), (0x0980, None),
+    (0x0E00, 'thai'), (0x0E80, None), (0x1100, 'hangul'), (0x1200, None), (0x1E00, 'latin'),
+    (0x1F00, 'greek'), (0x2000, None), (0x3040, 'kana'), (0x3100, None), (0x3400, 'han'),
+    (0xA000, None), (0xAC00, 'hangul'), (0xD7B0, None), (0xF900, 'han'), (0xFB00, None)
+]
+SCRIPTS = sorted({script for _, script in SCRIPT_RANGES if script is not None})
+
+# Trigram alphabet: 0 = boundary, 1-26 = a-z, 27 = any accented Latin letter
+ALPHABET_SIZE = 28
+WORD_PATTERN = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+
+def _codepoints(texts):
+    """Lowercased codepoints of all texts, separated by 0, plus the text id of each position"""
+    # Lowercasing can change a text's length, so it happens before the lengths are taken
+    lowered = [text.lower() for text in texts]
+    codes = np.frombuffer('\x00'.join(lowered).encode('utf-32-le'), dtype=np.uint32)
+    # Ids come from the text lengths, since a text may itself contain U+0000
+    lengths = np.fromiter(map(len, lowered), dtype=np.int64, count=len(lowered))
+    text_ids = np.repeat(np.arange(len(lowered)), lengths + 1)[:len(codes)]
+    return codes, text_ids
+
+
+def _symbols(codes):
+    symbols = np.zeros(len(codes), dtype=np.int64)
+    ascii_letters = (codes >= ord('a')) & (codes <= ord('z'))
+    symbols[ascii_letters] = codes[ascii_letters] - ord('a') + 1
+    symbols[((codes >= 0xC0) & (codes < 0x250) & (codes != 0xD7) & (codes != 0xF7))
+            | ((codes >= 0x1E00) & (codes < 0x1F00))] = 27
+    return symbols
+
+
+def _trigrams(codes, text_ids):
+    """Trigram ids and the text each belongs to; trigrams centred on a boundary are skipped"""
+    symbols = _symbols(codes)
+    if len(symbols) < 3:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    middle = symbols[1:-1]
+    trigrams = (symbols[:-2] * ALPHABET_SIZE + middle) * ALPHABET_SIZE + symbols[2:]
+    keep = middle != 0
+    return trigrams[keep], text_ids[1:-1][keep]
+
+
+def build_profile(texts, smoothing=0.5):
+    """Smoothed log-probabilities of every trigram in `texts`"""
+    codes, text_ids = _codepoints(texts)
+    trigrams, _ = _trigrams(codes, text_ids)
+    counts = np.bincount(trigrams, minlength=ALPHABET_SIZE ** 3).astype(np.float64) + smoothing
+    return np.log(counts / counts.sum()).astype(np.float32)
+
+
+class LanguageDetector:
+    """Batch script and language check against a precomputed trigram profile"""
+
+    def __init__(self, log_probs, threshold, vocabulary, min_trigrams=12, min_coverage=0.5,
+                 min_script_share=0.5):
+        self.log_probs = log_probs
+        self.threshold = threshold
+        self.vocabulary = set(vocabulary)
+        self.min_trigrams = min_trigrams
+        self.min_coverage = min_coverage
+        self.min_script_share = min_script_share
+        self._range_starts = np.array([start for start, _ in SCRIPT_RANGES], dtype=np.uint32)
+        self._range_scripts = np.array([
+            SCRIPTS.index(script) if script is not None else -1 for _, script in SCRIPT_RANGES
+        ])
+
+    @classmethod
+    def load(cls, path=PROFILE_PATH):
+        profile = np.load(path)
+        return cls(
+            profile['log_probs'], float(profile['threshold']), str(profile['vocabulary']).split('\n'),
+            int(profile['min_trigrams']), float(profile['min_coverage'])
+        )
+
+    def save(self, path=PROFILE_PATH):
+        np.savez(
+            path,
+            log_probs=self.log_probs,
+            threshold=np.array(self.threshold),
+            vocabulary=np.array('\n'.join(sorted(self.vocabulary))),
+            min_trigrams=np.array(self.min_trigrams),
+            min_coverage=np.array(self.min_coverage)
+        )
+
+    def scores(self, texts):
+        """Mean trigram log-probability per text and the number of trigrams it was based on"""
+        codes, text_ids = _codepoints(texts)
+        trigrams, owners = _trigrams(codes, text_ids)
+        counts = np.bincount(owners, minlength=len(texts))
+        totals = np.bincount(owners, weights=self.log_probs[trigrams], minlength=len(texts))
+        return totals / np.maximum(counts, 1), counts
+
+    def detect(self, texts):
+        """Returns (supported mask, script per text, language per text)
+
+        Texts without letters, or too short to judge, count as supported.
+        """
+        codes, text_ids = _codepoints(texts)
+
+        # Letters per script per text in one bincount
+        scripts = self._range_scripts[np.searchsorted(self._range_starts, codes, side='right') - 1]
+        is_letter = scripts >= 0
+        letter_counts = np.bincount(
+            text_ids[is_letter] * len(SCRIPTS) + scripts[is_letter],
+            minlength=len(texts) * len(SCRIPTS)
+        ).reshape(len(texts), len(SCRIPTS))
+        totals = letter_counts.sum(axis=1)
+        dominant = letter_counts.argmax(axis=1)
+        latin = SCRIPTS.index('latin')
+        non_latin = (totals > 0) & (letter_counts[:, latin] < self.min_script_share * totals)
+
+        mean_log_probs, n_trigrams = self.scores(texts)
+        not_english = ~non_latin & (n_trigrams >= self.min_trigrams) & (mean_log_probs < self.threshold)
+        # Only the few texts that failed the trigram check pay for the word lookup
+        for index in np.flatnonzero(not_english):
+            words = WORD_PATTERN.findall(texts[index].lower())
+            known = sum(word in self.vocabulary for word in words)
+            not_english[index] = known < self.min_coverage * len(words)
+
+        script_names = [SCRIPTS[index] if total else None for index, total in zip(dominant, totals)]
+        languages = [
+            None if foreign_script else ('other' if foreign else 'en')
+            for foreign_script, foreign in zip(non_latin, not_english)
+        ]
+        return ~(non_latin | not_english), script_names, languages
+
+
+def train_detector(train_texts, val_texts, quantile=0.01, vocabulary_size=20000, min_trigrams=12):
+    """English profile and vocabulary from the training split, threshold from the validation split"""
+    word_counts = Counter(word for text in train_texts for word in WORD_PATTERN.findall(text.lower()))
+    vocabulary = [word for word, _ in word_counts.most_common(vocabulary_size)]
+
+    detector = LanguageDetector(build_profile(train_texts), -np.inf, vocabulary, min_trigrams)
+    val_scores, val_counts = detector.scores(val_texts)
+    val_scores = val_scores[val_counts >= min_trigrams]
+    detector.threshold = float(np.quantile(val_scores, quantile))
+    return detector
+
+
+if __name__ == '__main__':
+    import argparse
+    from fast_model import DATASET_DIR, load_dataset
+
+    parser = argparse.ArgumentParser(description='Build the English trigram profile for language detection')
+    parser.add_argument('--output', default=PROFILE_PATH)
+    args = parser.parse_args()
+
+    train_texts, _ = load_dataset(os.path.join(DATASET_DIR, 'train.txt'))
+    val_texts, _ = load_dataset(os.path.join(DATASET_DIR, 'val.txt'))
+    test_texts, _ = load_dataset(os.path.join(DATASET_DIR, 'test.txt'))
+
+    detector = train_detector(train_texts, val_texts)
+    supported, _, _ = detector.detect(test_texts)
+    print(f"Threshold {detector.threshold:.3f}; test texts kept as English: {supported.mean():.2%}")
+
+    detector.save(args.output)
+    print(f"Language profile saved to {args.output}")
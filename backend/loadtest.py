@@ -0,0 +1,496 @@
+# loadtest.py
+"""Replayable load tests for the backend
+
+A trace is a JSONL file of requests built from the dataset with a fixed
+seed, so every run replays the same traffic. The runner steps through a
+list of load levels, either closed-loop concurrency (N clients sending
+back to back) or open-loop arrival rates (requests start on a fixed
+schedule whether or not earlier ones finished, and latency is measured
+from the scheduled start so a stalled server can't hide its queueing).
+Each step reports throughput and latency percentiles per endpoint; the
+report is written as JSON and as an HTML page with the throughput and
+tail latency curves.
+
+`serve` runs the real Flask app with `StubModel` in place of the BiLSTM
+and the fast model: deterministic outputs and a configurable latency per
+call and per text, so serving overhead can be measured on its own.
+
+    python loadtest.py trace --output trace.jsonl --requests 2000
+    python loadtest.py serve --port 5001 --latency-ms 5 --per-text-ms 0.2
+    python loadtest.py run --url http://localhost:5001 --trace trace.jsonl --concurrency 1 2 4 8 16 32
+    python loadtest.py run --url http://localhost:5001 --trace trace.jsonl --rps 25 50 100 200
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from fast_model import DATASET_DIR, load_dataset
+
+SPLITS = ('train', 'val', 'test')
+DEFAULT_MIX = {'analyze': 0.7, 'batch': 0.2, 'session': 0.05, 'stream': 0.05}
+
+
+class StubModel:
+    """Deterministic stand-in for the BiLSTM and the fast model
+
+    Probabilities are derived from a CRC32 of the input, so the same text
+    always gets the same result. Every call sleeps `latency_ms` plus
+    `per_text_ms` per text to stand in for the model cost.
+    """
+
+    def __init__(self, class_names, latency_ms=0.0, per_text_ms=0.0, max_length=66):
+        self.class_names = list(class_names)
+        self.latency_ms = latency_ms
+        self.per_text_ms = per_text_ms
+        self.max_length = max_length
+        self.multipliers = np.random.default_rng(0).integers(
+            1, 2 ** 32, size=len(self.class_names), dtype=np.uint64
+        )
+
+    def _wait(self, n_texts):
+        delay = (self.latency_ms + self.per_text_ms * n_texts) / 1000
+        if delay > 0:
+            time.sleep(delay)
+
+    def _probabilities(self, keys):
+        hashes = np.array([zlib.crc32(key.encode('utf-8')) for key in keys], dtype=np.uint64)
+        # uint64 products wrap; the low 32 bits are well mixed
+        logits = ((hashes[:, None] * self.multipliers) & np.uint64(0xFFFFFFFF)) / 2 ** 32 * 4
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_texts(self, texts):
+        self._wait(len(texts))
+        return self._probabilities(texts)
+
+    def predict_proba(self, texts):
+        self._wait(len(texts))
+        return self._probabilities(texts)
+
+    def token_ids(self, text, unknown=None):
+        return [zlib.crc32(word.encode('utf-8')) % 10000 + 1 for word in text.split()]
+
+    def predict_continuation(self, indices, state=None, unknown=None):
+        self._wait(1)
+        return self._probabilities([' '.join(map(str, indices))])[0], None
+
+    def occlusion(self, texts, batch_size=256):
+        words = [text.split()[-self.max_length:] for text in texts]
+        variants = [
+            ' '.join(seq[:k] + seq[k + 1:]) if k >= 0 else ' '.join(seq)
+            for seq in words for k in range(-1, len(seq))
+        ]
+        self._wait(len(variants))
+        probabilities = self._probabilities(variants)
+        explained, row = [], 0
+        for seq in words:
+            explained.append((seq, probabilities[row:row + len(seq) + 1]))
+            row += len(seq) + 1
+        return explained
+
+
+def build_trace(n_requests, mix=None, batch_size=32, session_appends=8, seed=0, dataset_dir=DATASET_DIR):
+    """Requests sampled from the dataset splits with a fixed seed"""
+    texts = []
+    for split in SPLITS:
+        split_texts, _ = load_dataset(os.path.join(dataset_dir, f'{split}.txt'))
+        texts.extend(split_texts)
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=n_requests)
+
+    trace = []
+    for kind in kinds:
+        if kind == 'analyze':
+            trace.append({'kind': kind, 'text': rng.choice(texts)})
+        elif kind == 'batch':
+            trace.append({'kind': kind, 'texts': rng.sample(texts, batch_size)})
+        else:
+            # A message typed or spoken word by word, sent in growing pieces
+            words = ' '.join(rng.sample(texts, 3)).split()
+            cuts = sorted(rng.sample(range(1, len(words)), min(session_appends - 1, len(words) - 1)))
+            pieces = [' '.join(words[start:end]) + ' ' for start, end in zip([0] + cuts, cuts + [len(words)])]
+            trace.append({'kind': kind, 'pieces': pieces})
+    return trace
+
+
+def save_trace(trace, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for item in trace:
+            f.write(json.dumps(item) + '\n')
+
+
+def load_trace(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class LoadRunner:
+    """Replays a trace against a running backend and records every HTTP call"""
+
+    def __init__(self, url, trace, mode='model', timeout=30):
+        import requests
+
+        self.requests = requests
+        self.url = url.rstrip('/')
+        self.trace = trace
+        self.mode = mode
+        self.timeout = timeout
+        self._position = 0
+        self._lock = threading.Lock()
+
+    def _next_item(self):
+        with self._lock:
+            item = self.trace[self._position % len(self.trace)]
+            self._position += 1
+            return item
+
+    def _call(self, session, calls, endpoint, method, path, body=None, expected=200):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, self.url + path, json=body, timeout=self.timeout)
+            ok = response.status_code == expected
+            payload = response.json() if ok and method != 'DELETE' else None
+        except (self.requests.RequestException, ValueError):
+            ok, payload = False, None
+        calls.append((endpoint, time.perf_counter() - started, ok))
+        return payload
+
+    def execute(self, session, item):
+        """Run one trace item; returns a list of (endpoint, seconds, ok) per HTTP call"""
+        calls = []
+        if item['kind'] == 'analyze':
+            self._call(session, calls, '/analyze', 'POST', '/analyze', {'text': item['text'], 'mode': self.mode})
+        elif item['kind'] == 'batch':
+            self._call(session, calls, '/batch_analyze', 'POST', '/batch_analyze', {
+                'texts': item['texts'], 'mode': self.mode, 'include_text': False
+            })
+        elif item['kind'] == 'session':
+            opened = self._call(session, calls, '/sessions', 'POST', '/sessions', {'mode': self.mode})
+            if opened:
+                session_id = opened['session_id']
+                for i, piece in enumerate(item['pieces']):
+                    self._call(session, calls, '/sessions/append', 'POST', f'/sessions/{session_id}/append', {
+                        'text': piece, 'final': i == len(item['pieces']) - 1
+                    })
+                self._call(session, calls, '/sessions/close', 'DELETE', f'/sessions/{session_id}')
+        elif item['kind'] == 'stream':
+            opened = self._call(session, calls, '/stream/sessions', 'POST', '/stream/sessions', {'mode': self.mode})
+            if opened:
+                self._stream(session, calls, opened['session_id'], item['pieces'])
+        return calls
+
+    def _stream(self, session, calls, session_id, pieces):
+        """Send growing pieces to a live session, waiting for the event of each update"""
+        events = None
+        try:
+            events = session.get(f'{self.url}/stream/{session_id}/events', stream=True, timeout=self.timeout)
+            lines = events.iter_lines(decode_unicode=True)
+            if events.status_code != 200 or self._next_event(lines) != 'ready':
+                calls.append(('/stream/events', 0.0, False))
+                return
+            text = ''
+            for piece in pieces:
+                text += piece
+                started = time.perf_counter()
+                if self._call(session, calls, '/stream/update', 'POST', f'/stream/{session_id}/update',
+                              {'text': text}, expected=202) is None:
+                    break
+                # Latency of a live update is from sending it until its result arrives
+                event = self._next_event(lines)
+                calls.append(('/stream/events', time.perf_counter() - started, event == 'emotion'))
+        except self.requests.RequestException:
+            calls.append(('/stream/events', 0.0, False))
+        finally:
+            self._call(session, calls, '/stream/close', 'DELETE', f'/stream/{session_id}')
+            if events is not None:
+                events.close()
+
+    @staticmethod
+    def _next_event(lines):
+        """Name of the next SSE event in `lines`, skipping keep-alive comments; None if the stream ended"""
+        event = None
+        for line in lines:
+            if line.startswith('event:'):
+                event = line[len('event:'):].strip()
+            elif not line and event is not None:
+                return event
+        return None
+
+    def run_closed(self, concurrency, seconds):
+        """`concurrency` clients replaying the trace back to back"""
+        records = []
+        deadline = time.perf_counter() + seconds
+
+        def client():
+            session = self.requests.Session()
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                calls = self.execute(session, self._next_item())
+                records.append((time.perf_counter() - started, calls))
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return records, time.perf_counter() - started
+
+    def run_open(self, rps, seconds, max_in_flight=256):
+        """Trace items started at a fixed rate, latency counted from the scheduled start"""
+        records = []
+        local = threading.local()
+
+        def send(scheduled, item):
+            if not hasattr(local, 'session'):
+                local.session = self.requests.Session()
+            calls = self.execute(local.session, item)
+            records.append((time.perf_counter() - scheduled, calls))
+
+        n_items = int(rps * seconds)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            for i in range(n_items):
+                scheduled = started + i / rps
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(send, scheduled, self._next_item())
+        return records, time.perf_counter() - started
+
+
+def latency_summary(seconds):
+    if not seconds:
+        return None
+    p50, p90, p99 = np.percentile(np.array(seconds) * 1000, [50, 90, 99])
+    return {'p50': float(p50), 'p90': float(p90), 'p99': float(p99), 'max': float(max(seconds) * 1000)}
+
+
+def summarize_step(level, records, elapsed):
+    """Throughput, error rate and latency percentiles of one load level"""
+    by_endpoint = {}
+    errors = calls = 0
+    for _, item_calls in records:
+        for endpoint, seconds, ok in item_calls:
+            by_endpoint.setdefault(endpoint, []).append(seconds)
+            calls += 1
+            errors += not ok
+    return {
+        'level': level,
+        'elapsed_seconds': elapsed,
+        'items': len(records),
+        'throughput_items_per_second': len(records) / elapsed if elapsed else 0.0,
+        'requests': calls,
+        'throughput_requests_per_second': calls / elapsed if elapsed else 0.0,
+        'error_rate': errors / calls if calls else 0.0,
+        'item_latency_ms': latency_summary([seconds for seconds, _ in records]),
+        'endpoints': {endpoint: latency_summary(values) for endpoint, values in sorted(by_endpoint.items())}
+    }
+
+
+def find_saturation(steps, open_loop, max_error_rate=0.01):
+    """Highest good throughput, and the first level where more load stops paying off
+
+    Open loop: the server falls behind the offered rate by more than 5%.
+    Closed loop: throughput grows by less than 5% over the previous level.
+    """
+    good = [step for step in steps if step['error_rate'] <= max_error_rate]
+    saturated_at = None
+    for previous, step in zip([None] + steps[:-1], steps):
+        throughput = step['throughput_items_per_second']
+        if step['error_rate'] > max_error_rate:
+            saturated_at = step['level']
+        elif open_loop and throughput < 0.95 * step['level']:
+            saturated_at = step['level']
+        elif not open_loop and previous is not None and throughput < 1.05 * previous['throughput_items_per_second']:
+            saturated_at = step['level']
+        if saturated_at is not None:
+            break
+    return {
+        'max_throughput_items_per_second': max((step['throughput_items_per_second'] for step in good), default=0.0),
+        'saturated_at_level': saturated_at
+    }
+
+
+def svg_chart(title, x_label, x_values, series, width=640, height=320):
+    """Line chart as inline SVG; `series` maps a name to one y value per x (None skipped)"""
+    colors = ['#1f77b4', '#ff7f0e', '#d62728', '#2ca02c']
+    left, right, top, bottom = 60, 20, 30, 45
+    y_max = max((y for values in series.values() for y in values if y is not None), default=1.0) or 1.0
+    x_min, x_max = min(x_values), max(x_values)
+    x_span = (x_max - x_min) or 1
+
+    def point(x, y):
+        return (left + (x - x_min) / x_span * (width - left - right),
+                height - bottom - y / y_max * (height - top - bottom))
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">',
+        f'<text x="{width / 2}" y="18" text-anchor="middle" font-weight="bold">{title}</text>',
+        f'<line x1="{left}" y1="{height - bottom}" x2="{width - right}" y2="{height - bottom}" stroke="#333"/>',
+        f'<line x1="{left}" y1="{top}" x2="{left}" y2="{height - bottom}" stroke="#333"/>',
+        f'<text x="{width / 2}" y="{height - 8}" text-anchor="middle">{x_label}</text>',
+        f'<text x="{left - 6}" y="{top + 4}" text-anchor="end" font-size="11">{y_max:.4g}</text>',
+        f'<text x="{left - 6}" y="{height - bottom}" text-anchor="end" font-size="11">0</text>'
+    ]
+    for x in x_values:
+        px, _ = point(x, 0)
+        parts.append(f'<text x="{px}" y="{height - bottom + 16}" text-anchor="middle" font-size="11">{x:g}</text>')
+    for (name, values), color in zip(series.items(), colors):
+        points = [point(x, y) for x, y in zip(x_values, values) if y is not None]
+        parts.append(
+            f'<polyline fill="none" stroke="{color}" stroke-width="2" points="'
+            + ' '.join(f'{px:.1f},{py:.1f}' for px, py in points) + '"/>'
+        )
+        parts.extend(f'<circle cx="{px:.1f}" cy="{py:.1f}" r="3" fill="{color}"/>' for px, py in points)
+    for i, (name, color) in enumerate(zip(series, colors)):
+        parts.append(f'<text x="{width - right - 4}" y="{top + 14 * (i + 1)}" text-anchor="end" '
+                     f'font-size="12" fill="{color}">{name}</text>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def render_html(report):
+    steps = report['steps']
+    levels = [step['level'] for step in steps]
+    x_label = 'offered load (items/s)' if report['open_loop'] else 'concurrent clients'
+    latency = {
+        name: [step['item_latency_ms'][name] if step['item_latency_ms'] else None for step in steps]
+        for name in ('p50', 'p90', 'p99')
+    }
+    rows = '\n'.join(
+        f"<tr><td>{step['level']:g}</td><td>{step['throughput_items_per_second']:.1f}</td>"
+        f"<td>{step['throughput_requests_per_second']:.1f}</td><td>{step['error_rate']:.2%}</td>"
+        + ''.join(
+            f"<td>{step['item_latency_ms'][name]:.1f}</td>" if step['item_latency_ms'] else '<td>-</td>'
+            for name in ('p50', 'p90', 'p99', 'max')
+        ) + '</tr>'
+        for step in steps
+    )
+    saturation = report['saturation']
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Load test {report['created_at']}</title>
+<style>body {{ font-family: sans-serif; margin: 2em; }} table {{ border-collapse: collapse; }}
+td, th {{ border: 1px solid #ccc; padding: 4px 10px; text-align: right; }}</style></head>
+<body>
+<h1>Load test</h1>
+<p>{report['url']} &middot; mode {report['mode']} &middot; trace {report['trace']} &middot; {report['created_at']}</p>
+<p>Max throughput without errors: <b>{saturation['max_throughput_items_per_second']:.1f} items/s</b>;
+saturated at level: <b>{saturation['saturated_at_level']}</b></p>
+{svg_chart('Throughput', x_label, levels, {
+    'items/s': [step['throughput_items_per_second'] for step in steps],
+    'requests/s': [step['throughput_requests_per_second'] for step in steps]
+})}
+{svg_chart('Item latency (ms)', x_label, levels, latency)}
+<table><tr><th>level</th><th>items/s</th><th>requests/s</th><th>errors</th>
+<th>p50 ms</th><th>p90 ms</th><th>p99 ms</th><th>max ms</th></tr>
+{rows}
+</table>
+</body></html>
+"""
+
+
+def run_load_test(runner, levels, seconds, open_loop, trace_path):
+    steps = []
+    for level in levels:
+        if open_loop:
+            records, elapsed = runner.run_open(level, seconds)
+        else:
+            records, elapsed = runner.run_closed(int(level), seconds)
+        step = summarize_step(level, records, elapsed)
+        steps.append(step)
+        latency = step['item_latency_ms'] or {}
+        print(f"level {level:>7g}: {step['throughput_items_per_second']:>8.1f} items/s "
+              f"p50 {latency.get('p50', 0):>8.1f} ms p99 {latency.get('p99', 0):>8.1f} ms "
+              f"errors {step['error_rate']:.2%}")
+    return {
+        'url': runner.url,
+        'mode': runner.mode,
+        'trace': trace_path,
+        'open_loop': open_loop,
+        'step_seconds': seconds,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'steps': steps,
+        'saturation': find_saturation(steps, open_loop)
+    }
+
+
+def serve_stub(port, latency_ms, per_text_ms, cache):
+    """Run the Flask app with stub models in place of the real ones"""
+    import app as backend
+    from model_registry import ModelVersion
+
+    class_names = backend.analyzer.label_schema.model_labels
+    backend.analyzer.serving = ModelVersion(
+        'stub',
+        StubModel(class_names, latency_ms, per_text_ms),
+        StubModel(class_names, latency_ms, per_text_ms)
+    )
+    if not cache:
+        backend.analyzer.results_cache.max_entries = 0
+    # All load comes from one client, so per-client rate limits would cap it
+    backend.analyzer.scheduler.rates = {priority: (1e9, 1e9) for priority in backend.analyzer.scheduler.rates}
+    backend.app.run(host='0.0.0.0', port=port, threaded=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replayable load tests for the backend')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    trace_parser = commands.add_parser('trace', help='Build a trace from the dataset')
+    trace_parser.add_argument('--output', default='trace.jsonl')
+    trace_parser.add_argument('--requests', type=int, default=2000)
+    trace_parser.add_argument('--mix', default=','.join(f'{kind}={share}' for kind, share in DEFAULT_MIX.items()),
+                              help='Share of each request kind, e.g. analyze=0.8,batch=0.2')
+    trace_parser.add_argument('--batch-size', type=int, default=32)
+    trace_parser.add_argument('--session-appends', type=int, default=8)
+    trace_parser.add_argument('--seed', type=int, default=0)
+
+    serve_parser = commands.add_parser('serve', help='Run the backend with stub models')
+    serve_parser.add_argument('--port', type=int, default=5001)
+    serve_parser.add_argument('--latency-ms', type=float, default=5.0, help='Stub cost per model call')
+    serve_parser.add_argument('--per-text-ms', type=float, default=0.0, help='Stub cost per text')
+    serve_parser.add_argument('--cache', action='store_true', help='Keep the result cache on')
+
+    run_parser = commands.add_parser('run', help='Replay a trace at increasing load')
+    run_parser.add_argument('--url', default='http://localhost:5001')
+    run_parser.add_argument('--trace', default='trace.jsonl')
+    run_parser.add_argument('--mode', default='model')
+    levels = run_parser.add_mutually_exclusive_group()
+    levels.add_argument('--concurrency', type=int, nargs='+', help='Closed-loop client counts')
+    levels.add_argument('--rps', type=float, nargs='+', help='Open-loop arrival rates (trace items per second)')
+    run_parser.add_argument('--step-seconds', type=float, default=15)
+    run_parser.add_argument('--output-dir', default='reports')
+    args = parser.parse_args()
+
+    if args.command == 'trace':
+        mix = {kind: float(share) for kind, share in (part.split('=') for part in args.mix.split(','))}
+        trace = build_trace(args.requests, mix, args.batch_size, args.session_appends, args.seed)
+        save_trace(trace, args.output)
+        print(f"Trace of {len(trace)} requests saved to {args.output}")
+    elif args.command == 'serve':
+        serve_stub(args.port, args.latency_ms, args.per_text_ms, args.cache)
+    else:
+        runner = LoadRunner(args.url, load_trace(args.trace), args.mode)
+        open_loop = args.rps is not None
+        report = run_load_test(
+            runner, args.rps if open_loop else (args.concurrency or [1, 2, 4, 8, 16, 32]),
+            args.step_seconds, open_loop, args.trace
+        )
+
+        os.makedirs(args.output_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        json_path = os.path.join(args.output_dir, f'loadtest_{stamp}.json')
+        html_path = os.path.join(args.output_dir, f'loadtest_{stamp}.html')
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(render_html(report))
+        print(f"Saturation: {report['saturation']}")
+        print(f"Reports saved to {json_path} and {html_path}")
@@ -0,0 +1,39 @@
+# metrics.py
+import threading
+import time
+from collections import defaultdict
+
+
+class ServingMetrics:
+    """Thread-safe counters exposed on /metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.started_at = time.time()
+        # Derived values reported as numerator / denominator
+        self.ratios = {
+            'cascade_escalation_rate': ('cascade_escalated', 'cascade_texts'),
+            'dedup_saved_rate': ('dedup_saved', 'dedup_texts'),
+            'cache_hit_rate': ('cache_hits', 'cache_lookups'),
+            'store_hit_rate': ('store_hits', 'store_lookups')
+        }
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+
+        ratios = {}
+        for name, (numerator, denominator) in self.ratios.items():
+            total = counters.get(denominator, 0)
+            ratios[name] = counters.get(numerator, 0) / total if total else None
+
+        return {
+            'uptime_seconds': time.time() - self.started_at,
+            'counters': counters,
+            'ratios': ratios
+        }
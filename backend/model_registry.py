@@ -0,0 +1,186 @@
+# model_registry.py
+"""Versioned model artifacts and the set of models served under one version
+
+A registry is a directory with one subdirectory per version:
+
+    models/
+        2024-06-01/
+            bilstm_weights.npz
+            fast_model.pkl        (optional)
+        2024-07-15/
+            bilstm_weights.npz
+
+Version names sort in deployment order, so the latest version is the last
+one. `publish` copies artifacts into a temporary directory and renames it
+into place, so a half-written version is never visible to a running server.
+
+    python model_registry.py list
+    python model_registry.py publish 2024-07-15 --weights bilstm_weights.npz --fast-model fast_model.pkl
+"""
+import hashlib
+import os
+import shutil
+import uuid
+from numpy_bilstm import NumpyBiLSTM
+
+REGISTRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+WEIGHTS_FILE = 'bilstm_weights.npz'
+FAST_MODEL_FILE = 'fast_model.pkl'
+DEFAULT_MAX_LENGTH = 66
+
+
+def file_digest(path):
+    """Content hash of an artifact file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+class ModelVersion:
+    """Models served together under one version name
+
+    Never changed after it is built: loading a new version builds a new
+    instance and swaps one reference, so a request that picked up the old
+    instance finishes on it.
+    """
+
+    def __init__(self, version, model=None, fast_model=None, is_mock_model=False, digests=None):
+        self.version = version
+        self.model = model
+        self.fast_model = fast_model
+        self.is_mock_model = is_mock_model
+        # Content hash per loaded artifact ('model', 'fast_model')
+        self.digests = dict(digests or {})
+        # Only the exported NumPy weights (or a stand-in with the same
+        # interface) carry the label order; Keras models don't
+        self.model_class_names = getattr(model, 'class_names', None)
+        self.max_length = getattr(model, 'max_length', DEFAULT_MAX_LENGTH)
+
+    @property
+    def fingerprint(self):
+        """Identity of the loaded artifacts, None when any model wasn't loaded from a file"""
+        if not self.digests or (self.model is not None and 'model' not in self.digests) or (
+                self.fast_model is not None and 'fast_model' not in self.digests):
+            return None
+        return hashlib.sha256(repr(sorted(self.digests.items())).encode()).hexdigest()[:16]
+
+    def has_numpy_model(self):
+        return self.model is not None and not self.is_mock_model and self.model_class_names is not None
+
+    def supports(self, mode):
+        """Whether this version has the models a prediction mode needs"""
+        if mode == 'fast':
+            return self.fast_model is not None
+        if mode == 'cascade':
+            return self.fast_model is not None and self.has_numpy_model()
+        if mode == 'model':
+            return self.has_numpy_model()
+        return True
+
+    def replace(self, **changes):
+        """Copy with some of version, model, fast_model, is_mock_model and digests changed"""
+        fields = {
+            'version': self.version,
+            'model': self.model,
+            'fast_model': self.fast_model,
+            'is_mock_model': self.is_mock_model,
+            'digests': self.digests
+        }
+        fields.update(changes)
+        return ModelVersion(**fields)
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'model_loaded': self.model is not None,
+            'fast_model_loaded': self.fast_model is not None,
+            'fingerprint': self.fingerprint
+        }
+
+
+class ModelRegistry:
+    """Directory of versioned model artifacts"""
+
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+
+    def versions(self):
+        """Published versions, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if not name.startswith('.') and any(
+                os.path.exists(os.path.join(self.root, name, filename))
+                for filename in (WEIGHTS_FILE, FAST_MODEL_FILE)
+            )
+        )
+
+    def latest(self):
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def load(self, version):
+        """Build a ModelVersion from the artifacts of one version"""
+        if version not in self.versions():
+            raise ValueError(f"Unknown model version '{version}'")
+        directory = os.path.join(self.root, version)
+
+        model = fast_model = None
+        digests = {}
+        weights_path = os.path.join(directory, WEIGHTS_FILE)
+        if os.path.exists(weights_path):
+            model = NumpyBiLSTM(weights_path)
+            digests['model'] = file_digest(weights_path)
+        fast_model_path = os.path.join(directory, FAST_MODEL_FILE)
+        if os.path.exists(fast_model_path):
+            from fast_model import FastEmotionModel
+            fast_model = FastEmotionModel.load(fast_model_path)
+            digests['fast_model'] = file_digest(fast_model_path)
+        return ModelVersion(version, model, fast_model, digests=digests)
+
+    def publish(self, version, weights_path=None, fast_model_path=None):
+        """Copy artifacts into the registry as a new version"""
+        if not weights_path and not fast_model_path:
+            raise ValueError('Nothing to publish')
+        if os.sep in version or version.startswith('.'):
+            raise ValueError(f"Invalid version name '{version}'")
+        target = os.path.join(self.root, version)
+        if os.path.exists(target):
+            raise ValueError(f"Model version '{version}' already exists")
+
+        staging = os.path.join(self.root, f'.{version}.{uuid.uuid4().hex}')
+        os.makedirs(staging)
+        try:
+            if weights_path:
+                shutil.copyfile(weights_path, os.path.join(staging, WEIGHTS_FILE))
+            if fast_model_path:
+                shutil.copyfile(fast_model_path, os.path.join(staging, FAST_MODEL_FILE))
+            os.rename(staging, target)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return target
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Manage the versioned model registry')
+    parser.add_argument('--registry', default=REGISTRY_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='List published versions')
+    publish = commands.add_parser('publish', help='Publish artifacts as a new version')
+    publish.add_argument('version')
+    publish.add_argument('--weights', help='Exported BiLSTM weights (.npz)')
+    publish.add_argument('--fast-model', help='Fast model pickle')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    if args.command == 'list':
+        for version in registry.versions():
+            print(version)
+    else:
+        print(f"Published {registry.publish(args.version, args.weights, args.fast_model)}")
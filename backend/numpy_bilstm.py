@@ -0,0 +1,304 @@
+# numpy_bilstm.py
+import numpy as np
+from subwords import SubwordTable
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class NumpyBiLSTM:
+    """Pure-NumPy forward pass of the Embedding -> BiLSTM -> Dense model
+
+    Loads the weights exported from the training notebook (see the
+    "Export weights" cell) so the backend can serve the model without
+    importing TensorFlow.
+
+    Inputs are prepared like the notebook's `pad_sequences` call: texts
+    longer than `max_length` keep their last words, and shorter ones are
+    post-padded with 0. A model trained without `mask_zero` ran both LSTM
+    directions over that padding, so it is padded to `max_length` and every
+    step runs. Only a model exported with masking skips the padding, and
+    its batches are only as wide as their longest text.
+    """
+
+    def __init__(self, weights_path, mask_padding=None):
+        weights = np.load(weights_path, allow_pickle=False)
+
+        self.embedding = weights['embedding'].astype(np.float32)
+        self.class_names = [str(name) for name in weights['class_names']]
+        self.max_length = int(weights['max_length'])
+        if mask_padding is None:
+            # Exports from before the flag was recorded come from the notebook model, which has no masking
+            mask_padding = bool(weights['mask_padding']) if 'mask_padding' in weights.files else False
+        self.mask_padding = mask_padding
+
+        vocab = [str(word) for word in weights['vocab']]
+        # Index 0 is reserved for padding, words start at 1 like the notebook
+        self.word_to_index = {word: i + 1 for i, word in enumerate(vocab)}
+
+        # The embedding is frozen, so the input projection of every word can be
+        # computed once here and turned into a row gather at inference time
+        self.forward_proj = self.embedding @ weights['forward_kernel'].astype(np.float32)
+        self.forward_proj += weights['forward_bias'].astype(np.float32)
+        self.forward_recurrent = weights['forward_recurrent_kernel'].astype(np.float32)
+
+        self.backward_proj = self.embedding @ weights['backward_kernel'].astype(np.float32)
+        self.backward_proj += weights['backward_bias'].astype(np.float32)
+        self.backward_recurrent = weights['backward_recurrent_kernel'].astype(np.float32)
+
+        self.dense_kernel = weights['dense_kernel'].astype(np.float32)
+        self.dense_bias = weights['dense_bias'].astype(np.float32)
+
+        self.units = self.forward_recurrent.shape[0]
+
+        # Optional hashed n-gram buckets for unknown words (see subwords.py). The
+        # input projection is linear, so projecting the buckets once and averaging
+        # the projected rows gives the projection of the averaged embedding
+        self.subwords = None
+        if 'oov_embeddings' in weights.files:
+            self.subwords = SubwordTable(weights['oov_embeddings'], weights['oov_ngram_range'])
+            self.forward_oov = (
+                self.subwords.embeddings @ weights['forward_kernel'].astype(np.float32),
+                weights['forward_bias'].astype(np.float32)
+            )
+            self.backward_oov = (
+                self.subwords.embeddings @ weights['backward_kernel'].astype(np.float32),
+                weights['backward_bias'].astype(np.float32)
+            )
+
+    def tokens(self, text, unknown=None):
+        """(word, index) of each word of one cleaned text that reaches the model
+
+        Unknown words are dropped, unless the model has subword buckets and an
+        `unknown` dict is passed: then each distinct unknown word is added to
+        it with its position and written as -position, to be looked up with
+        the same dict.
+        """
+        if unknown is None or self.subwords is None:
+            return [(word, self.word_to_index[word]) for word in text.split() if word in self.word_to_index]
+        pairs = []
+        for word in text.split():
+            index = self.word_to_index.get(word)
+            if index is None:
+                index = -unknown.setdefault(word, len(unknown) + 1)
+            pairs.append((word, index))
+        return pairs
+
+    def token_ids(self, text, unknown=None):
+        """Word indices of one cleaned text (see `tokens`)"""
+        return [index for _, index in self.tokens(text, unknown)]
+
+    def encode(self, texts, unknown=None):
+        """Map cleaned texts to a post-padded matrix of word indices"""
+        sequences = [self.token_ids(text, unknown)[-self.max_length:] for text in texts]
+        longest = max((len(seq) for seq in sequences), default=0)
+        # With masking the trailing padding is skipped entirely, so the batch
+        # only needs to be as wide as its longest sequence
+        width = max(longest, 1) if self.mask_padding else self.max_length
+
+        padded = np.zeros((len(sequences), width), dtype=np.int32)
+        for row, seq in enumerate(sequences):
+            padded[row, :len(seq)] = seq
+        return padded
+
+    def _gather(self, table, indices, unknown, oov=None):
+        """Rows of `table` for an index matrix, unknown words from their subword buckets
+
+        `oov` is (bucket table, bias) when `table` is an input projection.
+        """
+        rows = table[np.maximum(indices, 0)]
+        if unknown:
+            bucket_table, bias = oov if oov is not None else (self.subwords.embeddings, 0)
+            unknown_rows = self.subwords.mean_rows(list(unknown), bucket_table) + bias
+            positions = indices < 0
+            rows[positions] = unknown_rows[-indices[positions] - 1]
+        return rows
+
+    def _run_direction(self, x_proj, recurrent, mask, reverse, state=None):
+        batch_size, steps = x_proj.shape[:2]
+        u = self.units
+        if state is None:
+            h = np.zeros((batch_size, u), dtype=np.float32)
+            c = np.zeros((batch_size, u), dtype=np.float32)
+        else:
+            h, c = state
+
+        # Keras gate layout: input, forget, cell, output
+        order = range(steps - 1, -1, -1) if reverse else range(steps)
+        for t in order:
+            z = x_proj[:, t] + h @ recurrent
+            i = _sigmoid(z[:, :u])
+            f = _sigmoid(z[:, u:2 * u])
+            g = np.tanh(z[:, 2 * u:3 * u])
+            o = _sigmoid(z[:, 3 * u:])
+            c_new = f * c + i * g
+            h_new = o * np.tanh(c_new)
+            if mask is None:
+                h, c = h_new, c_new
+            else:
+                step_mask = mask[:, t:t + 1]
+                h = np.where(step_mask, h_new, h)
+                c = np.where(step_mask, c_new, c)
+        return h, c
+
+    def predict(self, padded, unknown=None):
+        """Return class probabilities for a padded index matrix, like keras.Model.predict
+
+        `unknown` is the dict filled by `encode` for negative indices.
+        """
+        indices = np.asarray(padded, dtype=np.int32)
+        if indices.ndim == 1:
+            indices = indices[None, :]
+        mask = indices != 0 if self.mask_padding else None
+
+        forward_h, _ = self._run_direction(
+            self._gather(self.forward_proj, indices, unknown, self.forward_oov if unknown else None),
+            self.forward_recurrent, mask, reverse=False
+        )
+        backward_h, _ = self._run_direction(
+            self._gather(self.backward_proj, indices, unknown, self.backward_oov if unknown else None),
+            self.backward_recurrent, mask, reverse=True
+        )
+        return self._classify(forward_h, backward_h)
+
+    def predict_continuation(self, indices, state=None, unknown=None):
+        """Score one appended segment of a longer stream
+
+        The forward LSTM resumes from `state` (the forward state after the
+        previous segments), so it sees the earlier text without re-reading it.
+        The backward direction only covers the new segment. Returns the class
+        probabilities and the forward state to pass in with the next segment.
+        """
+        indices = np.asarray(indices, dtype=np.int32)[None, :]
+        forward_state = self._run_direction(
+            self._gather(self.forward_proj, indices, unknown, self.forward_oov if unknown else None),
+            self.forward_recurrent, None, reverse=False, state=state
+        )
+        backward_h, _ = self._run_direction(
+            self._gather(self.backward_proj, indices, unknown, self.backward_oov if unknown else None),
+            self.backward_recurrent, None, reverse=True
+        )
+        return self._classify(forward_state[0], backward_h)[0], forward_state
+
+    def _classify(self, forward_h, backward_h):
+        logits = np.concatenate([forward_h, backward_h], axis=1) @ self.dense_kernel + self.dense_bias
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def sentence_vectors(self, texts):
+        """Unit-length mean of the word embeddings of each cleaned text
+
+        Rows of texts without a known word are all zero; unknown words count
+        with their subword embedding when the model has buckets.
+        """
+        unknown = {}
+        indices = self.encode(texts, unknown)
+        counts = (indices != 0).sum(axis=1, keepdims=True)
+        # Row 0 of the embedding is the padding vector and is all zeros
+        sums = self._gather(self.embedding, indices, unknown).sum(axis=1)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        return np.where(counts > 0, sums / np.maximum(norms, 1e-12), 0).astype(np.float32)
+
+    def occlusion(self, texts, batch_size=256):
+        """Probabilities of each cleaned text and of the text with each word left out
+
+        Returns one (words, probabilities) pair per text: row 0 scores the
+        whole text and row k + 1 the text without words[k]. All variants go
+        into one matrix padded like `encode`; a left-out word is removed and
+        the words after it move up, so the model sees exactly the shorter
+        text. The matrix is scored `batch_size` rows at a time to bound
+        memory.
+        """
+        unknown = {}
+        sequences = [self.tokens(text, unknown)[-self.max_length:] for text in texts]
+        longest = max((len(seq) for seq in sequences), default=0)
+        width = max(longest, 1) if self.mask_padding else self.max_length
+
+        padded = np.zeros((sum(len(seq) + 1 for seq in sequences), width), dtype=np.int32)
+        row = 0
+        for seq in sequences:
+            n = len(seq)
+            ids = np.array([index for _, index in seq], dtype=np.int32)
+            padded[row, :n] = ids
+            if n:
+                # Row k of the tiled ids without its diagonal is the text without word k
+                padded[row + 1:row + n + 1, :n - 1] = np.tile(ids, (n, 1))[~np.eye(n, dtype=bool)].reshape(n, n - 1)
+            row += n + 1
+
+        probabilities = np.concatenate(
+            [self.predict(padded[start:start + batch_size], unknown) for start in range(0, len(padded), batch_size)]
+        ) if len(padded) else np.zeros((0, len(self.class_names)), dtype=np.float32)
+
+        explained, row = [], 0
+        for seq in sequences:
+            explained.append(([word for word, _ in seq], probabilities[row:row + len(seq) + 1]))
+            row += len(seq) + 1
+        return explained
+
+    def predict_texts(self, texts):
+        """Encode and score a batch of cleaned texts"""
+        if not texts:
+            return np.zeros((0, len(self.class_names)), dtype=np.float32)
+        unknown = {}
+        return self.predict(self.encode(texts, unknown), unknown)
+
+
+def export_keras_model(model, word_to_index, class_names, max_length, output_path):
+    """Export a trained Keras BiLSTM so NumpyBiLSTM can load it
+
+    Needs TensorFlow only at export time. Whether the embedding masks
+    padding is recorded, so the NumPy engine runs the same steps as Keras.
+    """
+    embedding_layer, bilstm_layer = model.layers[0], model.layers[1]
+    dense_layer = model.layers[-1]
+
+    (forward_kernel, forward_recurrent_kernel, forward_bias,
+     backward_kernel, backward_recurrent_kernel, backward_bias) = bilstm_layer.get_weights()
+    dense_kernel, dense_bias = dense_layer.get_weights()
+
+    vocab = sorted(word_to_index, key=word_to_index.get)
+
+    np.savez_compressed(
+        output_path,
+        embedding=embedding_layer.get_weights()[0],
+        vocab=np.array(vocab),
+        class_names=np.array(list(class_names)),
+        max_length=np.array(max_length),
+        mask_padding=np.array(bool(getattr(embedding_layer, 'mask_zero', False))),
+        forward_kernel=forward_kernel,
+        forward_recurrent_kernel=forward_recurrent_kernel,
+        forward_bias=forward_bias,
+        backward_kernel=backward_kernel,
+        backward_recurrent_kernel=backward_recurrent_kernel,
+        backward_bias=backward_bias,
+        dense_kernel=dense_kernel,
+        dense_bias=dense_bias,
+    )
+
+
+if __name__ == '__main__':
+    import argparse
+    import pickle
+
+    parser = argparse.ArgumentParser(description='Export a trained Keras BiLSTM to NumPy weights')
+    parser.add_argument('model', help='Keras model (.h5 or .pkl from the notebook)')
+    parser.add_argument('vocab', help='Pickled word_to_index dict')
+    parser.add_argument('--classes', required=True, help='Comma-separated label encoder classes')
+    parser.add_argument('--max-length', type=int, default=66)
+    parser.add_argument('--output', default='bilstm_weights.npz')
+    args = parser.parse_args()
+
+    if args.model.endswith('.pkl'):
+        with open(args.model, 'rb') as f:
+            keras_model = pickle.load(f)
+    else:
+        from tensorflow.keras.models import load_model
+        keras_model = load_model(args.model)
+
+    with open(args.vocab, 'rb') as f:
+        vocab_index = pickle.load(f)
+
+    export_keras_model(keras_model, vocab_index, args.classes.split(','), args.max_length, args.output)
+    print(f"Weights exported to {args.output}")
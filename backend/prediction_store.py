@@ -0,0 +1,178 @@
+# prediction_store.py
+"""Prediction results on disk, shared by every backend process and kept across restarts
+
+Rows are keyed by the model they came from (a fingerprint of its
+artifacts, so retrained weights never reuse old results) and a 16-byte
+hash of mode, threshold and text. SQLite in WAL mode lets several server
+workers and bulk-scoring processes read and write the same file.
+
+Reads are one `IN (...)` query per 500 keys on the caller's thread.
+Writes and hit counts are queued and written by a background thread in one
+transaction per `flush_interval`, so a request never waits for the disk to
+sync. When the table grows past `max_entries`, the least recently used
+rows are deleted down to 90% of it, and the freed pages are handed back to
+the file system. The most-hit rows of a model can be read back with `hot`
+to fill the in-memory cache before a version takes traffic.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'predictions.sqlite')
+QUERY_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    model TEXT NOT NULL,
+    key BLOB NOT NULL,
+    result TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (model, key)
+);
+CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions (last_used);
+"""
+
+
+def prediction_key(mode, threshold, text):
+    """Hash of everything besides the model that a result depends on"""
+    data = f'{mode}\x00{threshold}\x00{text}'.encode('utf-8', 'surrogatepass')
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class PredictionStore:
+    """SQLite key-value store of results with bulk reads and queued writes"""
+
+    def __init__(self, path=STORE_PATH, max_entries=1000000, flush_interval=1.0, max_pending=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = []
+        self.touched = []
+        self.dropped = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._writer = None
+        # Other processes write too, so the count is only an estimate between compactions
+        self.rows = self.connection().execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+
+    def connection(self):
+        """This thread's connection"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            # Must come before the table exists to take effect
+            connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def get_many(self, model, keys):
+        """Stored result per key, None where there is none"""
+        found = {}
+        connection = self.connection()
+        for start in range(0, len(keys), QUERY_CHUNK):
+            chunk = keys[start:start + QUERY_CHUNK]
+            found.update(connection.execute(
+                f"SELECT key, result FROM predictions WHERE model = ? AND key IN ({','.join('?' * len(chunk))})",
+                [model] + chunk
+            ))
+        if found:
+            with self._lock:
+                self.touched.extend((model, key) for key in found)
+        return [json.loads(found[key]) if key in found else None for key in keys]
+
+    def put_many(self, model, keys, results):
+        """Queue results for the writer; dropped when too many writes are pending"""
+        rows = [(model, key, json.dumps(result)) for key, result in zip(keys, results)]
+        with self._lock:
+            if len(self.pending) + len(rows) > self.max_pending:
+                self.dropped += len(rows)
+                return False
+            self.pending.extend(rows)
+        self._start()
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, daemon=True)
+                self._writer.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error writing predictions: {e}")
+
+    def flush(self):
+        """Write queued results and hit counts now, then compact if needed"""
+        with self._write_lock:
+            with self._lock:
+                pending, self.pending = self.pending, []
+                touched, self.touched = self.touched, []
+            if not pending and not touched:
+                return
+            now = time.time()
+            connection = self.connection()
+            with connection:
+                connection.executemany(
+                    'INSERT INTO predictions (model, key, result, hits, last_used) VALUES (?, ?, ?, 0, ?) '
+                    'ON CONFLICT (model, key) DO UPDATE SET result = excluded.result, last_used = excluded.last_used',
+                    [row + (now,) for row in pending]
+                )
+                connection.executemany(
+                    'UPDATE predictions SET hits = hits + 1, last_used = ? WHERE model = ? AND key = ?',
+                    [(now, model, key) for model, key in touched]
+                )
+            self.rows += len(pending)
+            if self.rows > self.max_entries:
+                self.compact()
+
+    def compact(self):
+        """Delete least recently used rows down to 90% of `max_entries`"""
+        connection = self.connection()
+        self.rows = connection.execute('SELECT COUNT(*) FROM predictions').fetchone()[0]
+        excess = self.rows - int(self.max_entries * 0.9)
+        if self.rows <= self.max_entries or excess <= 0:
+            return 0
+        with connection:
+            connection.execute(
+                'DELETE FROM predictions WHERE rowid IN (SELECT rowid FROM predictions ORDER BY last_used LIMIT ?)',
+                (excess,)
+            )
+        connection.execute('PRAGMA incremental_vacuum')
+        self.rows -= excess
+        return excess
+
+    def hot(self, model, limit):
+        """(key, result) of a model's most-hit rows, for warming an in-memory cache"""
+        return [
+            (key, json.loads(result)) for key, result in self.connection().execute(
+                'SELECT key, result FROM predictions WHERE model = ? ORDER BY hits DESC, last_used DESC LIMIT ?',
+                (model, limit)
+            )
+        ]
+
+    def stats(self):
+        with self._lock:
+            pending = len(self.pending)
+        return {
+            'path': self.path,
+            'rows': self.rows,
+            'max_entries': self.max_entries,
+            'pending_writes': pending,
+            'dropped_writes': self.dropped,
+            'file_bytes': sum(
+                os.path.getsize(path) for path in (self.path, self.path + '-wal') if os.path.exists(path)
+            )
+        }
@@ -0,0 +1,188 @@
+# profiler.py
+"""Sampling profiler for a live backend process
+
+A background thread wakes every `interval` seconds, reads the current frame
+of each thread that is serving a request (`sys._current_frames`) and counts
+the stack. Nothing is hooked into the profiled code, so the cost is one
+stack walk per request thread per sample, independent of how much Python
+runs in between. The time spent sampling is measured and reported as
+`overhead_ratio`.
+
+Allocation statistics come from `tracemalloc`, which slows every
+allocation while it runs, so they are opt-in and limited to one frame per
+traceback.
+
+Results are a flame-graph compatible collapsed-stack file (one
+`root;...;leaf count` line per distinct stack, readable by flamegraph.pl and
+speedscope) and a top-N summary of self and inclusive time per function.
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+MAX_SECONDS = 120
+MIN_INTERVAL = 0.001
+MAX_DEPTH = 128
+
+
+def frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """One profiling run at a time, stopped by a time limit or a request count"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active_threads = set()
+        self.running = False
+        self.status = {'state': 'idle'}
+        self.result = None
+        self._stop = threading.Event()
+
+    def start(self, seconds=10, requests=None, interval=0.01, allocations=False, top=20):
+        """Start a run in the background; False if one is already running"""
+        if isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or not 0 < seconds <= MAX_SECONDS:
+            raise ValueError(f'Seconds must be a number between 0 and {MAX_SECONDS}')
+        if requests is not None and (isinstance(requests, bool) or not isinstance(requests, int) or requests < 1):
+            raise ValueError('Requests must be a positive integer')
+        if isinstance(interval, bool) or not isinstance(interval, (int, float)) or not MIN_INTERVAL <= interval <= 1:
+            raise ValueError(f'Interval must be between {MIN_INTERVAL} and 1 second')
+        if isinstance(top, bool) or not isinstance(top, int) or top < 1:
+            raise ValueError('Top must be a positive integer')
+
+        with self._lock:
+            if self.running:
+                return False
+            self.running = True
+            self.requests_seen = 0
+            self.request_limit = requests
+            self._stop.clear()
+            self.status = {
+                'state': 'running',
+                'started': time.time(),
+                'seconds': seconds,
+                'requests': requests,
+                'interval': interval,
+                'allocations': allocations
+            }
+
+        threading.Thread(
+            target=self._run, args=(seconds, interval, allocations, top), daemon=True
+        ).start()
+        return True
+
+    def request_started(self):
+        if self.running:
+            with self._lock:
+                self.active_threads.add(threading.get_ident())
+
+    def request_finished(self):
+        if not self.running:
+            return
+        with self._lock:
+            # Requests that began before the run (such as the one starting it) don't count
+            if threading.get_ident() not in self.active_threads:
+                return
+            self.active_threads.discard(threading.get_ident())
+            self.requests_seen += 1
+            if self.request_limit is not None and self.requests_seen >= self.request_limit:
+                self._stop.set()
+
+    def _run(self, seconds, interval, allocations, top):
+        stacks = {}
+        samples = 0
+        sampling_time = 0.0
+        if allocations:
+            tracemalloc.start(1)
+        started = time.perf_counter()
+        deadline = started + seconds
+        own_thread = threading.get_ident()
+        try:
+            while not self._stop.wait(interval) and time.perf_counter() < deadline:
+                sample_started = time.perf_counter()
+                with self._lock:
+                    threads = self.active_threads - {own_thread}
+                frames = sys._current_frames()
+                for ident in threads:
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = []
+                    while frame is not None and len(stack) < MAX_DEPTH:
+                        stack.append(frame.f_code)
+                        frame = frame.f_back
+                    key = tuple(reversed(stack))
+                    stacks[key] = stacks.get(key, 0) + 1
+                    samples += 1
+                del frames
+                sampling_time += time.perf_counter() - sample_started
+
+            allocation_stats = self._allocation_stats(top) if allocations else None
+        finally:
+            if allocations:
+                tracemalloc.stop()
+
+        elapsed = time.perf_counter() - started
+        self.result = self._summarize(stacks, samples, interval, top)
+        self.result['allocations'] = allocation_stats
+        with self._lock:
+            self.running = False
+            self.active_threads.clear()
+            self.status = dict(
+                self.status,
+                state='finished',
+                elapsed_seconds=elapsed,
+                requests_seen=self.requests_seen,
+                samples=samples,
+                overhead_ratio=sampling_time / elapsed if elapsed else 0.0
+            )
+
+    def _allocation_stats(self, top):
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            'current_bytes': current,
+            'peak_bytes': peak,
+            'top': [
+                {
+                    'location': f'{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}',
+                    'size_bytes': stat.size,
+                    'count': stat.count
+                }
+                for stat in snapshot.statistics('lineno')[:top]
+            ]
+        }
+
+    def _summarize(self, stacks, samples, interval, top):
+        """Collapsed stacks plus self and inclusive time per function"""
+        labels = {}
+        collapsed = []
+        self_samples, total_samples = {}, {}
+        for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+            names = [labels.setdefault(code, frame_label(code)) for code in stack]
+            collapsed.append(f"{';'.join(names)} {count}")
+            self_samples[names[-1]] = self_samples.get(names[-1], 0) + count
+            # Recursion counts a function once per stack
+            for name in set(names):
+                total_samples[name] = total_samples.get(name, 0) + count
+
+        def ranking(counts):
+            return [
+                {
+                    'function': name,
+                    'samples': count,
+                    'estimated_ms': count * interval * 1000,
+                    'share': count / samples
+                }
+                for name, count in sorted(counts.items(), key=lambda item: -item[1])[:top]
+            ]
+
+        return {
+            'samples': samples,
+            'collapsed': '\n'.join(collapsed) + '\n' if collapsed else '',
+            'top_self': ranking(self_samples),
+            'top_inclusive': ranking(total_samples)
+        }
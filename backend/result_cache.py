@@ -0,0 +1,38 @@
+# result_cache.py
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Thread-safe LRU of API results
+
+    Keys start with the model version, so results of a replaced version are
+    never served again and simply age out.
+    """
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        """Cached result per key, None where there is none"""
+        results = []
+        with self._lock:
+            for key in keys:
+                result = self.entries.get(key)
+                if result is not None:
+                    self.entries.move_to_end(key)
+                results.append(result)
+        return results
+
+    def put_many(self, keys, results):
+        with self._lock:
+            for key, result in zip(keys, results):
+                self.entries[key] = result
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
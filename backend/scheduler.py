@@ -0,0 +1,247 @@
+# scheduler.py
+"""Fair scheduling of inference work across clients
+
+Requests no longer run their model passes on their own threads. The texts
+that miss the result cache are split into chunks of at most `chunk_size`
+and queued; worker threads take chunks in priority order:
+
+- Interactive work (single texts, documents and small batches) always goes
+  before bulk work, so it only ever waits for the chunks already running.
+  Bulk work gets whatever capacity interactive traffic leaves idle.
+- Within one priority, clients share the workers by start-time fair
+  queueing: each chunk is tagged with a virtual start time of
+  max(now, the client's previous finish) and finishes cost / weight later,
+  and the lowest tag runs first. A client with a 10,000-text batch
+  therefore interleaves with a client sending 50 texts instead of being
+  served to the end first. Weights default to 1.
+
+Each client also has a token bucket per priority (requests per second for
+interactive work, texts per second for bulk), and each priority has a cap
+on queued texts. Both refuse work with `Backpressure`, which carries the
+number of seconds to wait before retrying.
+"""
+import hashlib
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+import numpy as np
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+PRIORITIES = (INTERACTIVE, BULK)
+
+
+def client_key_id(api_key):
+    """Client id of an API key; the key itself never shows up in status output"""
+    return 'key-' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+
+
+def parse_weights(spec):
+    """Client weights from 'key=weight,key=weight' (EMOTION_CLIENT_WEIGHTS)"""
+    weights = {}
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        key, _, weight = item.rpartition('=')
+        if not key or float(weight) <= 0:
+            raise ValueError(f"Bad client weight '{item}', expected key=weight with a positive weight")
+        weights[client_key_id(key.strip())] = float(weight)
+    return weights
+
+
+class Backpressure(Exception):
+    """Work refused for now; retry after `retry_after` seconds"""
+
+    def __init__(self, code, priority, retry_after, message):
+        super().__init__(message)
+        self.code = code
+        self.priority = priority
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost):
+        """Take `cost` tokens; returns 0 or the seconds until they are available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # A cost above the burst could never be paid in full, so it pays the burst
+        cost = min(cost, self.burst)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class Job:
+    """One chunk of texts and the function that scores it"""
+
+    def __init__(self, texts, score):
+        self.texts = texts
+        self.score = score
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.cancelled = False
+        self.result = None
+        self.error = None
+        self.seconds = 0.0
+
+
+class FairScheduler:
+    """Priority queues with weighted fair sharing, rate limits and queue caps"""
+
+    def __init__(self, workers=None, chunk_size=64, rates=None, max_queued=None, weights=None,
+                 interactive_batch_texts=32):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        # (tokens per second, burst); interactive tokens are requests, bulk tokens are texts
+        self.rates = rates or {INTERACTIVE: (20, 40), BULK: (2000, 20000)}
+        self.max_queued = max_queued or {INTERACTIVE: 2048, BULK: 100000}
+        self.weights = weights or {}
+        self.interactive_batch_texts = interactive_batch_texts
+
+        self.queues = {priority: [] for priority in PRIORITIES}
+        self.queued_texts = {priority: 0 for priority in PRIORITIES}
+        self.virtual_time = {priority: 0.0 for priority in PRIORITIES}
+        self.finish_tags = {priority: {} for priority in PRIORITIES}
+        self.buckets = {}
+        self.waits = {priority: deque(maxlen=4096) for priority in PRIORITIES}
+        self.texts_per_second = None
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def priority_for(self, n_texts):
+        """Small batches are treated as interactive, larger ones as bulk"""
+        return INTERACTIVE if n_texts <= self.interactive_batch_texts else BULK
+
+    def admit(self, client, priority, cost=1):
+        """Charge the client's token bucket; raises Backpressure when it is empty"""
+        with self._condition:
+            bucket = self.buckets.get((client, priority))
+            if bucket is None:
+                if len(self.buckets) > 10000:
+                    self._prune_buckets()
+                bucket = self.buckets[(client, priority)] = TokenBucket(*self.rates[priority])
+            wait = bucket.take(cost)
+        if wait:
+            unit = 'requests' if priority == INTERACTIVE else 'texts'
+            raise Backpressure(
+                'rate_limited', priority, wait,
+                f'Rate limit of {bucket.rate:g} {priority} {unit} per second exceeded'
+            )
+
+    def _prune_buckets(self):
+        # A full bucket behaves exactly like a new one
+        now = time.monotonic()
+        for key, bucket in list(self.buckets.items()):
+            if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.burst:
+                del self.buckets[key]
+
+    def run(self, client, priority, texts, score):
+        """Score `texts` with `score(chunk)` on the workers
+
+        Blocks until every chunk is done and returns (results, seconds spent
+        scoring). An error in any chunk cancels the rest and is re-raised.
+        """
+        jobs = [Job(texts[i:i + self.chunk_size], score) for i in range(0, len(texts), self.chunk_size)]
+        weight = self.weights.get(client, 1.0)
+        with self._condition:
+            if self.queued_texts[priority] + len(texts) > self.max_queued[priority]:
+                raise Backpressure(
+                    'queue_full', priority, self._drain_seconds(priority),
+                    f'Too much {priority} work queued, try again later'
+                )
+            finish_tags = self.finish_tags[priority]
+            if len(finish_tags) > 10000:
+                # Tags behind the virtual clock no longer change any start time
+                for other, tag in list(finish_tags.items()):
+                    if tag <= self.virtual_time[priority]:
+                        del finish_tags[other]
+            for job in jobs:
+                start = max(self.virtual_time[priority], finish_tags.get(client, 0.0))
+                finish_tags[client] = start + len(job.texts) / weight
+                heapq.heappush(self.queues[priority], (start, next(self._sequence), job))
+            self.queued_texts[priority] += len(texts)
+            self._start_workers()
+            self._condition.notify(len(jobs))
+
+        results, seconds = [], 0.0
+        for job in jobs:
+            job.done.wait()
+            if job.error is not None:
+                for other in jobs:
+                    other.cancelled = True
+                raise job.error
+            results.extend(job.result)
+            seconds += job.seconds
+        return results, seconds
+
+    def _drain_seconds(self, priority):
+        """Estimated time to work through the queues at and above `priority`"""
+        queued = self.queued_texts[INTERACTIVE] + (self.queued_texts[BULK] if priority == BULK else 0)
+        return queued / self.texts_per_second if self.texts_per_second else 1.0
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self.queues[INTERACTIVE] and not self.queues[BULK]:
+                    self._condition.wait()
+                priority = INTERACTIVE if self.queues[INTERACTIVE] else BULK
+                start, _, job = heapq.heappop(self.queues[priority])
+                self.virtual_time[priority] = start
+                self.queued_texts[priority] -= len(job.texts)
+
+            if job.cancelled:
+                job.done.set()
+                continue
+            started = time.perf_counter()
+            self.waits[priority].append(started - job.enqueued)
+            try:
+                job.result = job.score(job.texts)
+            except Exception as e:
+                job.error = e
+            job.seconds = time.perf_counter() - started
+            if job.seconds > 0:
+                rate = len(job.texts) / job.seconds
+                self.texts_per_second = rate if self.texts_per_second is None else 0.9 * self.texts_per_second + 0.1 * rate
+            job.done.set()
+
+    def status(self):
+        with self._condition:
+            queued = {priority: self.queued_texts[priority] for priority in PRIORITIES}
+            waits = {priority: list(self.waits[priority]) for priority in PRIORITIES}
+
+        def wait_summary(values):
+            if not values:
+                return None
+            p50, p99 = np.percentile(values, [50, 99]) * 1000
+            return {'samples': len(values), 'p50_ms': float(p50), 'p99_ms': float(p99), 'max_ms': max(values) * 1000}
+
+        return {
+            'workers': self.workers,
+            'chunk_size': self.chunk_size,
+            'interactive_batch_texts': self.interactive_batch_texts,
+            'queued_texts': queued,
+            'max_queued_texts': dict(self.max_queued),
+            'rates': {priority: {'rate': rate, 'burst': burst} for priority, (rate, burst) in self.rates.items()},
+            'queue_wait': {priority: wait_summary(waits[priority]) for priority in PRIORITIES},
+            'texts_per_second': self.texts_per_second,
+            'weighted_clients': len(self.weights)
+        }
@@ -0,0 +1,234 @@
+# shadow.py
+"""Side-by-side scoring of a candidate model version against the serving one
+
+Shadow mode answers every request with the serving version and queues a
+copy of the batch for the candidate. A worker thread drains the queue,
+scores each copied batch with the candidate at its original size (so both
+versions' per-text latencies come from the same batch sizes), compares the
+labels and writes agreement, latency and per-class disagreement counts to
+SQLite, so none of it is on the request path. When the queue is full, the copy is dropped rather than
+slowing requests down.
+
+A/B requests (the ones routed to the candidate) only record their latency
+through the same queue.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+import numpy as np
+
+STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'comparisons.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS comparisons (
+    id INTEGER PRIMARY KEY,
+    created REAL,
+    primary_version TEXT,
+    candidate_version TEXT,
+    mode TEXT,
+    texts INTEGER,
+    agreed INTEGER
+);
+CREATE TABLE IF NOT EXISTS label_pairs (
+    primary_version TEXT,
+    candidate_version TEXT,
+    mode TEXT,
+    primary_label TEXT,
+    candidate_label TEXT,
+    count INTEGER,
+    PRIMARY KEY (primary_version, candidate_version, mode, primary_label, candidate_label)
+);
+CREATE TABLE IF NOT EXISTS latencies (
+    id INTEGER PRIMARY KEY,
+    created REAL,
+    version TEXT,
+    source TEXT,
+    mode TEXT,
+    texts INTEGER,
+    seconds REAL
+);
+"""
+
+
+class ComparisonStore:
+    """SQLite tables of shadow comparisons and per-version latencies
+
+    Writes come from the shadow worker only; readers open their own
+    connection, so the store can be queried from request threads.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._connection = None
+
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path)
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def record_comparison(self, primary_version, candidate_version, mode, primary_labels, candidate_labels):
+        pairs = {}
+        for pair in zip(primary_labels, candidate_labels):
+            pairs[pair] = pairs.get(pair, 0) + 1
+        agreed = sum(count for (primary, candidate), count in pairs.items() if primary == candidate)
+
+        connection = self.connection()
+        with connection:
+            connection.execute(
+                'INSERT INTO comparisons (created, primary_version, candidate_version, mode, texts, agreed) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (time.time(), primary_version, candidate_version, mode, len(primary_labels), agreed)
+            )
+            connection.executemany(
+                'INSERT INTO label_pairs VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (primary_version, candidate_version, mode, primary_label, candidate_label) '
+                'DO UPDATE SET count = count + excluded.count',
+                [(primary_version, candidate_version, mode, primary, candidate, count)
+                 for (primary, candidate), count in pairs.items()]
+            )
+
+    def record_latencies(self, rows):
+        """Rows of (version, source, mode, texts, seconds)"""
+        connection = self.connection()
+        with connection:
+            connection.executemany(
+                'INSERT INTO latencies (created, version, source, mode, texts, seconds) VALUES (?, ?, ?, ?, ?, ?)',
+                [(time.time(),) + tuple(row) for row in rows]
+            )
+
+    def summary(self, primary_version, candidate_version):
+        """Agreement, per-class disagreement and latency percentiles of two versions"""
+        if not os.path.exists(self.path):
+            return None
+        connection = sqlite3.connect(self.path)
+        try:
+            connection.executescript(SCHEMA)
+            texts, agreed = connection.execute(
+                'SELECT COALESCE(SUM(texts), 0), COALESCE(SUM(agreed), 0) FROM comparisons '
+                'WHERE primary_version = ? AND candidate_version = ?',
+                (primary_version, candidate_version)
+            ).fetchone()
+
+            disagreements = {}
+            for primary, candidate, count in connection.execute(
+                'SELECT primary_label, candidate_label, SUM(count) FROM label_pairs '
+                'WHERE primary_version = ? AND candidate_version = ? AND primary_label != candidate_label '
+                'GROUP BY primary_label, candidate_label',
+                (primary_version, candidate_version)
+            ):
+                disagreements.setdefault(primary, {})[candidate] = count
+
+            latency = {}
+            for version in (primary_version, candidate_version):
+                rows = connection.execute(
+                    'SELECT source, texts, seconds FROM latencies WHERE version = ? AND texts > 0', (version,)
+                ).fetchall()
+                latency[version] = {
+                    source: _latency_summary([row[1:] for row in rows if row[0] == source])
+                    for source in sorted({row[0] for row in rows})
+                }
+        finally:
+            connection.close()
+
+        return {
+            'primary_version': primary_version,
+            'candidate_version': candidate_version,
+            'texts_compared': texts,
+            'agreement_rate': agreed / texts if texts else None,
+            'disagreements': disagreements,
+            'latency': latency
+        }
+
+
+def _latency_summary(rows):
+    """Batch count and per-text latency percentiles in milliseconds"""
+    texts = np.array([row[0] for row in rows], dtype=np.float64)
+    per_text_ms = np.array([row[1] for row in rows]) * 1000 / texts
+    p50, p95, p99 = np.percentile(per_text_ms, [50, 95, 99])
+    return {
+        'batches': len(rows),
+        'texts': int(texts.sum()),
+        'per_text_ms_mean': float(per_text_ms.mean()),
+        'per_text_ms_p50': float(p50),
+        'per_text_ms_p95': float(p95),
+        'per_text_ms_p99': float(p99)
+    }
+
+
+class ShadowScorer:
+    """Bounded queue of shadow batches and latency records, drained by one worker thread
+
+    `score(texts, mode, threshold, version)` runs the candidate; it is
+    only ever called from the worker thread.
+    """
+
+    def __init__(self, score, store, max_pending=64):
+        self.score = score
+        self.store = store
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit_comparison(self, primary_version, candidate, mode, threshold, texts, results, seconds):
+        return self._put(('compare', primary_version, candidate, mode, threshold, texts, results, seconds))
+
+    def submit_latency(self, version, source, mode, texts, seconds):
+        return self._put(('latency', version, source, mode, texts, seconds))
+
+    def _put(self, job):
+        self._start()
+        try:
+            self.pending.put_nowait(job)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _start(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            jobs = [self.pending.get()]
+            # Take whatever else is already queued, so results are written together
+            while True:
+                try:
+                    jobs.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._process(jobs)
+            except Exception as e:
+                print(f"Error in shadow scoring: {e}")
+
+    def _process(self, jobs):
+        latencies = [job[1:] for job in jobs if job[0] == 'latency']
+
+        # Comparisons with the same versions, mode and threshold are recorded together
+        groups = {}
+        for _, primary_version, candidate, mode, threshold, texts, results, seconds in (
+            job for job in jobs if job[0] == 'compare'
+        ):
+            groups.setdefault((primary_version, candidate, mode, threshold), []).append((texts, results, seconds))
+
+        for (primary_version, candidate, mode, threshold), batches in groups.items():
+            primary_labels, candidate_labels = [], []
+            for texts, results, seconds in batches:
+                latencies.append((primary_version, 'live', mode, len(texts), seconds))
+                # Merging batches would time the candidate on larger ones and flatter its per-text latency
+                started = time.perf_counter()
+                candidate_results = self.score(texts, mode, threshold, candidate)
+                latencies.append((candidate.version, 'shadow', mode, len(texts), time.perf_counter() - started))
+                primary_labels.extend(result['emotion'] for result in results)
+                candidate_labels.extend(result['emotion'] for result in candidate_results)
+            self.store.record_comparison(primary_version, candidate.version, mode, primary_labels, candidate_labels)
+
+        if latencies:
+            self.store.record_latencies(latencies)
@@ -0,0 +1,264 @@
+# similarity.py
+"""Approximate nearest neighbour index over analyzed texts
+
+Every analyzed text is stored as an L2-normalized sentence vector (the mean
+of the BiLSTM's frozen GloVe embeddings over its words) together with its
+predicted emotion, confidence and timestamp. Search is cosine similarity.
+
+The index is an inverted file (IVF): vectors are assigned to the nearest of
+`n_lists` k-means centroids, and a query only scans the lists of its
+`nprobe` nearest centroids. Up to `min_train` vectors everything is scanned
+directly. Centroids are retrained whenever the index has grown
+`retrain_growth` times since the last training, so the list count follows
+roughly sqrt(n) and the cost of reassigning is amortized over the adds.
+When filters leave fewer than k candidates in the probed lists, the probe
+count doubles until enough are found.
+
+Vectors are stored as int8 with one float32 scale per vector: a quarter of
+the memory of float32 (about 300 MB per million 300-d vectors), and int8
+rows convert to float32 several times faster than float16 ones, which is
+what a query spends most of its time on.
+"""
+import hashlib
+import threading
+from array import array
+import numpy as np
+from dedup import normalize
+
+ASSIGN_CHUNK = 65536
+
+
+def quantize(vectors):
+    """int8 rows and the per-row scale that maps them back"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127
+    safe = np.where(scales > 0, scales, 1)
+    return np.round(vectors / safe[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def kmeans(vectors, n_clusters, iterations=10, seed=0):
+    """Spherical k-means; returns unit-length centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        counts = np.bincount(assignment, minlength=n_clusters)
+        starts = np.cumsum(counts) - counts
+        sums = np.zeros_like(centroids)
+        sums[counts > 0] = np.add.reduceat(vectors[np.argsort(assignment)], starts[counts > 0])
+        empty = counts == 0
+        # Empty clusters restart from random vectors
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+    return centroids.astype(np.float32)
+
+
+def text_key(text):
+    """Stable 16-byte digest of a normalized text, used to skip repeats"""
+    return hashlib.blake2b(normalize(text).encode('utf-8'), digest_size=16).digest()
+
+
+class SimilarityIndex:
+    """Incrementally updated IVF index with emotion and time filters"""
+
+    def __init__(self, dim, nprobe=8, min_train=4096, retrain_growth=4, max_lists=4096, sample_size=65536):
+        self.dim = dim
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.retrain_growth = retrain_growth
+        self.max_lists = max_lists
+        self.sample_size = sample_size
+
+        self.size = 0
+        self.vectors = np.zeros((1024, dim), dtype=np.int8)
+        self.scales = np.zeros(1024, dtype=np.float32)
+        self.emotion_codes = np.zeros(1024, dtype=np.int16)
+        self.confidences = np.zeros(1024, dtype=np.float32)
+        self.timestamps = np.zeros(1024, dtype=np.float64)
+        self.texts = []
+        self.labels = []
+        self.label_codes = {}
+        self.seen = {}
+
+        self.centroids = None
+        self.assignment = np.zeros(1024, dtype=np.int32)
+        self.members = []
+        self.trained_size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, needed):
+        capacity = len(self.vectors)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ('vectors', 'scales', 'emotion_codes', 'confidences', 'timestamps', 'assignment'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def _code(self, label):
+        if label not in self.label_codes:
+            self.label_codes[label] = len(self.labels)
+            self.labels.append(label)
+        return self.label_codes[label]
+
+    def add(self, vectors, texts, emotions, confidences, timestamps):
+        """Add unit-length vectors with their metadata; texts already in the index are skipped
+
+        Returns the number of items added.
+        """
+        with self._lock:
+            keep = []
+            for i, text in enumerate(texts):
+                key = text_key(text)
+                if key not in self.seen:
+                    self.seen[key] = self.size + len(keep)
+                    keep.append(i)
+            if not keep:
+                return 0
+
+            start, end = self.size, self.size + len(keep)
+            self._grow(end)
+            self.vectors[start:end], self.scales[start:end] = quantize(np.asarray(vectors)[keep])
+            self.emotion_codes[start:end] = [self._code(emotions[i]) for i in keep]
+            self.confidences[start:end] = np.asarray(confidences)[keep]
+            self.timestamps[start:end] = np.asarray(timestamps)[keep]
+            self.texts.extend(texts[i] for i in keep)
+            self.size = end
+
+            if self.size >= self.min_train and self.size >= self.retrain_growth * self.trained_size:
+                self._train()
+            elif self.centroids is not None:
+                self._assign(start, end)
+            return len(keep)
+
+    def _train(self):
+        """Retrain the centroids on a sample and rebuild every list"""
+        n_lists = int(min(self.max_lists, max(16, 2 * np.sqrt(self.size))))
+        rng = np.random.default_rng(self.size)
+        sample = rng.choice(self.size, min(self.size, self.sample_size), replace=False)
+        self.centroids = kmeans(self._dequantize(sample), n_lists)
+        self.members = [array('i') for _ in range(n_lists)]
+        self.trained_size = self.size
+        self._assign(0, self.size)
+
+    def _assign(self, start, end):
+        for chunk_start in range(start, end, ASSIGN_CHUNK):
+            chunk_end = min(end, chunk_start + ASSIGN_CHUNK)
+            self.assignment[chunk_start:chunk_end] = np.argmax(
+                self._dequantize(slice(chunk_start, chunk_end)) @ self.centroids.T, axis=1
+            )
+        # Ids are added in order, so a stable sort keeps every list sorted
+        ids = np.arange(start, end, dtype=np.int32)
+        order = np.argsort(self.assignment[start:end], kind='stable')
+        lists, first = np.unique(self.assignment[start:end][order], return_index=True)
+        for list_id, chunk in zip(lists, np.split(ids[order], first[1:])):
+            self.members[list_id].extend(chunk.tolist())
+
+    def _dequantize(self, rows):
+        return self.vectors[rows].astype(np.float32) * self.scales[rows, None]
+
+    def search(self, vector, k=10, emotion=None, since=None, until=None):
+        """Top-k items as (id, similarity), most similar first"""
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            if emotion is not None and emotion not in self.label_codes:
+                return []
+            if self.centroids is None:
+                candidates = np.arange(self.size)
+                candidates = candidates[self._filter(candidates, emotion, since, until)]
+            else:
+                order = np.argsort(-(self.centroids @ query))
+                nprobe = self.nprobe
+                while True:
+                    candidates = np.concatenate([
+                        np.frombuffer(self.members[list_id], dtype=np.int32) for list_id in order[:nprobe]
+                    ])
+                    candidates = candidates[self._filter(candidates, emotion, since, until)]
+                    if len(candidates) >= k or nprobe >= len(order):
+                        break
+                    nprobe *= 2
+
+            if not len(candidates):
+                return []
+            scores = (self.vectors[candidates] @ query) * self.scales[candidates]
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            # Quantization can put an exact match a hair above 1
+            return [(int(candidates[i]), min(float(scores[i]), 1.0)) for i in top]
+
+    def _filter(self, candidates, emotion, since, until):
+        mask = np.ones(len(candidates), dtype=bool)
+        if emotion is not None:
+            mask &= self.emotion_codes[candidates] == self.label_codes[emotion]
+        if since is not None:
+            mask &= self.timestamps[candidates] >= since
+        if until is not None:
+            mask &= self.timestamps[candidates] < until
+        return mask
+
+    def item(self, item_id):
+        return {
+            'id': item_id,
+            'text': self.texts[item_id],
+            'emotion': self.labels[self.emotion_codes[item_id]],
+            'confidence': float(self.confidences[item_id]),
+            'timestamp': float(self.timestamps[item_id])
+        }
+
+    def stats(self):
+        return {
+            'items': self.size,
+            'lists': len(self.members),
+            'trained_size': self.trained_size,
+            'nprobe': self.nprobe,
+            'memory_bytes': int(self.size * (self.dim + 4 + 2 + 4 + 8 + 4))
+        }
+
+    def save(self, path):
+        with self._lock:
+            lengths = np.array([len(text) for text in self.texts], dtype=np.int64)
+            np.savez(
+                path,
+                vectors=self.vectors[:self.size],
+                scales=self.scales[:self.size],
+                emotion_codes=self.emotion_codes[:self.size],
+                confidences=self.confidences[:self.size],
+                timestamps=self.timestamps[:self.size],
+                texts=np.array(''.join(self.texts)),
+                text_lengths=lengths,
+                labels=np.array('\n'.join(self.labels)),
+                centroids=self.centroids if self.centroids is not None else np.zeros((0, self.dim), np.float32),
+                trained_size=np.array(self.trained_size)
+            )
+
+    @classmethod
+    def load(cls, path, **options):
+        data = np.load(path)
+        index = cls(data['vectors'].shape[1], **options)
+        size = len(data['vectors'])
+        index._grow(max(size, 1))
+        index.size = size
+        index.vectors[:size] = data['vectors']
+        index.scales[:size] = data['scales']
+        index.emotion_codes[:size] = data['emotion_codes']
+        index.confidences[:size] = data['confidences']
+        index.timestamps[:size] = data['timestamps']
+
+        joined, offsets = str(data['texts']), np.concatenate([[0], np.cumsum(data['text_lengths'])])
+        index.texts = [joined[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+        index.seen = {text_key(text): i for i, text in enumerate(index.texts)}
+        index.labels = str(data['labels']).split('\n') if size else []
+        index.label_codes = {label: i for i, label in enumerate(index.labels)}
+
+        if len(data['centroids']):
+            index.centroids = data['centroids']
+            index.members = [array('i') for _ in range(len(index.centroids))]
+            index.trained_size = int(data['trained_size'])
+            index._assign(0, size)
+        return index
@@ -0,0 +1,119 @@
+# streaming.py
+import json
+import threading
+import time
+import uuid
+
+
+class StreamSession:
+    """Latest text for one live input, plus the version last pushed to the client"""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.text = ''
+        self.version = 0
+        self.sent_version = 0
+        self.last_seen = time.time()
+        self.condition = threading.Condition()
+
+
+class StreamHub:
+    """Server-Sent Events channel for live emotion updates
+
+    Clients open one long-lived event stream per session and post text updates
+    to it. Only the newest text is kept, so a burst of keystrokes collapses into
+    a single model call, and a result that is already stale when it finishes is
+    dropped instead of being pushed. A text that fails to score gets an `error`
+    event, and the stream stays open for the next update.
+    """
+
+    def __init__(self, predict, session_ttl=300, keepalive_seconds=15):
+        self.predict = predict
+        self.session_ttl = session_ttl
+        self.keepalive_seconds = keepalive_seconds
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+    def create_session(self, mode='model'):
+        self._expire_idle_sessions()
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self.sessions[session_id] = StreamSession(mode)
+        return session_id
+
+    def close_session(self, session_id):
+        """End a session and its event stream; False if it was unknown"""
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        with session.condition:
+            session.condition.notify_all()
+        return True
+
+    def get(self, session_id):
+        with self._lock:
+            return self.sessions.get(session_id)
+
+    def update(self, session_id, text):
+        """Replace the session text and wake its event stream; returns the new version"""
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        with session.condition:
+            session.text = text
+            session.version += 1
+            session.last_seen = time.time()
+            session.condition.notify_all()
+            return session.version
+
+    def events(self, session_id):
+        """Generator of SSE frames for one session"""
+        session = self.get(session_id)
+        if session is None:
+            return
+        try:
+            yield self._frame('ready', {'session_id': session_id})
+
+            while self.get(session_id) is session:
+                with session.condition:
+                    if session.version == session.sent_version:
+                        session.condition.wait(self.keepalive_seconds)
+                    session.last_seen = time.time()
+                    idle = session.version == session.sent_version
+                    version, text = session.version, session.text
+
+                if idle:
+                    # Comment frames keep proxies from closing an idle stream
+                    yield ': keepalive\n\n'
+                    continue
+
+                try:
+                    result = self.predict(text, session.mode) if text.strip() else None
+                    error = None
+                except Exception as e:
+                    result, error = None, str(e)
+
+                with session.condition:
+                    if session.version != version:
+                        # A newer update arrived while scoring; skip the stale result
+                        continue
+                    session.sent_version = version
+                if error is not None:
+                    yield self._frame('error', {'version': version, 'error': error})
+                else:
+                    yield self._frame('emotion', {'version': version, 'result': result})
+        finally:
+            # The client went away (or the session was closed)
+            self.close_session(session_id)
+
+    def _expire_idle_sessions(self):
+        cutoff = time.time() - self.session_ttl
+        with self._lock:
+            idle = [session_id for session_id, session in self.sessions.items() if session.last_seen < cutoff]
+        for session_id in idle:
+            self.close_session(session_id)
+
+    @staticmethod
+    def _frame(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,124 @@
+# subwords.py
+"""Hashed character n-gram embeddings for words outside the BiLSTM vocabulary
+
+The notebook's tokenizer drops every word that isn't in `word_to_index`,
+so misspellings, slang and hashtags carry no signal at all. With subword
+buckets, an unknown word is written as `<word>`, its character 3- to
+5-grams are hashed (CRC32) into a fixed number of buckets, and its
+embedding is the mean of those buckets' vectors. Memory is fixed by the
+bucket count, however many distinct unknown words the server sees.
+
+The BiLSTM's embedding is frozen GloVe, so the buckets are fitted without
+retraining the model: a ridge regression finds the bucket vectors whose
+n-gram means best reproduce the embedding of every word in the
+vocabulary. "happpy" then lands close to "happy", because they share most
+of their n-grams. The result is stored in the weights file as
+`oov_embeddings` and `oov_ngram_range`; NumpyBiLSTM uses them when present.
+
+    python subwords.py bilstm_weights.npz --buckets 4096
+"""
+import os
+import zlib
+import numpy as np
+
+NGRAM_RANGE = (3, 5)
+
+
+def word_buckets(word, n_buckets, ngram_range=NGRAM_RANGE):
+    """Bucket of every character n-gram of `<word>`"""
+    marked = f'<{word}>'
+    low, high = ngram_range
+    return [
+        zlib.crc32(marked[start:start + n].encode('utf-8')) % n_buckets
+        for n in range(low, high + 1)
+        for start in range(len(marked) - n + 1)
+    ] or [zlib.crc32(marked.encode('utf-8')) % n_buckets]
+
+
+class SubwordTable:
+    """Bucket embeddings plus the buckets of recently seen unknown words"""
+
+    def __init__(self, embeddings, ngram_range=NGRAM_RANGE, cache_size=100000):
+        self.embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.n_buckets = len(self.embeddings)
+        self.ngram_range = tuple(int(n) for n in ngram_range)
+        self.cache_size = cache_size
+        self._cache = {}
+
+    def buckets(self, word):
+        buckets = self._cache.get(word)
+        if buckets is None:
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            buckets = self._cache[word] = np.array(word_buckets(word, self.n_buckets, self.ngram_range), dtype=np.int32)
+        return buckets
+
+    def mean_rows(self, words, table):
+        """Mean of `table` rows over each word's buckets, one row per word
+
+        `table` is the bucket embeddings or any per-bucket linear map of
+        them, such as their LSTM input projection.
+        """
+        buckets = [self.buckets(word) for word in words]
+        lengths = np.array([len(b) for b in buckets])
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        return np.add.reduceat(table[np.concatenate(buckets)], starts, axis=0) / lengths[:, None]
+
+
+def fit_subword_embeddings(embedding, vocab, n_buckets=4096, ngram_range=NGRAM_RANGE, l2=0.01):
+    """Bucket vectors whose n-gram means reproduce the embedding of each vocabulary word
+
+    `embedding` rows start at 1 like the notebook's word indices; row 0 is
+    padding. Solves the ridge normal equations in one dense solve.
+    """
+    targets = np.asarray(embedding, dtype=np.float64)[1:len(vocab) + 1]
+    buckets = [word_buckets(word, n_buckets, ngram_range) for word in vocab]
+    lengths = np.array([len(b) for b in buckets])
+    flat = np.concatenate(buckets)
+    owner = np.repeat(np.arange(len(vocab)), lengths)
+    weights = 1.0 / lengths[owner]
+
+    # A has one row per word with 1/len at each of its buckets
+    gram = np.zeros(n_buckets * n_buckets)
+    for length in np.unique(lengths):
+        rows = np.array([b for b in buckets if len(b) == length])
+        pairs = rows[:, :, None] * n_buckets + rows[:, None, :]
+        gram += np.bincount(pairs.ravel(), minlength=n_buckets * n_buckets) / length ** 2
+    gram = gram.reshape(n_buckets, n_buckets)
+    gram[np.diag_indices(n_buckets)] += l2
+
+    projected = np.zeros((n_buckets, targets.shape[1]))
+    np.add.at(projected, flat, targets[owner] * weights[:, None])
+    return np.linalg.solve(gram, projected).astype(np.float32)
+
+
+def add_subwords(weights_path, output_path=None, n_buckets=4096, ngram_range=NGRAM_RANGE, l2=0.01):
+    """Fit bucket embeddings for exported BiLSTM weights and write them into the weights file"""
+    with np.load(weights_path, allow_pickle=False) as weights:
+        arrays = {name: weights[name] for name in weights.files}
+    vocab = [str(word) for word in arrays['vocab']]
+    arrays['oov_embeddings'] = fit_subword_embeddings(arrays['embedding'], vocab, n_buckets, ngram_range, l2)
+    arrays['oov_ngram_range'] = np.array(ngram_range)
+
+    output_path = output_path or weights_path
+    # Written next to the target and renamed, so a reader never sees half a file
+    tmp_path = output_path + '.tmp.npz'
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, output_path)
+    return arrays['oov_embeddings']
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Fit hashed subword embeddings for out-of-vocabulary words')
+    parser.add_argument('weights', help='Exported BiLSTM weights (.npz)')
+    parser.add_argument('--output', help='Defaults to updating the weights file in place')
+    parser.add_argument('--buckets', type=int, default=4096)
+    parser.add_argument('--min-n', type=int, default=NGRAM_RANGE[0])
+    parser.add_argument('--max-n', type=int, default=NGRAM_RANGE[1])
+    parser.add_argument('--l2', type=float, default=0.01)
+    args = parser.parse_args()
+
+    buckets = add_subwords(args.weights, args.output, args.buckets, (args.min_n, args.max_n), args.l2)
+    print(f"Wrote {len(buckets)} subword buckets to {args.output or args.weights}")
@@ -0,0 +1,78 @@
+# validation.py
+
+
+class RequestLimits:
+    """Size limits enforced before any model work is done
+
+    `max_request_bytes` is handed to Flask as MAX_CONTENT_LENGTH, so an
+    oversized body is refused from its Content-Length header (or while
+    streaming) without being read or parsed. `max_explained_words` caps the
+    extra model rows an explanation request may cost.
+    """
+
+    def __init__(self, max_request_bytes=8 * 1024 * 1024, max_texts=10000, max_text_chars=5000,
+                 max_document_chars=200000, truncate=True, max_explained_words=2048):
+        self.max_request_bytes = max_request_bytes
+        self.max_texts = max_texts
+        self.max_text_chars = max_text_chars
+        self.max_document_chars = max_document_chars
+        self.truncate = truncate
+        self.max_explained_words = max_explained_words
+
+    def to_dict(self):
+        return {
+            'max_request_bytes': self.max_request_bytes,
+            'max_texts': self.max_texts,
+            'max_text_chars': self.max_text_chars,
+            'max_document_chars': self.max_document_chars,
+            'truncate': self.truncate,
+            'max_explained_words': self.max_explained_words
+        }
+
+
+ERROR_MESSAGES = {
+    'not_a_string': 'Text must be a string',
+    'empty_text': 'Empty text provided',
+    'text_too_long': 'Text exceeds the maximum length'
+}
+
+
+def check_text(text, max_chars, truncate=True):
+    """Validate one text; returns (text, error_code, truncated)
+
+    An over-long text is cut to `max_chars` when `truncate` is set and
+    rejected with 'text_too_long' otherwise.
+    """
+    if not isinstance(text, str):
+        return None, 'not_a_string', False
+    if len(text) > max_chars:
+        if not truncate:
+            return None, 'text_too_long', False
+        text = text[:max_chars]
+        truncated = True
+    else:
+        truncated = False
+    if not text.strip():
+        return None, 'empty_text', False
+    return text, None, truncated
+
+
+def validate_texts(items, limits):
+    """Split a batch into scorable texts and per-item errors
+
+    Returns (texts, positions, errors, truncated): `positions` maps every
+    kept text back to its index in `items`, `errors` lists the rejected
+    items as {'index', 'code', 'message'} and `truncated` holds the
+    indices of texts that were cut to `max_text_chars`.
+    """
+    texts, positions, errors, truncated = [], [], [], []
+    for index, item in enumerate(items):
+        text, code, was_truncated = check_text(item, limits.max_text_chars, limits.truncate)
+        if code is not None:
+            errors.append({'index': index, 'code': code, 'message': ERROR_MESSAGES[code]})
+            continue
+        texts.append(text)
+        positions.append(index)
+        if was_truncated:
+            truncated.append(index)
+    return texts, positions, errors, truncated